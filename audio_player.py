@@ -2,7 +2,10 @@ import pygame
 import pygame._sdl2.audio as sdl2_audio
 import time
 import os
+import wave
 import asyncio
+import threading
+import numpy as np
 import soundfile as sf
 from mutagen.mp3 import MP3
 from pydub import AudioSegment
@@ -10,6 +13,121 @@ from bot_utils import DEBUG
 from json_manager import load_settings
 
 AUDIO_DEVICES = []
+FRAME_MS = 50 #Volume envelope resolution, the assistant bounces once per frame
+STREAM_RATE = 24000 #Sample rate of streamed 16 bit mono PCM
+LIVE_STREAMS = {} #file path -> StreamedAudio still being synthesized
+
+def live_stream(file_path):
+    return LIVE_STREAMS.get(file_path)
+
+def discard_audio(file_path):
+    #Deletes audio nobody will play. A stream still arriving is stopped and never saved, rather than racing its finish().
+    if not file_path:
+        return
+    stream = live_stream(file_path)
+    if stream:
+        stream.abort()
+        return
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[ERROR]Failed to delete audio file {file_path}, will be purged on next startup: {e}")
+
+class StreamedAudio:
+    #PCM from a streaming synthesizer. Playable while it arrives, saved as a wav at file_path once complete.
+    def __init__(self, file_path, sample_rate = STREAM_RATE, on_saved = None):
+        self.file_path = file_path
+        self.sample_rate = sample_rate
+        self.on_saved = on_saved
+        self.pcm = bytearray()
+        self.volumes = []
+        self.min_volume = 0
+        self.max_volume = 0
+        self.envelope_at = 0 #Bytes of pcm already in the envelope
+        self.done = False
+        self.aborted = False
+        self.error = None
+        self.started = threading.Event()
+        self.condition = threading.Condition()
+        LIVE_STREAMS[file_path] = self
+
+    @property
+    def duration_ms(self):
+        return len(self.pcm) // 2 * 1000 // self.sample_rate
+
+    def feed(self, chunk: bytes):
+        with self.condition:
+            self.pcm.extend(chunk)
+            self._update_envelope(final = False)
+            self.condition.notify_all()
+        self.started.set()
+
+    def _update_envelope(self, final):
+        frame_bytes = self.sample_rate * FRAME_MS // 1000 * 2
+        while len(self.pcm) - self.envelope_at >= frame_bytes or (final and len(self.pcm) - self.envelope_at >= 2):
+            end = min(self.envelope_at + frame_bytes, len(self.pcm) // 2 * 2)
+            samples = np.frombuffer(self.pcm, dtype = np.int16, count = (end - self.envelope_at) // 2, offset = self.envelope_at)
+            volume = int(np.sqrt(np.mean(samples.astype(np.float64) ** 2)))
+            self.min_volume = volume if not self.volumes else min(self.min_volume, volume)
+            self.max_volume = max(self.max_volume, volume)
+            self.volumes.append(volume)
+            self.envelope_at = end
+
+    def run(self, chunks):
+        #Pulls every chunk from the synthesizer, meant for its own thread
+        try:
+            for chunk in chunks:
+                if self.aborted:
+                    break
+                if chunk:
+                    self.feed(chunk)
+        except Exception as e:
+            self.error = e
+            print(f"[WARNING]Streamed synthesis stopped early: {e}")
+        finally:
+            self.finish()
+
+    def finish(self):
+        with self.condition:
+            self._update_envelope(final = True)
+            try:
+                if self.pcm and not self.aborted:
+                    with wave.open(self.file_path, "wb") as wav_file:
+                        wav_file.setnchannels(1)
+                        wav_file.setsampwidth(2)
+                        wav_file.setframerate(self.sample_rate)
+                        wav_file.writeframes(bytes(self.pcm[:len(self.pcm) // 2 * 2]))
+                    if self.on_saved and not self.error:
+                        self.on_saved(self.file_path)
+            except Exception as e:
+                print(f"[ERROR]Could not save streamed audio to {self.file_path}: {e}")
+            self.done = True
+            LIVE_STREAMS.pop(self.file_path, None)
+            self.condition.notify_all()
+        self.started.set()
+
+    def abort(self):
+        #Stops pulling chunks and skips saving. Already saved audio is deleted instead.
+        with self.condition:
+            if not self.done:
+                self.aborted = True
+                return
+        discard_audio(self.file_path)
+
+    def wait_started(self, timeout: float = None):
+        #Blocks until the first chunk. Raises if synthesis failed before producing any audio.
+        self.started.wait(timeout)
+        if not self.pcm:
+            raise self.error or TimeoutError("No audio arrived from the synthesizer")
+
+    def read(self, offset: int, timeout: float = 0.5):
+        #Whole samples after offset, waiting a little for more if none are ready yet
+        with self.condition:
+            if len(self.pcm) - offset < 2 and not self.done:
+                self.condition.wait(timeout)
+            return bytes(self.pcm[offset:len(self.pcm) // 2 * 2])
 
 class AudioManager:
     def __init__(self):
@@ -70,6 +188,56 @@ class AudioManager:
     def is_playing(self):
         return self._is_playing
 
+    def _to_mixer(self, pcm: bytes, sample_rate: int):
+        #Mono 16 bit PCM to whatever rate and channel count the mixer was opened with
+        frequency, _, channels = pygame.mixer.get_init()
+        samples = np.frombuffer(pcm, dtype = np.int16)
+        if frequency != sample_rate and len(samples) > 1:
+            positions = np.arange(0, len(samples), sample_rate / frequency)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+        if channels > 1:
+            samples = np.repeat(samples, channels)
+        return pygame.mixer.Sound(buffer = samples.tobytes())
+
+    def play_stream(self, stream: StreamedAudio, output_device = None):
+        #Plays a StreamedAudio on the output device as its chunks arrive. Blocks like play_audio.
+        try:
+            if output_device and output_device != self.cached_output_device:
+                self.set_output_device(output_device)
+            if not pygame.mixer.get_init():
+                self.init_mixer()
+            self._is_playing = True
+            channel = pygame.mixer.find_channel(True)
+            offset = 0
+            while True:
+                if self._should_stop:
+                    print("[WARNING][AudioManager] Playback interrupted!")
+                    self._should_stop = False
+                    channel.stop()
+                    break
+                if channel.get_queue() is not None: #Only one sound can wait behind the playing one
+                    time.sleep(0.01)
+                    continue
+                pcm = stream.read(offset)
+                if pcm:
+                    offset += len(pcm)
+                    sound = self._to_mixer(pcm, stream.sample_rate)
+                    if channel.get_busy():
+                        channel.queue(sound)
+                    else:
+                        channel.play(sound)
+                elif stream.done:
+                    while channel.get_busy() and not self._should_stop:
+                        time.sleep(0.05)
+                    if self._should_stop:
+                        self._should_stop = False
+                        channel.stop()
+                    break
+            self._is_playing = False
+        except Exception as e:
+            self._is_playing = False
+            print(f"[ERROR][AudioManager] Error playing streamed audio: {e}")
+
     def play_audio(self, file_path, sleep_during_playback=True, delete_file=False, play_using_music=True, output_device = None):
         try:
             if output_device and output_device != self.cached_output_device:
@@ -140,8 +308,8 @@ class AudioManager:
         await asyncio.sleep(file_length)
 
     async def process_audio(self, audio_file):
-        audio = AudioSegment.from_mp3(audio_file)
-        frame_ms = 50
+        audio = AudioSegment.from_file(audio_file) #mp3 from ElevenLabs, wav from Azure and streamed synthesis
+        frame_ms = FRAME_MS
         frames = [audio[i:i+frame_ms] for i in range(0, len(audio), frame_ms)]
         volumes = [frame.rms for frame in frames]
         return volumes, len(audio)
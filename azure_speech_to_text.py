@@ -3,18 +3,86 @@ import azure.cognitiveservices.speech as speechsdk
 import keyboard
 import asyncio
 import os
-from pathlib import Path
+import threading
 from json_manager import load_settings
 from dotenv import load_dotenv
 from bot_utils import DEBUG
+from tts_cache import get_tts_cache, audio_file
+from audio_player import StreamedAudio, STREAM_RATE
 
 load_dotenv()
 
 END_LISTEN_KEY = None
 AUDIO_FOLDER = os.path.join(os.path.dirname(__file__), "audio")
 
+# Output formats callers can pick, the player handles wav and mp3
+OUTPUT_FORMATS = {
+    "wav": (".wav", speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm),
+    "mp3": (".mp3", speechsdk.SpeechSynthesisOutputFormat.Audio24Khz96KBitRateMonoMp3),
+}
+STREAM_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Raw24Khz16BitMonoPcm # Same audio as wav, without the header, so it can be played while it arrives
+AZURE_FORMAT = "wav"
+IDLE_SYNTHESIZERS = 2 # Kept ready per voice and format
+STREAM_CHUNK = 4800 # Bytes read from a streamed synthesis at a time, 100ms at 24kHz
+FIRST_CHUNK_TIMEOUT = 15
+
 VOICES = ["en-US-AvaNeural", "en-US-EmmaNeural", "en-US-JennyNeural", "en-US-AriaNeural", "en-US-JaneNeural", "en-US-LunaNeural", "en-US-SaraNeural", "en-US-NancyNeural", "en-US-AmberNeural", "en-US-AnaNeural", "en-US-AshleyNeural", "en-US-CoraNeural", "en-US-ElizabethNeural", "en-US-MichelleNeural", "en-US-AvaMultilingualNeural", "en-US-MonicaNeural", "en-US-BlueNeural", "en-US-AmandaMultilingualNeural", "en-US-LolaMultilingualNeural", "en-US-NancyMultilingualNeural", "en-US-ShimmerTurboMultilingualNeural", "en-US-SerenaMultilingualNeural", "en-US-PhoebeMultilingualNeural", "en-US-NovaTurboMultilingualNeural", "en-US-EvelynMultilingualNeural", "en-US-JennyMultilingualNeural", "en-US-EmmaMultilingualNeural", "en-US-CoraMultilingualNeural", "en-US-Aria:DragonHDLatestNeural", "en-US-Ava:DragonHDLatestNeural", "en-US-Emma:DragonHDLatestNeural", "en-US-Emma2:DragonHDLatestNeural", "en-US-Jenny:DragonHDLatestNeural", ]
 
+class SynthesizerPool:
+    # Synthesizers are built once per voice and output format and reused. Each has its own SpeechConfig,
+    # so syntheses with different voices can run at the same time without touching each other's settings.
+    def __init__(self, subscription, region, idle_per_key = IDLE_SYNTHESIZERS):
+        self.subscription = subscription
+        self.region = region
+        self.idle_per_key = idle_per_key
+        self.idle = {} # (voice, format) -> synthesizers not in use
+        self.connections = {} # id(synthesizer) -> open connection, kept so it isn't closed
+        self.lock = threading.Lock() # Synthesis runs in worker threads
+        self.created = 0
+        self.reused = 0
+
+    def _build(self, voice, output_format):
+        config = speechsdk.SpeechConfig(subscription=self.subscription, region=self.region)
+        config.speech_synthesis_voice_name = voice
+        config.set_speech_synthesis_output_format(output_format)
+        # No audio config, the audio stays in memory on the result instead of going to a speaker or file
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=config, audio_config=None)
+        self.created += 1
+        return synthesizer
+
+    def acquire(self, voice, output_format):
+        with self.lock:
+            idle = self.idle.get((voice, output_format))
+            if idle:
+                self.reused += 1
+                return idle.pop()
+        return self._build(voice, output_format)
+
+    def release(self, voice, output_format, synthesizer):
+        with self.lock:
+            idle = self.idle.setdefault((voice, output_format), [])
+            if len(idle) < self.idle_per_key:
+                idle.append(synthesizer)
+                return
+            self.connections.pop(id(synthesizer), None)
+
+    def warm(self, voice, output_format = AZURE_FORMAT, stream = False):
+        # Builds a synthesizer and opens its connection ahead of time, so the first fallback line doesn't pay for the handshake
+        output_format = STREAM_FORMAT if stream else OUTPUT_FORMATS[output_format][1]
+        synthesizer = self.acquire(voice, output_format)
+        try:
+            connection = speechsdk.Connection.from_speech_synthesizer(synthesizer)
+            connection.open(True)
+            with self.lock:
+                self.connections[id(synthesizer)] = connection
+        except Exception as e:
+            print(f"[WARNING]Could not pre-connect the Azure voice {voice}: {e}")
+        self.release(voice, output_format, synthesizer)
+
+    def stats(self):
+        with self.lock:
+            return {"created": self.created, "reused": self.reused, "idle": sum(len(idle) for idle in self.idle.values())}
+
 class SpeechToTextManager:
     azure_speechconfig = None
     azure_audioconfig = None
@@ -39,37 +107,79 @@ class SpeechToTextManager:
         self.azure_speechconfig.speech_recognition_language="en-US"
         self.azure_speechconfig.speech_synthesis_voice_name='en-US-AvaMultilingualNeural'
         self.audio_config = speechsdk.audio.AudioOutputConfig(use_default_speaker=True)
-
-    def text_to_speech(self, text, voice):
-        # Create the audio directory if it doesn't exist
-        self.azure_speechconfig.speech_synthesis_voice_name = voice
-        audio_dir = Path(__file__).parent / "audio"
-        audio_dir.mkdir(exist_ok=True)
-
-        # Generate the filename
-        filename = f"___Msg{str(hash(text))}.wav"
-        audio_path = audio_dir / filename
-
-        # Synthesize speech
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=str(audio_path))
-        speech_synthesizer = speechsdk.SpeechSynthesizer(
-            speech_config=self.azure_speechconfig,
-            audio_config=audio_config
-        )
-        result = speech_synthesizer.speak_text_async(text).get()
+        self.synthesizers = SynthesizerPool(os.getenv('AZURE_TTS_KEY'), os.getenv('AZURE_TTS_REGION'))
+
+    def text_to_speech(self, text, voice, use_cache=True, output_format=AZURE_FORMAT, stream=False):
+        # stream returns a StreamedAudio that plays while Azure is still sending it, saved as a wav once done
+        extension, sdk_format = (".wav", STREAM_FORMAT) if stream else OUTPUT_FORMATS[output_format]
+        cache = get_tts_cache()
+        # Streamed audio is saved as the same wav the "wav" format produces, so both share cache entries
+        key = cache.key("azure", text, voice, voice_settings=None if extension == ".wav" else {"output_format": output_format})
+        if use_cache:
+            cached = cache.get(key, extension, AUDIO_FOLDER)
+            if cached:
+                return cached
+        if stream:
+            return self._text_to_speech_stream(text, voice, (lambda path: cache.put(key, path)) if use_cache else None)
+
+        synthesizer = self.synthesizers.acquire(voice, sdk_format)
+        try:
+            result = synthesizer.speak_text_async(text).get()
+        finally:
+            self.synthesizers.release(voice, sdk_format, synthesizer)
 
         if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
+            audio_path = audio_file(extension, AUDIO_FOLDER)
+            with open(audio_path, "wb") as f:
+                f.write(result.audio_data)
             if DEBUG:
                 print(f"[DEBUG]Speech synthesized and saved to {audio_path}")
+            if use_cache:
+                cache.put(key, audio_path)
             return str(audio_path)
         elif result.reason == speechsdk.ResultReason.Canceled:
-            cancellation_details = result.cancellation_details
-            print(f"[WARNING]Speech synthesis canceled: {cancellation_details.reason}")
-            if cancellation_details.reason == speechsdk.CancellationReason.Error:
-                if cancellation_details.error_details:
-                    print(f"[WARNING]Error details: {cancellation_details.error_details}")
-                    print("[WARNING]Did you set the speech resource key and region values?")
+            self._synthesis_canceled(result.cancellation_details)
+            return None
+
+    def _text_to_speech_stream(self, text, voice, on_saved):
+        synthesizer = self.synthesizers.acquire(voice, STREAM_FORMAT)
+        try:
+            # Returns once the first audio is ready, the rest is pulled from the result's stream
+            result = synthesizer.start_speaking_text_async(text).get()
+        except Exception:
+            self.synthesizers.release(voice, STREAM_FORMAT, synthesizer)
+            raise
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioStarted:
+            self.synthesizers.release(voice, STREAM_FORMAT, synthesizer)
+            if result.reason == speechsdk.ResultReason.Canceled:
+                self._synthesis_canceled(result.cancellation_details)
             return None
+        audio_stream = speechsdk.AudioDataStream(result)
+
+        def chunks():
+            buffer = bytes(STREAM_CHUNK)
+            try:
+                while True:
+                    filled = audio_stream.read_data(buffer)
+                    if not filled:
+                        break
+                    yield buffer[:filled]
+                if audio_stream.status == speechsdk.StreamStatus.Canceled:
+                    raise RuntimeError(f"Azure synthesis canceled: {audio_stream.cancellation_details.error_details}")
+            finally:
+                self.synthesizers.release(voice, STREAM_FORMAT, synthesizer)
+
+        streamed = StreamedAudio(audio_file(".wav", AUDIO_FOLDER), STREAM_RATE, on_saved=on_saved)
+        threading.Thread(target=streamed.run, args=(chunks(),), daemon=True).start()
+        streamed.wait_started(FIRST_CHUNK_TIMEOUT)
+        return streamed
+
+    def _synthesis_canceled(self, cancellation_details):
+        print(f"[WARNING]Speech synthesis canceled: {cancellation_details.reason}")
+        if cancellation_details.reason == speechsdk.CancellationReason.Error:
+            if cancellation_details.error_details:
+                print(f"[WARNING]Error details: {cancellation_details.error_details}")
+                print("[WARNING]Did you set the speech resource key and region values?")
 
     def speechtotext_from_mic(self):
         
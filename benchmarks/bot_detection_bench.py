@@ -0,0 +1,68 @@
+#Replays labelled chat through the local bot detection heuristics.
+#Reports precision and recall of the local verdicts, and how many model calls they avoid.
+#bot_detection_corpus.jsonl is the set the thresholds and phrase lists were tuned on, so its numbers are optimistic.
+#bot_detection_holdout.jsonl was never used for tuning. Judge the heuristics on it, and don't tune on it either.
+#Run from the repository root: python benchmarks/bot_detection_bench.py [--corpus path] [--holdout path] [--runs 200]
+import os
+import sys
+import time
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bot_detection import heuristic_verdict
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot_detection_corpus.jsonl")
+HOLDOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot_detection_holdout.jsonl")
+
+def load_corpus(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def evaluate(name, corpus, verbose):
+    bots = sum(1 for entry in corpus if entry["label"] == "bot")
+    humans = len(corpus) - bots
+    true_bot = false_bot = true_human = false_human = escalated = 0
+    for entry in corpus:
+        verdict = heuristic_verdict(entry["message"])
+        is_bot = entry["label"] == "bot"
+        if verdict is None:
+            escalated += 1
+        elif verdict == is_bot:
+            true_bot += verdict
+            true_human += not verdict
+        else:
+            false_bot += verdict
+            false_human += not verdict
+        if verbose and verdict != is_bot:
+            print(f"  {"escalated" if verdict is None else "WRONG":<9} {entry["label"]:<5} {entry["message"]}")
+
+    decided = len(corpus) - escalated
+    print(f"{name}: {len(corpus)} messages ({bots} bots, {humans} humans)")
+    print(f"  Decided locally: {decided} ({decided / len(corpus):.0%} of model calls avoided), escalated: {escalated}")
+    print(f"  Bot verdicts:   precision {true_bot / max(true_bot + false_bot, 1):.2%}, recall {true_bot / max(bots, 1):.2%}")
+    print(f"  Human verdicts: precision {true_human / max(true_human + false_human, 1):.2%}, recall {true_human / max(humans, 1):.2%}") #Precision here is how often the short message auto-pass lets a bot through
+    print(f"  Wrong local verdicts: {false_bot} humans called bots, {false_human} bots let through")
+
+def main():
+    parser = argparse.ArgumentParser(description = "Local bot detection heuristics benchmark")
+    parser.add_argument("--corpus", default = CORPUS, help = "Set the heuristics were tuned on")
+    parser.add_argument("--holdout", default = HOLDOUT, help = "Labelled set never used for tuning")
+    parser.add_argument("--runs", type = int, default = 200)
+    parser.add_argument("--verbose", action = "store_true", help = "List every message the heuristics got wrong or escalated")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    evaluate("Tuning corpus", corpus, args.verbose)
+    if os.path.exists(args.holdout):
+        evaluate("Held-out set", load_corpus(args.holdout), args.verbose)
+
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        for entry in corpus:
+            heuristic_verdict(entry["message"])
+    per_message_us = (time.perf_counter() - start) / (args.runs * len(corpus)) * 1_000_000
+    print(f"Average time per message: {per_message_us:.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#Measures load/save latency of the bot's JSON files for every installed codec backend.
+#Run from the repository root: python benchmarks/json_bench.py [--contributors 10000] [--runs 20]
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import json_codec
+from json_manager import SETTINGS_FILE, write_atomic
+from chat_context import CHAT_CAPACITY
+
+def make_settings():
+    if os.path.exists(SETTINGS_FILE):
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            return json_codec.loads(f.read())
+    #Same shape and size as a filled in settings.json
+    settings = {f"Setting {i}": random.choice([None, True, False, 60, "Some Object Name"]) for i in range(30)}
+    settings["Hotkeys"] = {f"HOTKEY_{i}": "ctrl+shift+f1" for i in range(8)}
+    settings["Onscreen Location"] = {"x": 1500.0, "y": 700.0, "scaleX": 0.5, "scaleY": 0.5}
+    return settings
+
+def make_tracker(contributors: int):
+    return {
+        "Amount of Bits Donated": 1234500,
+        "Amount of Money Donated": 9876.54,
+        "Number of Subs": 4321,
+        "Number of Subs Gifted": 1234,
+        "Current Point Total": 26543,
+        "Next Goal": 30000,
+        "Last Goal Reached": 25000,
+        "Current Goal Tier": 30000,
+        "Point Values": {"One Point Per Bits": 100, "Donation Per Dollar": 1, "Sub": 1},
+        "Goals": {f"Goal {i}": i * 5000 for i in range(1, 21)},
+        "Contributors": {
+            f"viewer_{i:05d}": {
+                "Subbed": random.random() < 0.4,
+                "Gifted Subs Donated": random.randint(0, 5),
+                "Bits Donated": random.randint(0, 10000),
+                "Money Donated": round(random.random() * 50, 2),
+            }
+            for i in range(contributors)
+        },
+    }
+
+def make_messages():
+    now = time.time()
+    return [{"time": now + i, "author": f"viewer_{i % 300:05d}", "message": "this is a pretty normal length chat message PogChamp " * random.randint(1, 3)} for i in range(CHAT_CAPACITY)]
+
+def measure(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), max(times)
+
+def bench_file(directory, name, data, pretty, runs):
+    path = os.path.join(directory, name)
+    def save():
+        write_atomic(path, json_codec.dumps(data, pretty))
+    def load():
+        with open(path, "r", encoding="utf-8") as f:
+            return json_codec.loads(f.read())
+    save_median, save_max = measure(save, runs)
+    load_median, load_max = measure(load, runs)
+    return os.path.getsize(path), save_median, save_max, load_median, load_max
+
+def main():
+    parser = argparse.ArgumentParser(description = "JSON codec load/save benchmark")
+    parser.add_argument("--contributors", type = int, default = 10000)
+    parser.add_argument("--runs", type = int, default = 20)
+    args = parser.parse_args()
+
+    files = [
+        ("settings.json", make_settings()),
+        ("streamathon_tracker.json", make_tracker(args.contributors)),
+        ("messages.json", make_messages()),
+    ]
+    print(f"Backends installed: {", ".join(json_codec.BACKENDS)} (default {json_codec.BACKEND})")
+    print(f"{"backend":<8} {"file":<26} {"pretty":<6} {"size KB":>8} {"save ms":>8} {"max":>8} {"load ms":>8} {"max":>8}")
+    default_backend = json_codec.BACKEND
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in json_codec.BACKENDS:
+            json_codec.set_backend(backend)
+            for name, data in files:
+                for pretty in (True, False):
+                    size, save_median, save_max, load_median, load_max = bench_file(directory, name, data, pretty, args.runs)
+                    print(f"{backend:<8} {name:<26} {str(pretty):<6} {size / 1024:>8.1f} {save_median:>8.2f} {save_max:>8.2f} {load_median:>8.2f} {load_max:>8.2f}")
+    json_codec.set_backend(default_backend)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#Drives the bot's LLM traffic through OpenAiManager against the mock OpenAI server, with no network access.
+#Bits, raids, chat replies and first time chatter checks arrive as a random mix at the given rate.
+#Reports throughput, per event latency and the scheduler's queue metrics.
+#Run from the repository root: python benchmarks/llm_load_test.py [--rate 5] [--duration 30] [--latency lognormal:-0.5,0.5] [--rate-limit 0.02]
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mock_openai_server import MockOpenAIServer
+from openai_chat import OpenAiManager
+from llm_scheduler import LLMRequestShed, AMBIENT
+from bot_detection import BotDetector
+from prompt_registry import get_prompt_registry
+
+PROMPTS = {
+    "Respond to Messages": "You are Maddieply, the snarky anime catgirl secretary of ModdCorp. Reply to the chat messages in one or two sentences.",
+    "Bit Donation w/o Message": "You are Maddieply, the snarky anime catgirl secretary of ModdCorp. Thank the viewer for their bits.",
+    "Raid": "You are Maddieply, the snarky anime catgirl secretary of ModdCorp. Welcome the raiders.",
+}
+CHAT_LINES = ["lol", "that jump was rough", "is the boss ok", "hi chat", "what game is this", "maddie say hi", "W", "first time here, love the stream"]
+MIX = [("bits", 0.3), ("raid", 0.1), ("chat reply", 0.4), ("first chatter", 0.2)]
+
+async def bits(manager, registry, _):
+    prompt = [registry.message("Bit Donation w/o Message"),
+              registry.render("Bit Donation Details", USER = f"viewer{random.randint(1, 999)}", BITS = random.choice([100, 500, 1000]), BROADCASTER = "ModdiPly", REACTION = "Impressed")]
+    return await manager.chat_async(prompt, False, echo = False)
+
+async def raid(manager, registry, _):
+    prompt = [registry.message("Raid"), {"role": "user", "content": f"streamer{random.randint(1, 99)} raided with {random.randint(2, 200)} viewers!"}]
+    return await manager.chat_async(prompt, False, echo = False)
+
+async def chat_reply(manager, registry, _):
+    lines = "\n".join(f"viewer{random.randint(1, 99)}: {random.choice(CHAT_LINES)}" for _ in range(15))
+    return await manager.chat_async([registry.message("Respond to Messages"), {"role": "user", "content": lines}], True, priority = AMBIENT, echo = False)
+
+async def first_chatter(manager, registry, detector):
+    return await detector.classify(f"{random.choice(CHAT_LINES)} {random.choice(CHAT_LINES)} {random.randint(1, 10**6)}")
+
+EVENTS = {"bits": bits, "raid": raid, "chat reply": chat_reply, "first chatter": first_chatter}
+
+def percentile(values, share):
+    return values[min(int(len(values) * share), len(values) - 1)] if values else 0.0
+
+async def run(args):
+    server = MockOpenAIServer(port = args.port, latency = args.latency, rate_limit = args.rate_limit, errors = args.errors, timeouts = args.timeouts, hang = args.hang)
+    await server.start()
+    manager = OpenAiManager(max_concurrent_requests = args.concurrency, base_url = server.base_url)
+    registry = get_prompt_registry()
+    registry.load(PROMPTS)
+    detector = BotDetector(manager)
+    latencies = {name: [] for name in EVENTS}
+    outcomes = {name: {"ok": 0, "shed": 0, "failed": 0} for name in EVENTS}
+    names, weights = zip(*MIX)
+
+    async def event(name):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(EVENTS[name](manager, registry, detector), args.timeout)
+        except LLMRequestShed:
+            outcomes[name]["shed"] += 1
+            return
+        except Exception:
+            outcomes[name]["failed"] += 1
+            return
+        outcomes[name]["ok"] += 1
+        latencies[name].append(time.perf_counter() - start)
+
+    tasks = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        tasks.append(asyncio.create_task(event(random.choices(names, weights)[0])))
+        await asyncio.sleep(random.expovariate(args.rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stats = manager.scheduler_stats()
+    await server.stop()
+
+    completed = sum(outcome["ok"] for outcome in outcomes.values())
+    print(f"{len(tasks)} events in {elapsed:.1f}s, {completed / elapsed:.2f} completed per second, {server.requests} model requests")
+    print(f"{"event":<14}{"ok":>6}{"shed":>6}{"failed":>8}{"p50":>9}{"p95":>9}{"max":>9}")
+    for name in EVENTS:
+        values = sorted(latencies[name])
+        print(f"{name:<14}{outcomes[name]["ok"]:>6}{outcomes[name]["shed"]:>6}{outcomes[name]["failed"]:>8}"
+              f"{percentile(values, 0.5):>8.2f}s{percentile(values, 0.95):>8.2f}s{(values[-1] if values else 0):>8.2f}s")
+    print("Scheduler:", {name: value for name, value in stats.items()})
+    print("Mock server:", server.stats_dict())
+    print("Bot detection:", detector.stats())
+
+def main():
+    parser = argparse.ArgumentParser(description = "LLM pipeline load test against the mock OpenAI server")
+    parser.add_argument("--rate", type = float, default = 5, help = "Events per second")
+    parser.add_argument("--duration", type = float, default = 30, help = "Seconds to keep sending events")
+    parser.add_argument("--concurrency", type = int, default = 4, help = "Concurrent LLM requests allowed")
+    parser.add_argument("--port", type = int, default = 8089)
+    parser.add_argument("--latency", default = "lognormal:-0.5,0.5")
+    parser.add_argument("--rate-limit", type = float, default = 0.0)
+    parser.add_argument("--errors", type = float, default = 0.0)
+    parser.add_argument("--timeouts", type = float, default = 0.0)
+    parser.add_argument("--hang", type = float, default = 30.0)
+    parser.add_argument("--timeout", type = float, default = 60.0, help = "Seconds before an event counts as failed")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#Local stand-in for the OpenAI chat completions endpoint, for load testing without network access.
+#Run from the repository root: python benchmarks/mock_openai_server.py [--port 8089] [--latency lognormal:-0.5,0.5] [--rate-limit 0.05]
+#Then start the bot or a benchmark with OPENAI_BASE_URL=http://127.0.0.1:8089/v1 (any OPENAI_API_KEY works).
+#Latency is a distribution, one of fixed:SECONDS, uniform:LOW,HIGH, normal:MEAN,STDDEV or lognormal:MU,SIGMA.
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+NUMBERED_LINE = re.compile(r"^\s*\d+[.)]", re.MULTILINE)
+CANNED_RESPONSES = [
+    "Oh wow, thank you so much! ModdCorp appreciates your generous contribution to the break room fund.",
+    "Welcome to ModdCorp! Please sign the onboarding waiver and grab a complimentary stapler.",
+    "Chat has been discussing snacks, the boss's questionable gameplay, and whether interns get paid. They don't.",
+]
+
+def parse_latency(spec: str):
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    samplers = {
+        "fixed": lambda: values[0],
+        "uniform": lambda: random.uniform(values[0], values[1]),
+        "normal": lambda: random.gauss(values[0], values[1]),
+        "lognormal": lambda: random.lognormvariate(values[0], values[1]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution '{kind}', use one of {", ".join(samplers)}")
+    sampler = samplers[kind]
+    sampler() #Fails now rather than on the first request if the arguments are missing
+    return lambda: max(0.0, sampler())
+
+class MockOpenAIServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 8089, latency: str = "fixed:0.5", mode: str = "canned",
+                 canned: list = None, rate_limit: float = 0.0, errors: float = 0.0, timeouts: float = 0.0,
+                 hang: float = 30.0, chunk_delay: float = 0.05):
+        self.host = host
+        self.port = port
+        self.latency = parse_latency(latency)
+        self.mode = mode
+        self.canned = canned or CANNED_RESPONSES
+        self.rate_limit = rate_limit #Share of requests answered with a 429
+        self.errors = errors #Share answered with a 500
+        self.timeouts = timeouts #Share that hang for `hang` seconds and are then dropped
+        self.hang = hang
+        self.chunk_delay = chunk_delay #Seconds between streamed chunks
+        self.runner = None
+        self.requests = 0
+        self.statuses = {}
+        self.active = 0
+        self.peak_active = 0
+
+    def _answer(self, body):
+        messages = body.get("messages") or [{}]
+        last = str(messages[-1].get("content", ""))
+        if "bot-detector" in body.get("model", ""):
+            return "No"
+        if (body.get("response_format") or {}).get("type") == "json_object": #Batched bot detection
+            return json.dumps({"verdicts": ["No"] * max(len(NUMBERED_LINE.findall(last)), 1)})
+        if self.mode == "echo":
+            return last
+        return random.choice(self.canned)
+
+    def _count(self, status):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    async def completions(self, request):
+        self.requests += 1
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            body = await request.json()
+            roll = random.random()
+            if roll < self.rate_limit:
+                self._count(429)
+                return web.json_response({"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                                         status = 429, headers = {"retry-after": "1"})
+            roll -= self.rate_limit
+            if roll < self.errors:
+                self._count(500)
+                return web.json_response({"error": {"message": "The server had an error (mock)", "type": "server_error"}}, status = 500)
+            roll -= self.errors
+            if roll < self.timeouts:
+                self._count("timeout")
+                await asyncio.sleep(self.hang)
+                if request.transport:
+                    request.transport.close()
+                return web.Response(status = 504)
+            await asyncio.sleep(self.latency())
+            answer = self._answer(body)
+            self._count(200)
+            if body.get("stream"):
+                return await self._stream(request, body, answer)
+            return web.json_response(self._completion(body, answer))
+        finally:
+            self.active -= 1
+
+    def _completion(self, body, answer):
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in body.get("messages", []))
+        completion_tokens = len(answer.split())
+        return {
+            "id": f"chatcmpl-mock{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    async def _stream(self, request, body, answer):
+        response = web.StreamResponse(headers = {"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        base = {"id": f"chatcmpl-mock{self.requests}", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "mock")}
+        deltas = [{"role": "assistant", "content": ""}] + [{"content": piece} for piece in re.findall(r"\S+\s*", answer)]
+        for delta in deltas:
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(self.chunk_delay)
+        chunk = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        await response.write(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def stats(self, request):
+        return web.json_response(self.stats_dict())
+
+    def stats_dict(self):
+        return {"requests": self.requests, "statuses": {str(status): count for status, count in self.statuses.items()}, "active": self.active, "peak active": self.peak_active}
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.completions)
+        app.router.add_post("/chat/completions", self.completions)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+def load_canned(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description = "Mock OpenAI chat completions server")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 8089)
+    parser.add_argument("--latency", default = "fixed:0.5", help = "fixed:S, uniform:LOW,HIGH, normal:MEAN,STDDEV or lognormal:MU,SIGMA")
+    parser.add_argument("--mode", choices = ["canned", "echo"], default = "canned")
+    parser.add_argument("--canned", help = "Text file with one canned response per line")
+    parser.add_argument("--rate-limit", type = float, default = 0.0, help = "Share of requests answered with a 429")
+    parser.add_argument("--errors", type = float, default = 0.0, help = "Share of requests answered with a 500")
+    parser.add_argument("--timeouts", type = float, default = 0.0, help = "Share of requests that hang and are dropped")
+    parser.add_argument("--hang", type = float, default = 30.0, help = "Seconds a timed out request hangs for")
+    parser.add_argument("--chunk-delay", type = float, default = 0.05, help = "Seconds between streamed chunks")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.host, args.port, args.latency, args.mode, load_canned(args.canned) if args.canned else None,
+                              args.rate_limit, args.errors, args.timeouts, args.hang, args.chunk_delay)
+    print(f"Mock OpenAI server on {server.base_url}, stats at http://{args.host}:{args.port}/stats")
+    web.run_app(server.app(), host = args.host, port = args.port, print = None)
+
+if __name__ == "__main__":
+    main()
@@ -8,21 +8,32 @@ import random
 import pygame
 import threading
 import queue
-import math
 from collections import deque
 from gui import TwitchBotGUI
 from dotenv import load_dotenv
 from twitchio.ext import commands
 from openai import OpenAI
-from openai_chat import OpenAiManager
-from audio_player import AudioManager
+from openai_chat import OpenAiManager, split_sentences
+from llm_scheduler import LLMRequestShed, AMBIENT
+from audio_player import AudioManager, live_stream, discard_audio
 from azure_speech_to_text import SpeechToTextManager
-from eleven_labs_manager import ElevenLabsManager
+from eleven_labs_manager import ElevenLabsManager, classify_error as classify_elevenlabs_error
+from tts_providers import TTSRouter, TTSProvider
 from obs_websockets import OBSWebsocketsManager
+from chat_context import ChatContext
+from chat_summary import RollingSummary
+from tracing import get_tracer, current_event_type, TTS, QUEUE_WAIT, PROCESS_AUDIO, OBS, PLAYBACK
+from bot_detection import BotDetector
+from prompt_registry import get_prompt_registry
+from streamathon_tracker import get_tracker, EVENT_COLUMNS, BITS, DONATION, SUB, GIFTED_SUBS
+from event_journal import get_journal, QUEUED, RENDERED, PLAYED, REMOVED, CLEARED, POINT, POINT_APPLIED
 from bot_utils import set_bot_instance, get_bot_instance, set_debug, set_currently_responding
 from eventsub_server import main as start_event_sub, ad_reset_event, trigger_ad, reload_global_variables
-from token_manager import refresh_token
-from json_manager import load_prompts, load_messages, save_messages, load_settings, save_settings, load_scheduled_messages, save_scheduled_messages, load_commands, load_tracker, save_tracker
+from token_manager import get_token_service
+from settings_model import changed_fields, AD_FIELDS, OBS_FIELDS, TTS_CACHE_FIELDS, TTS_WORKER_FIELDS
+from tts_workers import TTSWorkerPool
+from tts_cache import get_tts_cache
+from json_manager import load_prompts, load_settings, save_settings, get_settings_model, subscribe_settings, start_settings_watcher, load_scheduled_messages, save_scheduled_messages, load_commands
 
 load_dotenv()
 
@@ -30,19 +41,15 @@ CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 CLIENT_SECRET = os.getenv("TWITCH_APP_SECRET")
 BOT_TOKEN = None
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-BOT_NICK = None
-TWITCH_CHANNEL = None
+SETTINGS = None #settings_model.Settings, swapped for a new object on every reload
 TEN_MESSAGES_KEY = None
 LISTEN_AND_RESPOND_KEY = None
 VOICED_SUMMARY_KEY = None
 OBS_HOTKEY = None
-ELEVENLABS_VOICE = None
 PLAY_NEXT = None
 SKIP_AUDIO = None
 REPLAY_LAST = None
 PLAY_AD = None
-EVENT_QUEUE_ENABLED = None
-TIME_BETWEEN_EVENTS = None
 MESSAGE_RESPOND_PROMPT = {}
 SUMMARIZE_PROMPT = {}
 HELPER_PROMPT = {}
@@ -50,22 +57,8 @@ BIT_DONO = {}
 BIT_DONO_W_MSG = {}
 GIFTED_SUB = {}
 RAID = {}
-RESUB_INTERN = {}
-RESUB_EMPLOYEE = {}
-RESUB_SUPERVISOR = {}
-RESUB_TENURED = {}
 TIMED_MESSAGES = []
 COMMANDS = {}
-RAID_THRESHOLD = None
-INTERN_MONTHS = None
-EMPLOYEE_MONTHS = None
-SUPERVISOR_MONTHS = None
-NORMAL_REACTION = None
-IMPRESSED_REACTION = None
-EXAGGERATED_REACTION = None
-SCREAMING_REACTION = None
-ASSISTANT_NAME = None
-STATIONARY_ASSISTANT_NAME = None
 DEBUG = None
 AUDIO_FOLDER = os.path.join(os.path.dirname(__file__), "audio")
 PLAY_NEXT_PRESSED = False
@@ -74,7 +67,7 @@ PAUSE_EVENT_QUEUE = False
 WAS_PAUSED = False
 CURRENT_EVENT = None
 NUMBER_OF_EVENTS_IN_QUEUE = 0
-SAVE_MESSAGE_QUEUE = []
+RESPONDED_THROUGH = 0 #Last chat message seq already answered by respond_to_messages
 CURRENTLY_RESPONDING = False
 RECEIVED_MESSAGES = 0
 SUSPICIOUS_USERS = []
@@ -82,13 +75,22 @@ USERS_TO_GREET = []
 USERS_GREETED = []
 POINT_QUEUE = [] #for streamathon
 STREAMATHON_UPDATE_TASK = None
+TRACKER_EXPORT_INTERVAL = 60 #Seconds between streamathon_tracker.json exports
+JOURNAL_CHECKPOINT_INTERVAL = 30 #Seconds between checks for whether the event journal needs compacting
+STREAM_ASSISTANT_RESPONSES = True #Speak push-to-talk answers sentence by sentence while the rest is still generating
+STREAM_TTS = True #Start playing synthesized audio from its first chunk instead of waiting for the whole file
 
 openai_manager = OpenAiManager()
+bot_detector = BotDetector(openai_manager)
+prompt_registry = get_prompt_registry()
 openai_client = OpenAI(api_key = OPENAI_API_KEY)
 audio_manager = AudioManager()
 tts_manager = SpeechToTextManager()
 elevenlabs_manager = ElevenLabsManager()
 obswebsockets_manager = OBSWebsocketsManager()
+chat_context = ChatContext()
+chat_summary = RollingSummary(chat_context, openai_manager, prompt_registry)
+tracer = get_tracer()
 
 pygame.init()
 
@@ -101,65 +103,19 @@ async def pass_bot_instance():
     return bot
 
 async def set_global_variables():
-    global ELEVENLABS_VOICE
-    global BOT_NICK
-    global TWITCH_CHANNEL #For twitch chat, not eventsub
+    global SETTINGS
     global BOT_TOKEN
-    global EVENT_QUEUE_ENABLED
-    global TIME_BETWEEN_EVENTS
-    global RAID_THRESHOLD
-    global INTERN_MONTHS
-    global EMPLOYEE_MONTHS
-    global SUPERVISOR_MONTHS
-    global NORMAL_REACTION
-    global IMPRESSED_REACTION
-    global EXAGGERATED_REACTION
-    global SCREAMING_REACTION
     global DEBUG
-    global ASSISTANT_NAME
-    global STATIONARY_ASSISTANT_NAME
     global COMMANDS
-    settings = await load_settings()
-    DEBUG = settings["Debug"]
+    await load_settings()
+    SETTINGS = get_settings_model() #Raises SettingsError here if settings.json is bad
+    DEBUG = SETTINGS.debug
     set_debug(DEBUG)
-    EVENT_QUEUE_ENABLED = settings["Event Queue Enabled"]
-    TIME_BETWEEN_EVENTS = settings["Seconds Between Events"]
-    ELEVENLABS_VOICE = settings["Elevenlabs Voice ID"]
-    BOT_NICK = settings["Bot Nickname"]
-    TWITCH_CHANNEL = settings["Broadcaster Channel"]
-    RAID_THRESHOLD = settings["Raid Threshold"]
-    INTERN_MONTHS = settings["Resub"]["Intern Max Month Count"]
-    EMPLOYEE_MONTHS = settings["Resub"]["Employee Max Month Count"]
-    SUPERVISOR_MONTHS = settings["Resub"]["Supervisor Max Month Count"]
-    NORMAL_REACTION = settings["Bits"]["Normal Reaction Threshold"]
-    IMPRESSED_REACTION = settings["Bits"]["Impressed Reaction Threshold"]
-    EXAGGERATED_REACTION = settings["Bits"]["Exaggerated Reaction Threshold"]
-    SCREAMING_REACTION = settings["Bits"]["Screaming Reaction Threshold"]
-    ASSISTANT_NAME = settings["OBS Assistant Object Name"]
-    STATIONARY_ASSISTANT_NAME = settings["OBS Assistant Stationary Object Name"]
+    get_tts_cache().configure(SETTINGS.tts_cache_enabled, SETTINGS.tts_cache_mb)
+    if SETTINGS.azure_backup_voice:
+        await asyncio.to_thread(tts_manager.synthesizers.warm, SETTINGS.azure_backup_voice, stream=STREAM_TTS)
     COMMANDS = await load_commands()
-    BOT_TOKEN = refresh_token("bot", CLIENT_ID, CLIENT_SECRET)
-
-async def save_message_loop():
-    global SAVE_MESSAGE_QUEUE
-    while True:
-        if SAVE_MESSAGE_QUEUE:
-            if not CURRENTLY_RESPONDING:
-                if SAVE_MESSAGE_QUEUE[0] == "empty":
-                    await save_messages([])
-                    continue
-                else:
-                    message = SAVE_MESSAGE_QUEUE[0]
-                    messages = await load_messages()
-                    messages.append(f"{message.get("author")}: {message.get("message")}")
-                    SAVE_MESSAGE_QUEUE.pop(0)
-                    if len(messages) > 15:
-                        messages.pop(0)
-                    await save_messages(messages)
-            else:
-                await asyncio.sleep(0.5)
-        else:
-            await asyncio.sleep(1)
+    BOT_TOKEN = await get_token_service().get_token("bot")
 
 async def response_timer():
     global RECEIVED_MESSAGES, CURRENTLY_RESPONDING
@@ -175,11 +131,12 @@ async def response_timer():
 
         CURRENTLY_RESPONDING = True
         RECEIVED_MESSAGES = 0
-        await respond_to_messages()
+        with tracer.event("chat reply"):
+            await respond_to_messages()
         CURRENTLY_RESPONDING = False
 
-async def set_prompts():
-    prompts = await load_prompts()
+def compile_prompts(prompts):
+    #Prompts are compiled once here, events only fill in their placeholders
     global MESSAGE_RESPOND_PROMPT
     global SUMMARIZE_PROMPT
     global HELPER_PROMPT
@@ -187,38 +144,38 @@ async def set_prompts():
     global BIT_DONO_W_MSG
     global GIFTED_SUB
     global RAID
-    global RESUB_INTERN
-    global RESUB_EMPLOYEE
-    global RESUB_SUPERVISOR
-    global RESUB_TENURED
-    MESSAGE_RESPOND_PROMPT = {"role": "system", "content": (prompts["Respond to Messages"])}
-    SUMMARIZE_PROMPT = {"role": "system", "content": (prompts["Summarize Messages"])}
-    HELPER_PROMPT = {"role": "system", "content": (prompts["Respond to Streamer"])}
-    BIT_DONO = {"role": "system", "content": (prompts["Bit Donation w/o Message"])}
-    BIT_DONO_W_MSG = {"role": "system", "content": (prompts["Bit Donation w/ Message"])}
-    GIFTED_SUB = {"role": "system", "content": (prompts["Gifted Sub"])}
-    RAID = {"role": "system", "content": (prompts["Raid"])}
-    RESUB_INTERN = {"role": "system", "content": (prompts["Resub Intern"])}
-    RESUB_EMPLOYEE = {"role": "system", "content": (prompts["Resub Employee"])}
-    RESUB_SUPERVISOR = {"role": "system", "content": (prompts["Resub Supervisor"])}
-    RESUB_TENURED = {"role": "system", "content": (prompts["Resub Tenured Employee"])}
-
-def global_hotkey_listener(hotkey_queue, settings):
+    prompt_registry.load(prompts)
+    MESSAGE_RESPOND_PROMPT = prompt_registry.message("Respond to Messages")
+    SUMMARIZE_PROMPT = prompt_registry.message("Summarize Messages")
+    HELPER_PROMPT = prompt_registry.message("Respond to Streamer")
+    BIT_DONO = prompt_registry.message("Bit Donation w/o Message")
+    BIT_DONO_W_MSG = prompt_registry.message("Bit Donation w/ Message")
+    GIFTED_SUB = prompt_registry.message("Gifted Sub")
+    RAID = prompt_registry.message("Raid")
+
+async def set_prompts():
+    compile_prompts(await load_prompts())
+
+def register_hotkeys(hotkey_queue, hotkeys):
     # Map hotkey names to their key combos
     hotkey_map = {
-        "LISTEN_AND_RESPOND_KEY": settings["Hotkeys"]["LISTEN_AND_RESPOND_KEY"],
-        "VOICE_SUMMARIZE_KEY": settings["Hotkeys"]["VOICE_SUMMARIZE_KEY"],
-        "PLAY_NEXT_KEY": settings["Hotkeys"]["PLAY_NEXT_KEY"],
-        "SKIP_CURRENT_KEY": settings["Hotkeys"]["SKIP_CURRENT_KEY"],
-        "REPLAY_LAST_KEY": settings["Hotkeys"]["REPLAY_LAST_KEY"],
-        "PAUSE_QUEUE": settings["Hotkeys"]["PAUSE_QUEUE"],
-        "PLAY_AD": settings["Hotkeys"]["PLAY_AD"]
+        "LISTEN_AND_RESPOND_KEY": hotkeys.listen_and_respond,
+        "VOICE_SUMMARIZE_KEY": hotkeys.voice_summarize,
+        "PLAY_NEXT_KEY": hotkeys.play_next,
+        "SKIP_CURRENT_KEY": hotkeys.skip_current,
+        "REPLAY_LAST_KEY": hotkeys.replay_last,
+        "PAUSE_QUEUE": hotkeys.pause_queue,
+        "PLAY_AD": hotkeys.play_ad
     }
+    keyboard.unhook_all_hotkeys()
     for name, combo in hotkey_map.items():
         if combo:  # Only register if combo is not empty
             if DEBUG:
                 print(f"[DEBUG]Registering hotkey: {combo} for {name}")
             keyboard.add_hotkey(combo, lambda n=name: hotkey_queue.put(n))
+
+def global_hotkey_listener(hotkey_queue, hotkeys):
+    register_hotkeys(hotkey_queue, hotkeys)
     # Block forever (or until main thread exits)
     keyboard.wait()
 
@@ -226,48 +183,65 @@ async def respond_to_messages():
     if DEBUG:
         print("[DEBUG]Respond to messages called")
 
-    messages = await load_messages()
+    global RESPONDED_THROUGH
+    answered_through = chat_context.last_seq
+    messages = chat_context.lines(count = 15, after_seq = RESPONDED_THROUGH)
     messages_str = "\n".join(messages)
     prompt = [MESSAGE_RESPOND_PROMPT, 
               {"role": "user", "content": messages_str}]
-    chatGPT = asyncio.to_thread(openai_manager.chat, prompt, True)
-    channel = global_bot_instance.get_channel(TWITCH_CHANNEL)
-    response = await chatGPT
+    chatGPT = openai_manager.chat_async(prompt, True, priority = AMBIENT)
+    channel = global_bot_instance.get_channel(SETTINGS.broadcaster_channel)
+    try:
+        response = await chatGPT
+    except LLMRequestShed as e:
+        print(f"[yellow]Skipped replying to chat, {e}.")
+        return
     await channel.send(response)
-    SAVE_MESSAGE_QUEUE.insert(0, "empty") #Empties message json after this is triggered
+    RESPONDED_THROUGH = answered_through #Messages that arrived while responding are kept for next time
     return
 
-async def tts(response):
-    settings = await load_settings()
-    model = settings["Elevenlabs Synthesizer Model"]
+def elevenlabs_tts(text, stream):
+    if stream:
+        output = elevenlabs_manager.text_to_audio_stream(text, SETTINGS.elevenlabs_voice, model=SETTINGS.elevenlabs_model)
+        return getattr(output, "file_path", output) #Still arriving, assistant_responds plays it live until the file is saved
+    return elevenlabs_manager.text_to_audio(text, SETTINGS.elevenlabs_voice, False, model=SETTINGS.elevenlabs_model)
+
+def azure_tts(text, stream):
+    output = tts_manager.text_to_speech(text, SETTINGS.azure_backup_voice, stream=stream)
+    return getattr(output, "file_path", output)
+
+tts_router = TTSRouter([
+    TTSProvider("ElevenLabs", elevenlabs_tts, classify_elevenlabs_error),
+    TTSProvider("Azure", azure_tts),
+], discard = discard_audio)
+
+async def tts(response, stream: bool = STREAM_TTS):
+    with tracer.span(TTS):
+        return await tts_router.synthesize(response, stream)
+
+async def tts_sentences(pieces, outputs: asyncio.Queue):
+    #Starts TTS for each sentence as soon as the model finishes it. The player awaits them in order, None ends the answer.
     try:
-        output = await asyncio.to_thread(elevenlabs_manager.text_to_audio, response, ELEVENLABS_VOICE, False, model=model)
+        async for sentence in split_sentences(pieces):
+            outputs.put_nowait(asyncio.create_task(tts(sentence, stream = False))) #Sentences are short, and the player needs whole files
     except Exception as e:
-        print(await parse_elevenlabs_exception(e))
-        voice = settings["Azure TTS Backup Voice"]
-        output = await asyncio.to_thread(tts_manager.text_to_speech, response, voice)
-    return output
-
-async def parse_elevenlabs_exception(exception):
-    import ast
-    error_text = str(exception)
-    if "quota_exceeded" in error_text and "credits" in error_text:
-        try:
-            body_start = error_text.find("body: ")
-            body_str = error_text[body_start + 6:].strip()
-            if body_str.endswith("}"):
-                body_dict = ast.literal_eval(body_str)
-                message = body_dict["detail"]["message"]
-
-                remaining = re.search(r"have (\d+) credits", message)
-                required = re.search(r"(\d+) credits are required", message)
-                if remaining and required:
-                    return f"[ERROR] ElevenLabs quota exceeded: {remaining.group(1)} credits remaining, {required.group(1)} required."
-                else:
-                    return f"[ERROR] ElevenLabs quota exceeded: {message}"
-        except Exception as parse_error:
-            return f"[ERROR] Failed to parse ElevenLabs exception: {parse_error}"
-    return str(exception)
+        print(f"[ERROR]Streaming answer failed: {e}")
+    finally:
+        outputs.put_nowait(None)
+
+async def discard_sentences(producer, outputs: asyncio.Queue):
+    #The answer was cut off or finished early, so nothing will play the sentences still queued or being synthesized
+    producer.cancel()
+    await asyncio.gather(producer, return_exceptions = True)
+    tasks = []
+    while not outputs.empty():
+        task = outputs.get_nowait()
+        if task is not None:
+            task.cancel()
+            tasks.append(task)
+    for output in await asyncio.gather(*tasks, return_exceptions = True):
+        if isinstance(output, str):
+            discard_audio(output)
 
 async def greet_newcomers():
     if DEBUG:
@@ -285,7 +259,7 @@ async def greet_newcomers():
     for name in USERS_TO_GREET:
         USERS_GREETED.append(name)
     USERS_TO_GREET = []
-    channel = global_bot_instance.get_channel(TWITCH_CHANNEL)
+    channel = global_bot_instance.get_channel(SETTINGS.broadcaster_channel)
     await channel.send(response)
 
 async def ask_maddieply():
@@ -311,13 +285,20 @@ async def ask_maddieply():
             PAUSE_EVENT_QUEUE = False
         return
 
-    chatGPT = asyncio.to_thread(openai_manager.chat_with_history, mic_result, converational = False) #Change to a different fine-tuned model
-    response = await chatGPT
+    producer = None
+    if STREAM_ASSISTANT_RESPONSES:
+        outputs = asyncio.Queue()
+        producer = asyncio.create_task(tts_sentences(openai_manager.stream_chat_with_history(mic_result, conversational = False), outputs))
+        set_currently_responding(True)
+        CURRENT_EVENT = asyncio.create_task(global_bot_instance.assistant_responds_stream(outputs))
+    else:
+        chatGPT = openai_manager.chat_with_history_async(mic_result, conversational = False) #Change to a different fine-tuned model
+        response = await chatGPT
 
-    output = await tts(response)
+        output = await tts(response)
 
-    set_currently_responding(True)
-    CURRENT_EVENT = asyncio.create_task(global_bot_instance.assistant_responds(output))
+        set_currently_responding(True)
+        CURRENT_EVENT = asyncio.create_task(global_bot_instance.assistant_responds(output))
     try:
         await CURRENT_EVENT
     except asyncio.CancelledError:
@@ -327,6 +308,8 @@ async def ask_maddieply():
         if DEBUG:
             print(f"[ERROR]Error in assistant response: {e}")
     finally:
+        if producer:
+            await discard_sentences(producer, outputs)
         if not WAS_PAUSED:
             PAUSE_EVENT_QUEUE = False
         CURRENT_EVENT = None
@@ -341,13 +324,12 @@ async def summarize_chat():
         WAS_PAUSED = True
     PAUSE_EVENT_QUEUE = True
 
-    messages = await load_messages()
-    messages_str = "\n".join(messages)
-    full_prompt = [SUMMARIZE_PROMPT,
-                   {"role": "user", "content": messages_str}]
-    chatGPT = asyncio.to_thread(openai_manager.chat, full_prompt, conversational = False) #Change to a different fine-tuned model
-
-    response = await chatGPT
+    response = await chat_summary.current() #Kept up to date in the background, only new lines are folded in here
+    if not response:
+        print("[yellow]Nothing in chat to summarize yet.")
+        if not WAS_PAUSED:
+            PAUSE_EVENT_QUEUE = False
+        return
     output = await tts(response)
 
     set_currently_responding(True)
@@ -387,11 +369,13 @@ async def process_hotkey_queue(bot, hotkey_queue): #Async loop
             print(f"[yellow]Event Queue {"paused" if PAUSE_EVENT_QUEUE else "unpaused"}!")
             #May alter scene object using obs_websockets in future
         elif hotkey == "LISTEN_AND_RESPOND_KEY":
-            await ask_maddieply()
+            with tracer.event("ask"):
+                await ask_maddieply()
         elif hotkey == "VOICE_SUMMARIZE_KEY":
-            await summarize_chat()
+            with tracer.event("summarize"):
+                await summarize_chat()
         elif hotkey == "PLAY_NEXT_KEY":
-            if not PLAY_NEXT_PRESSED and (EVENT_QUEUE_ENABLED or PAUSE_EVENT_QUEUE):
+            if not PLAY_NEXT_PRESSED and (SETTINGS.event_queue_enabled or PAUSE_EVENT_QUEUE):
                 PLAY_NEXT_PRESSED = True
         elif hotkey == "SKIP_CURRENT_KEY":
             if CURRENT_EVENT and not CURRENT_EVENT.done():
@@ -411,7 +395,7 @@ async def replay_last(bot):
     audio = bot.event_queue.get_last()
     bot.event_queue.is_playing = True
     set_currently_responding(True)
-    CURRENT_EVENT = asyncio.create_task(bot.assistant_responds(audio))
+    CURRENT_EVENT = asyncio.create_task(bot.assistant_responds(audio, "replay"))
     try:
         await CURRENT_EVENT
     except asyncio.CancelledError:
@@ -430,32 +414,123 @@ async def replay_last(bot):
 async def rng(minimum: int, maximum: int):
     return random.randint(minimum, maximum)
 
-async def delete_all_audio_files(folder_path: str):
+async def delete_all_audio_files(folder_path: str, keep = ()):
+    keep = {os.path.abspath(path) for path in keep if path}
     for ext in ("*.mp3", "*.wav"):
         for file_path in glob.glob(os.path.join(folder_path, ext)):
-            os.remove(file_path)
+            if os.path.abspath(file_path) not in keep:
+                os.remove(file_path)
+
+def queue_points(user: str, event: str, amount): #Journaled first so a crash can't drop the points
+    if event not in EVENT_COLUMNS:
+        print(f"[ERROR]Not queueing streamathon points for unknown event \"{event}\".")
+        return
+    journal = get_journal()
+    with journal.lock:
+        event_id = journal.append(POINT, user = user, event = event, amount = amount)
+        POINT_QUEUE.append({"id": event_id, "user": user, "event": event, "amount": amount})
+
+def recover_from_journal(bot):
+    state = get_journal().recovered
+    bot.event_queue.restore(state["queue"], state["played"])
+    if state["points"]:
+        last_counted = get_tracker().last_point_id()
+        POINT_QUEUE.extend(point for point in state["points"] if point["id"] > last_counted)
+    if bot.event_queue.queue or POINT_QUEUE:
+        print(f"[green]Recovered {len(bot.event_queue.queue)} queued events and {len(POINT_QUEUE)} point events from the journal.")
+
+async def journal_checkpoint_loop(bot):
+    journal = get_journal()
+    while True:
+        await asyncio.sleep(JOURNAL_CHECKPOINT_INTERVAL)
+        if journal.needs_checkpoint():
+            try:
+                seq, state = journal.snapshot({"queue": bot.event_queue.queue, "played": bot.event_queue.played, "points": POINT_QUEUE})
+                await asyncio.to_thread(journal.checkpoint, seq, state)
+            except Exception as e:
+                print(f"[ERROR]Failed to checkpoint event journal: {e}")
 
 class EventQueue:
     def __init__(self):
         self.queue = []
         self.played = []
         self.is_playing = False
+        self.current_type = None #Traced event type of the event taken last
+        self.on_change = None #Set by the TTS worker pool, events arrive as text and are rendered ahead of playback
+        self.journal = get_journal()
+
+    def restore(self, queue: list, played: list): #Rebuilds the queue from the journal, dropping events whose audio is gone
+        global NUMBER_OF_EVENTS_IN_QUEUE
+        self.queue = []
+        for event in queue: #Events still waiting for audio, or whose audio never finished saving, are rendered again from their text
+            if event.get("audio") and os.path.exists(event["audio"]):
+                self.queue.append(event)
+            elif event.get("text"):
+                event["audio"] = None
+                self.queue.append(event)
+        self.played = [event for event in played if event.get("audio") and os.path.exists(event["audio"])]
+        NUMBER_OF_EVENTS_IN_QUEUE = len(self.queue)
     
     def add_audio(self, event: dict): #Adds event to the end of the queue
         global NUMBER_OF_EVENTS_IN_QUEUE
-        self.queue.append(event)
+        if not event.get("audio") and not event.get("text"):
+            print(f"[WARNING]Dropped {event.get("event_type", "an event")}, it has nothing to say.")
+            return
+        event["queued_at"] = time.time()
+        event.setdefault("trace", current_event_type())
+        with self.journal.lock:
+            self.journal.append(QUEUED, event = event, front = False)
+            self.queue.append(event)
         NUMBER_OF_EVENTS_IN_QUEUE += 1
+        if self.on_change:
+            self.on_change()
         if DEBUG:
             print(f"[green]Audio added to queue, length: {NUMBER_OF_EVENTS_IN_QUEUE}")
         #"type": "event" or "audio", "audio": "audio_file_path", "from_user": "username", "event_type": "event_type"
 
     def add_event(self, event: dict): #Adds event to the front of the queue for priority
         global NUMBER_OF_EVENTS_IN_QUEUE
-        self.queue.insert(0, event)
+        if not event.get("audio") and not event.get("text"):
+            print(f"[WARNING]Dropped {event.get("event_type", "an event")}, it has nothing to say.")
+            return
+        event["queued_at"] = time.time()
+        event.setdefault("trace", current_event_type())
+        with self.journal.lock:
+            self.journal.append(QUEUED, event = event, front = True)
+            self.queue.insert(0, event)
         NUMBER_OF_EVENTS_IN_QUEUE += 1
+        if self.on_change:
+            self.on_change()
         if DEBUG:
             print(f"[green]Event added to queue, length: {NUMBER_OF_EVENTS_IN_QUEUE}")
 
+    def _taken(self, event): #Event is leaving the queue to be played
+        self.current_type = event.get("trace")
+        if event.get("queued_at"):
+            tracer.record(QUEUE_WAIT, time.time() - event["queued_at"], self.current_type)
+
+    def next_ready(self): #False while the next event is still being synthesized
+        return bool(self.queue) and bool(self.queue[0].get("audio"))
+
+    def set_audio(self, event, audio): #False if the event left the queue while it was being synthesized
+        with self.journal.lock:
+            for index, queued in enumerate(self.queue):
+                if queued is event:
+                    self.journal.append(RENDERED, index = index, audio = audio)
+                    event["audio"] = audio
+                    return True
+        return False
+
+    def discard(self, event): #Drops an event that could not be synthesized
+        global NUMBER_OF_EVENTS_IN_QUEUE
+        with self.journal.lock:
+            for index, queued in enumerate(self.queue):
+                if queued is event:
+                    self.journal.append(REMOVED, index = index, from_played = False)
+                    self.queue.pop(index)
+                    NUMBER_OF_EVENTS_IN_QUEUE -= 1
+                    return
+
     def is_next_event(self):
         if not self.queue:
             return False
@@ -469,9 +544,12 @@ class EventQueue:
         if self.queue:
             global NUMBER_OF_EVENTS_IN_QUEUE
             self.is_playing = True
-            event = self.queue.pop(0)
+            with self.journal.lock:
+                self.journal.append(PLAYED, index = 0)
+                event = self.queue.pop(0)
+                self.played.append(event)
             NUMBER_OF_EVENTS_IN_QUEUE -= 1
-            self.played.append(event)
+            self._taken(event)
             return event["audio"]
         return None
     
@@ -485,16 +563,20 @@ class EventQueue:
             return event["audio"]
         return None
     
-    def play_event(self, event_index: int):
-        if self.queue and not self.is_playing:
+    def play_event(self, event: dict): #Found by identity, events can be added or dropped while it was being rendered
+        if self.queue and not self.is_playing and event.get("audio"):
             global NUMBER_OF_EVENTS_IN_QUEUE
-            self.is_playing = True
-            event = self.queue[event_index]
-            audio = event["audio"]
+            with self.journal.lock:
+                event_index = next((index for index, queued in enumerate(self.queue) if queued is event), None)
+                if event_index is None:
+                    return False
+                self.is_playing = True
+                self.journal.append(PLAYED, index = event_index)
+                self.played.append(event)
+                self.queue.pop(event_index)
             NUMBER_OF_EVENTS_IN_QUEUE -= 1
-            self.played.append(event)
-            self.queue.pop(event_index)
-            return audio
+            self._taken(event)
+            return event["audio"]
         return False
     
     def replay_event(self, event_index: int): #Used to replay an event selected from GUI
@@ -505,12 +587,14 @@ class EventQueue:
         return False
     
     def remove_event(self, event_index: int, previous_event: bool): #Used to remove an event from the queue using the GUI
-        if not previous_event:
-            audio = self.queue[event_index]["audio"]
-            self.queue.pop(event_index)
-        else:
-            audio = self.played[event_index]["audio"]
-            self.played.pop(event_index)
+        with self.journal.lock:
+            self.journal.append(REMOVED, index = event_index, from_played = previous_event)
+            if not previous_event:
+                audio = self.queue[event_index]["audio"]
+                self.queue.pop(event_index)
+            else:
+                audio = self.played[event_index]["audio"]
+                self.played.pop(event_index)
         return audio
 
 
@@ -526,11 +610,13 @@ class EventQueue:
         return self.played
     
     def clear(self):
-        self.queue.clear()
+        with self.journal.lock:
+            self.journal.append(CLEARED)
+            self.queue.clear()
 
 class Bot(commands.Bot):
     def __init__(self, gui_queue):
-        super().__init__(token=BOT_TOKEN, prefix="!", nick=BOT_NICK, initial_channels=[TWITCH_CHANNEL])
+        super().__init__(token=BOT_TOKEN, prefix="!", nick=SETTINGS.bot_nickname, initial_channels=[SETTINGS.broadcaster_channel])
 
         global global_bot_instance
         global_bot_instance = self
@@ -544,24 +630,36 @@ class Bot(commands.Bot):
         self.ad = trigger_ad
 
         self.event_queue = EventQueue()
+        self.tts_pool = TTSWorkerPool(self.event_queue, tts, SETTINGS.tts_workers, SETTINGS.tts_look_ahead, tag = lambda event: tracer.tagged(event.get("trace")), discard = discard_audio)
+        self.loop_for_settings = None #Set once the bot is running, changes seen before then are already in SETTINGS
+        subscribe_settings(self.settings_file_changed) #Once here, event_ready can fire again on reconnect
+
+    def settings_file_changed(self, _): #Runs on the settings watcher thread
+        if self.loop_for_settings:
+            asyncio.run_coroutine_threadsafe(self.reload_global_variable(), self.loop_for_settings)
 
     async def event_ready(self):
         print(f"[green]Bot {self.nick} is online!")
-        asyncio.create_task(delete_all_audio_files(AUDIO_FOLDER))
+        asyncio.create_task(delete_all_audio_files(AUDIO_FOLDER, keep = [event["audio"] for event in self.event_queue.queue + self.event_queue.played]))
+        asyncio.create_task(journal_checkpoint_loop(self))
         asyncio.create_task(self.start_automated_messages())
+        self.tts_pool.start()
         asyncio.create_task(self.event_loop())
-        asyncio.create_task(save_message_loop())
+        asyncio.create_task(chat_context.snapshot_loop())
+        asyncio.create_task(chat_summary.run())
+        asyncio.create_task(tracer.export_loop())
         asyncio.create_task(response_timer())
-        asyncio.create_task(obswebsockets_manager.set_local_variables())
-        settings = await load_settings()
-        if settings["Streamathon Mode"]:
+        asyncio.create_task(obswebsockets_manager.set_local_variables(SETTINGS))
+        self.loop_for_settings = asyncio.get_running_loop()
+        start_settings_watcher()
+        if SETTINGS.streamathon_mode:
             global STREAMATHON_UPDATE_TASK 
             STREAMATHON_UPDATE_TASK = asyncio.create_task(self.update_bar_loop())
-        device = settings["Audio Output Device"]
+        device = SETTINGS.audio_output_device
         if device:
             audio_manager.set_output_device(device)
         
-        channel = self.get_channel(TWITCH_CHANNEL)
+        channel = self.get_channel(SETTINGS.broadcaster_channel)
         await channel.send("Bot online!")
 
     async def event_loop(self):
@@ -570,7 +668,10 @@ class Bot(commands.Bot):
             if self.event_queue.is_playing:
                 await asyncio.sleep(1)
                 continue
-            if EVENT_QUEUE_ENABLED:
+            if not self.event_queue.is_empty() and not self.event_queue.next_ready():
+                await asyncio.sleep(0.1) #The TTS workers always render the head of the queue first
+                continue
+            if SETTINGS.event_queue_enabled:
                 if self.event_queue.is_next_event():
                     if DEBUG:
                         print("[green]Next event is priority, playing next event.")
@@ -578,7 +679,7 @@ class Bot(commands.Bot):
                     PREVIOUS_AUDIO = audio
                     if audio:
                         set_currently_responding(True)
-                        CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio))
+                        CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio, self.event_queue.current_type))
                         try:
                             await CURRENT_EVENT
                         except asyncio.CancelledError:
@@ -599,7 +700,7 @@ class Bot(commands.Bot):
                     audio = self.event_queue.get_next()
                     PREVIOUS_AUDIO = audio
                     set_currently_responding(True)
-                    CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio))
+                    CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio, self.event_queue.current_type))
                     try:
                         await CURRENT_EVENT
                     except asyncio.CancelledError:
@@ -611,19 +712,19 @@ class Bot(commands.Bot):
                         self.event_queue.is_playing = False
                         CURRENT_EVENT = None
                         set_currently_responding(False)
-                        await asyncio.sleep(TIME_BETWEEN_EVENTS if not self.event_queue.is_next_event() else 0.5)
+                        await asyncio.sleep(SETTINGS.seconds_between_events if not self.event_queue.is_next_event() else 0.5)
                 else:
                     await asyncio.sleep(0.1)
                 continue
 
             if self.event_queue.is_empty():
-                await asyncio.sleep(TIME_BETWEEN_EVENTS)
+                await asyncio.sleep(SETTINGS.seconds_between_events)
             elif not PAUSE_EVENT_QUEUE or PLAY_NEXT_PRESSED:
                 audio = self.event_queue.get_next()
                 PREVIOUS_AUDIO = audio
                 if audio:
                     set_currently_responding(True)
-                    CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio))
+                    CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio, self.event_queue.current_type))
                     try:
                         await CURRENT_EVENT
                     except asyncio.CancelledError:
@@ -636,7 +737,7 @@ class Bot(commands.Bot):
                         CURRENT_EVENT = None
                         set_currently_responding(False)
                     if not self.event_queue.is_next_event():
-                        await asyncio.sleep(TIME_BETWEEN_EVENTS)
+                        await asyncio.sleep(SETTINGS.seconds_between_events)
                     else:
                         await asyncio.sleep(0.5)
                 if PLAY_NEXT_PRESSED:
@@ -655,10 +756,18 @@ class Bot(commands.Bot):
         if is_replay:
             audio = self.event_queue.replay_event(event_index)
         else:
-            audio = self.event_queue.play_event(event_index)
+            event = self.event_queue.get_event(event_index)
+            audio = False
+            if event and await self.tts_pool.render_now(event):
+                audio = self.event_queue.play_event(event)
+            if not audio:
+                print("[WARNING]That event is no longer in the queue or could not be synthesized.")
+                if not WAS_PAUSED:
+                    PAUSE_EVENT_QUEUE = False
+                return
 
         set_currently_responding(True)  
-        CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio))
+        CURRENT_EVENT = asyncio.create_task(self.assistant_responds(audio, "replay" if is_replay else self.event_queue.current_type))
         try:
             await CURRENT_EVENT
         except asyncio.CancelledError:
@@ -675,35 +784,10 @@ class Bot(commands.Bot):
 
     async def remove_specific_event(self, event_index: int, is_repeat: bool):
         audio = self.event_queue.remove_event(event_index, True if is_repeat else False)
-        try:
-            os.remove(audio)
-        except:
-            print("[ERROR]Failed to delete audio file, will be purged on next startup.")
-
-    async def calculate_streamathon_points(self):
-        tracker = await load_tracker()
-        bits = tracker["Amount of Bits Donated"]
-        donations = tracker["Amount of Money Donated"]
-        subs = tracker["Number of Subs"]
-        bit_points = (bits // tracker["Point Values"]["One Point Per Bits"])
-        donation_points = math.floor(donations * tracker["Point Values"]["Donation Per Dollar"])
-        sub_points = math.floor(subs * tracker["Point Values"]["Sub"])
-        total_points = bit_points + donation_points + sub_points
-        tracker["Current Point Total"] = total_points
-        key_reached = None
-        if total_points > tracker["Next Goal"]:
-            tracker["Last Goal Reached"] = tracker["Next Goal"]
-            for key, goal in tracker["Goals"].items():
-                if goal > tracker["Next Goal"]:
-                    tracker["Next Goal"] = goal
-                    asyncio.create_task(self.milestone_reached(key_reached))
-                    break
-                elif goal == tracker["Last Goal Reached"]:
-                    key_reached = key
-        await save_tracker(tracker)
+        discard_audio(audio) #None when removed before it was synthesized
 
     async def obs_capture_location(self, is_onscreen):
-        transform = await asyncio.create_task(obswebsockets_manager.capture_location(is_onscreen, ASSISTANT_NAME))
+        transform = await asyncio.create_task(obswebsockets_manager.capture_location(is_onscreen, SETTINGS.obs_assistant_name))
         settings = await load_settings()
         if transform is None:
             print("[ERROR]Transform is None")
@@ -728,127 +812,81 @@ class Bot(commands.Bot):
     async def update_bar_loop(self):
         print("[green]Started Streamathon Mode tracking!")
         global POINT_QUEUE
+        tracker = get_tracker()
+        last_export = time.time()
+        needs_export = False
         while True:
             try:
                 if POINT_QUEUE:
-                    event = POINT_QUEUE[0]
-                    reason = event["event"]
-                    amount = event["amount"]
-                    contributor = event["user"]
-                    POINT_QUEUE.pop(0)
-                    tracker = await load_tracker()
-                    contributors = tracker["Contributors"]
-                    if contributor not in contributors:
-                        contributors[contributor] = {
-                            "Subbed": False,
-                            "Gifted Subs Donated": 0,
-                            "Bits Donated": 0,
-                            "Money Donated": 0
-                            }
-                    if reason == "bits":
-                        tracker["Amount of Bits Donated"] += amount
-                        contributors[contributor]["Bits Donated"] += amount
-                    elif reason == "donation": #Placeholder in case ever want to include donations
-                        tracker["Amount of Money Donated"] += amount
-                        contributors[contributor]["Money Donated"] += amount
-                    elif reason == "sub":
-                        tracker["Number of Subs"] += amount
-                        contributors[contributor]["Subbed"] = True
-                    elif reason == "gifted_subs":
-                        tracker["Number of Subs Gifted"] += amount
-                        contributors[contributor]["Gifted Subs Donated"] += amount
-                        await save_tracker(tracker)
-                        continue
-                    await save_tracker(tracker)
-                    await self.calculate_streamathon_points()
+                    event = POINT_QUEUE[0] #Stays queued until applied, the tracker skips it if a snapshot brings it back
+                    goal_advanced, key_reached = tracker.add_points(event["user"], event["event"], event["amount"], event.get("id"))
+                    with get_journal().lock:
+                        POINT_QUEUE.pop(0)
+                        get_journal().append(POINT_APPLIED, id = event.get("id"))
+                    if goal_advanced:
+                        asyncio.create_task(self.milestone_reached(key_reached))
+                    needs_export = True
+                if needs_export and time.time() - last_export >= TRACKER_EXPORT_INTERVAL:
+                    await tracker.export_json()
+                    needs_export = False
+                    last_export = time.time()
                 await asyncio.create_task(obswebsockets_manager.update_bar(0))
                 await asyncio.sleep(0.2)
             except Exception as e:
                 print(f"[ERROR][update_bar_loop] {e}")
 
     async def manual_donation_entry(self, amount):
-        global POINT_QUEUE
-        POINT_QUEUE.append({"user": "manual", "event": "donation", "amount": amount})
+        queue_points("manual", DONATION, amount)
 
     async def milestone_reached(self, goal_reached_key):
         global WAS_PAUSED, PAUSE_EVENT_QUEUE
-        tracker = await load_tracker()
-        prompts = await load_prompts()
-        amount = tracker["Goals"][goal_reached_key]
+        amount = get_tracker().goals[goal_reached_key]
         if amount == 650:
             return #Don't need to announce this one
-        prompt1 = {"role": "system", "content": prompts["Streamathon"]}
+        prompt1 = prompt_registry.message("Streamathon")
         prompt2 = {"role": "user", "content": f"Maddie, we have just reached one of our goals! Excitedly announce this to ModdiPly and the twitch channel. Tell them what the goal was for. Goal: {goal_reached_key}"}
         full_prompt = [prompt1, prompt2]
-        chatGPT = asyncio.to_thread(openai_manager.chat, full_prompt, False) #Change to a different fine-tuned model
+        chatGPT = openai_manager.chat_async(full_prompt, False) #Change to a different fine-tuned model
         response = await chatGPT
-        output = await tts(response)
 
-        queued_event = {"type": "event", "audio": output, "from_user": "MaddiePly", "event_type": "Goal Reached"}
+        queued_event = {"type": "event", "text": response, "audio": None, "from_user": "MaddiePly", "event_type": "Goal Reached"}
         self.event_queue.add_event(queued_event)
 
     async def reload_global_variable(self):
-        settings = await load_settings()
-        task = asyncio.create_task(reload_global_variables()) #From eventsub_server.py
-        global ELEVENLABS_VOICE
-        global RAID_THRESHOLD
-        global INTERN_MONTHS
-        global EMPLOYEE_MONTHS
-        global SUPERVISOR_MONTHS
-        global NORMAL_REACTION
-        global IMPRESSED_REACTION
-        global EXAGGERATED_REACTION
-        global SCREAMING_REACTION
-        global ASSISTANT_NAME
-        global STATIONARY_ASSISTANT_NAME
-        global EVENT_QUEUE_ENABLED
-        global TIME_BETWEEN_EVENTS
+        global SETTINGS
+        global DEBUG
         global STREAMATHON_UPDATE_TASK
-        EVENT_QUEUE_ENABLED = settings["Event Queue Enabled"]
-        TIME_BETWEEN_EVENTS = settings["Seconds Between Events"]
-        ELEVENLABS_VOICE = settings["Elevenlabs Voice ID"]
-        RAID_THRESHOLD = settings["Raid Threshold"]
-        INTERN_MONTHS = settings["Resub"]["Intern Max Month Count"]
-        EMPLOYEE_MONTHS = settings["Resub"]["Employee Max Month Count"]
-        SUPERVISOR_MONTHS = settings["Resub"]["Supervisor Max Month Count"]
-        NORMAL_REACTION = settings["Bits"]["Normal Reaction Threshold"]
-        IMPRESSED_REACTION = settings["Bits"]["Impressed Reaction Threshold"]
-        EXAGGERATED_REACTION = settings["Bits"]["Exaggerated Reaction Threshold"]
-        SCREAMING_REACTION = settings["Bits"]["Screaming Reaction Threshold"]
-        ASSISTANT_NAME = settings["OBS Assistant Object Name"]
-        STATIONARY_ASSISTANT_NAME = settings["OBS Assistant Stationary Object Name"]
-        if settings["Streamathon Mode"] and not STREAMATHON_UPDATE_TASK:
-            STREAMATHON_UPDATE_TASK = asyncio.create_task(self.update_bar_loop())
-        elif not settings["Streamathon Mode"] and STREAMATHON_UPDATE_TASK:
-            STREAMATHON_UPDATE_TASK.cancel()
-        await task
+        previous = SETTINGS
+        SETTINGS = get_settings_model()
+        changed = changed_fields(previous, SETTINGS)
+        if not changed:
+            return
+        if "debug" in changed:
+            DEBUG = SETTINGS.debug
+            set_debug(DEBUG)
+        if changed & AD_FIELDS:
+            await reload_global_variables() #From eventsub_server.py
+        if changed & OBS_FIELDS:
+            await obswebsockets_manager.set_local_variables(SETTINGS)
+        if changed & TTS_WORKER_FIELDS:
+            self.tts_pool.configure(SETTINGS.tts_workers, SETTINGS.tts_look_ahead)
+        if changed & TTS_CACHE_FIELDS:
+            await asyncio.to_thread(get_tts_cache().configure, SETTINGS.tts_cache_enabled, SETTINGS.tts_cache_mb)
+        if "audio_output_device" in changed and SETTINGS.audio_output_device is not None:
+            audio_manager.set_output_device(SETTINGS.audio_output_device)
+        if "hotkeys" in changed:
+            register_hotkeys(hotkey_queue, SETTINGS.hotkeys)
+        if "streamathon_mode" in changed:
+            if SETTINGS.streamathon_mode and not STREAMATHON_UPDATE_TASK:
+                STREAMATHON_UPDATE_TASK = asyncio.create_task(self.update_bar_loop())
+            elif not SETTINGS.streamathon_mode and STREAMATHON_UPDATE_TASK:
+                STREAMATHON_UPDATE_TASK.cancel()
+                STREAMATHON_UPDATE_TASK = None
         if DEBUG:
-            print("[green]Reloaded global variables into memory.")
+            print(f"[green]Reloaded settings: {", ".join(sorted(changed))}.")
 
     async def reload_global_prompts(self):
-        prompts = await load_prompts()
-        global MESSAGE_RESPOND_PROMPT
-        global SUMMARIZE_PROMPT
-        global HELPER_PROMPT
-        global BIT_DONO
-        global BIT_DONO_W_MSG
-        global GIFTED_SUB
-        global RAID
-        global RESUB_INTERN
-        global RESUB_EMPLOYEE
-        global RESUB_SUPERVISOR
-        global RESUB_TENURED
-        MESSAGE_RESPOND_PROMPT = {"role": "system", "content": (prompts["Respond to Messages"])}
-        SUMMARIZE_PROMPT = {"role": "system", "content": (prompts["Summarize Messages"])}
-        HELPER_PROMPT = {"role": "system", "content": (prompts["Respond to Streamer"])}
-        BIT_DONO = {"role": "system", "content": (prompts["Bit Donation w/o Message"])}
-        BIT_DONO_W_MSG = {"role": "system", "content": (prompts["Bit Donation w/ Message"])}
-        GIFTED_SUB = {"role": "system", "content": (prompts["Gifted Sub"])}
-        RAID = {"role": "system", "content": (prompts["Raid"])}
-        RESUB_INTERN = {"role": "system", "content": (prompts["Resub Intern"])}
-        RESUB_EMPLOYEE = {"role": "system", "content": (prompts["Resub Employee"])}
-        RESUB_SUPERVISOR = {"role": "system", "content": (prompts["Resub Supervisor"])}
-        RESUB_TENURED = {"role": "system", "content": (prompts["Resub Tenured Employee"])}
+        compile_prompts(await load_prompts())
         if DEBUG:
             print("[green]Reloaded global prompts into memory.")
 
@@ -969,59 +1007,132 @@ class Bot(commands.Bot):
 
     async def send_message(self, message):
         try:
-            channel = self.get_channel(TWITCH_CHANNEL)
+            channel = self.get_channel(SETTINGS.broadcaster_channel)
             if channel:
                 await channel.send(message)
             else:
-                print(f"[ERROR]Channel '{TWITCH_CHANNEL}' not found.")
+                print(f"[ERROR]Channel '{SETTINGS.broadcaster_channel}' not found.")
         except Exception as e:
             print(f"[ERROR]Exception while sending message: {e}")
 
-    async def assistant_responds(self, output): #This will need to be adjusted to account for stationary maddie
+    async def assistant_responds(self, output, event_type = None): #This will need to be adjusted to account for stationary maddie
+        stream = live_stream(output)
+        if stream:
+            return await self.assistant_responds_live(stream, event_type)
         try:
-            settings = await load_settings()
             audio_process = asyncio.create_task(audio_manager.process_audio(output))
-            original_transform = obswebsockets_manager.activate_assistant(ASSISTANT_NAME, STATIONARY_ASSISTANT_NAME)
+            with tracer.span(OBS, event_type):
+                original_transform = obswebsockets_manager.activate_assistant(SETTINGS.obs_assistant_name, SETTINGS.obs_stationary_assistant_name)
             wait = asyncio.sleep(1)
 
-            volumes, total_duration_ms = await audio_process
+            with tracer.span(PROCESS_AUDIO, event_type): #The task only gets to run once activate_assistant hands the loop back
+                volumes, total_duration_ms = await audio_process
             min_vol = min(volumes)
             max_vol = max(volumes)
 
             await wait
-            bounce_task = asyncio.create_task(obswebsockets_manager.bounce_while_talking(volumes, min_vol, max_vol, total_duration_ms, ASSISTANT_NAME, STATIONARY_ASSISTANT_NAME, original_transform=original_transform))
+            bounce_task = asyncio.create_task(obswebsockets_manager.bounce_while_talking(volumes, min_vol, max_vol, total_duration_ms, SETTINGS.obs_assistant_name, SETTINGS.obs_stationary_assistant_name, original_transform=original_transform))
             loop = asyncio.get_running_loop()
 
-            await loop.run_in_executor(None, audio_manager.play_audio, output, True, False, True, settings["Audio Output Device"])
+            with tracer.span(PLAYBACK, event_type):
+                await loop.run_in_executor(None, audio_manager.play_audio, output, True, False, True, SETTINGS.audio_output_device)
             await bounce_task
 
             await asyncio.sleep(1)
-            obswebsockets_manager.deactivate_assistant(ASSISTANT_NAME)
+            obswebsockets_manager.deactivate_assistant(SETTINGS.obs_assistant_name)
         except asyncio.CancelledError:
             if DEBUG:
                 print("[DEBUG]Event was cancelled.")
                 bounce_task.cancel()
                 if original_transform:
-                    obswebsockets_manager.deactivate_assistant(STATIONARY_ASSISTANT_NAME, True, original_transform)
+                    obswebsockets_manager.deactivate_assistant(SETTINGS.obs_stationary_assistant_name, True, original_transform)
                 else:
-                    obswebsockets_manager.deactivate_assistant(ASSISTANT_NAME)
+                    obswebsockets_manager.deactivate_assistant(SETTINGS.obs_assistant_name)
                 raise
 
+    async def assistant_responds_live(self, stream, event_type = None):
+        #Audio is still being synthesized. Playback and the bounce follow it as the chunks arrive.
+        bounce_task = None
+        original_transform = None
+        try:
+            with tracer.span(OBS, event_type):
+                original_transform = obswebsockets_manager.activate_assistant(SETTINGS.obs_assistant_name, SETTINGS.obs_stationary_assistant_name)
+            await asyncio.sleep(1)
+            bounce_task = asyncio.create_task(obswebsockets_manager.bounce_while_talking(stream.volumes, 0, 0, 0, SETTINGS.obs_assistant_name, SETTINGS.obs_stationary_assistant_name, original_transform=original_transform, stream=stream))
+            loop = asyncio.get_running_loop()
+
+            with tracer.span(PLAYBACK, event_type):
+                await loop.run_in_executor(None, audio_manager.play_stream, stream, SETTINGS.audio_output_device)
+            await bounce_task
+
+            await asyncio.sleep(1)
+            obswebsockets_manager.deactivate_assistant(SETTINGS.obs_assistant_name)
+        except asyncio.CancelledError:
+            if DEBUG:
+                print("[DEBUG]Event was cancelled.")
+            if bounce_task:
+                bounce_task.cancel()
+            if original_transform:
+                obswebsockets_manager.deactivate_assistant(SETTINGS.obs_stationary_assistant_name, True, original_transform)
+            else:
+                obswebsockets_manager.deactivate_assistant(SETTINGS.obs_assistant_name)
+            raise
+
+    async def assistant_responds_stream(self, outputs: asyncio.Queue):
+        #Same as assistant_responds, but the assistant stays on screen while each sentence's audio is played as it becomes ready
+        bounce_task = None
+        original_transform = None
+        try:
+            next_output = await outputs.get()
+            if next_output is None:
+                return
+            with tracer.span(OBS):
+                original_transform = obswebsockets_manager.activate_assistant(SETTINGS.obs_assistant_name, SETTINGS.obs_stationary_assistant_name)
+            loop = asyncio.get_running_loop()
+            ready_at = loop.time() + 1
+            while next_output is not None:
+                try:
+                    output = await next_output
+                except Exception as e:
+                    print(f"[ERROR]Skipping a sentence that failed TTS: {e}")
+                    next_output = await outputs.get()
+                    continue
+                with tracer.span(PROCESS_AUDIO):
+                    volumes, total_duration_ms = await audio_manager.process_audio(output)
+                await asyncio.sleep(max(0, ready_at - loop.time()))
+                bounce_task = asyncio.create_task(obswebsockets_manager.bounce_while_talking(volumes, min(volumes), max(volumes), total_duration_ms, SETTINGS.obs_assistant_name, SETTINGS.obs_stationary_assistant_name, original_transform=original_transform))
+                with tracer.span(PLAYBACK):
+                    await loop.run_in_executor(None, audio_manager.play_audio, output, True, False, True, SETTINGS.audio_output_device)
+                await bounce_task
+                next_output = await outputs.get()
+
+            await asyncio.sleep(1)
+            obswebsockets_manager.deactivate_assistant(SETTINGS.obs_assistant_name)
+        except asyncio.CancelledError:
+            if DEBUG:
+                print("[DEBUG]Event was cancelled.")
+            if bounce_task:
+                bounce_task.cancel()
+            if original_transform:
+                obswebsockets_manager.deactivate_assistant(SETTINGS.obs_stationary_assistant_name, True, original_transform)
+            else:
+                obswebsockets_manager.deactivate_assistant(SETTINGS.obs_assistant_name)
+            raise
+
     async def handle_raid(self, event, game_name = None):#May need to adjust code to incoporate already existing policies.
         user_name = event.from_broadcaster_user_name
         viewer_count = event.viewers
         if DEBUG:
             print(f"[DEBUG]RAID by {user_name} with {viewer_count} viewers! Last playing {game_name}")
-        channel = self.get_channel(TWITCH_CHANNEL)
+        channel = self.get_channel(SETTINGS.broadcaster_channel)
         await channel.send(f"RAID ALERT: {user_name} has raided with {viewer_count} viewers! {f"Last seen playing {game_name}!" if game_name else ""}")
-        if viewer_count >= RAID_THRESHOLD:
+        if viewer_count >= SETTINGS.raid_threshold:
             prompt_2 = {"role": "user", "content": f"{user_name} has raided with {viewer_count} viewers!{f" Last seen playing {game_name}!" if game_name else ""}"}
             full_prompt = [RAID, prompt_2]
-            chatGPT = asyncio.to_thread(openai_manager.chat, full_prompt, False) #Change to a different fine-tuned model
+            chatGPT = openai_manager.chat_async(full_prompt, False) #Change to a different fine-tuned model
 
             response = await chatGPT
-            output = await tts(response)
-            queued_event = {"type": "event", "audio": output, "from_user": event.from_broadcaster_user_name, "event_type": "Raid"}
+            queued_event = {"type": "event", "text": response, "audio": None, "from_user": event.from_broadcaster_user_name, "event_type": "Raid"}
             self.event_queue.add_event(queued_event)
     
     #Not currently used, but may be useful in the future
@@ -1033,7 +1144,7 @@ class Bot(commands.Bot):
         redeemed_time = event.redeemed_at
         if DEBUG:
             print(f"[DEBUG]{user_name} used {reward_cost} channel points to redeem {reward_title} at {redeemed_time} with message: {message}")
-        channel = self.get_channel(TWITCH_CHANNEL)
+        channel = self.get_channel(SETTINGS.broadcaster_channel)
         await channel.send(f"{user_name} redeemed {reward_title}!")
 
     #Not currently used, but may be useful in the future
@@ -1046,7 +1157,7 @@ class Bot(commands.Bot):
         redeemed_time = event.redeemed_at
         if DEBUG:
             print(f"[DEBUG]{user_name} used {reward_cost} channel points to redeem {reward_title} at {redeemed_time} with message: {prompt}")
-        channel = self.get_channel(TWITCH_CHANNEL)
+        channel = self.get_channel(SETTINGS.broadcaster_channel)
         await channel.send(f"{user_name} redeemed {reward_title}!")
 
     async def handle_gift_subscription(self, event):
@@ -1056,8 +1167,7 @@ class Bot(commands.Bot):
         user_id = event.user_id
         gift_count = event.total
         if STREAMATHON_UPDATE_TASK:
-            global POINT_QUEUE
-            POINT_QUEUE.append({"user": gifter_name, "event": "gifted_sub", "amount": gift_count})
+            queue_points(gifter_name, GIFTED_SUBS, gift_count)
         cumulative = event.cumulative_total
         tier = int(event.tier) // 1000
 
@@ -1087,8 +1197,7 @@ class Bot(commands.Bot):
         
 
         if STREAMATHON_UPDATE_TASK:
-            global POINT_QUEUE
-            POINT_QUEUE.append({"user": user_name, "event": "sub", "amount": 1})
+            queue_points(user_name, SUB, 1)
 
         self.recent_gifted = deque((uid, t) for uid, t in self.recent_gifted if now - t <= self.timeout_sec)
         if event.is_gift:
@@ -1118,13 +1227,13 @@ class Bot(commands.Bot):
                             prompt_2 = {"role": "user", "content": f"{gifter_str} gifted {data['count']} subs to: {recipients_str}."}
 
                         full_prompt = [GIFTED_SUB, prompt_2]
-                        chatGPT = asyncio.to_thread(openai_manager.chat, full_prompt, False)
+                        chatGPT = openai_manager.chat_async(full_prompt, False)
                         response = await chatGPT
-                        output = await tts(response)
 
                         queued_event = {
                             "type": "event",
-                            "audio": output,
+                            "text": response,
+                            "audio": None,
                             "from_user": gifter,
                             "event_type": f"{data['count']} gifted subs"
                         }
@@ -1136,7 +1245,7 @@ class Bot(commands.Bot):
         tier = int(event.tier) // 1000
         if DEBUG:
             print(f"[DEBUG]{user_name} subscribed! Tier {tier}")
-        channel = self.get_channel(TWITCH_CHANNEL)
+        channel = self.get_channel(SETTINGS.broadcaster_channel)
         await channel.send(f"Thanks for subscribing, {user_name}! Enjoy your Tier {tier} subscription!")
 
     async def handle_subscription_message(self, event): #Placeholder for subscription message
@@ -1149,8 +1258,7 @@ class Bot(commands.Bot):
         user_name = event.user_name
 
         if STREAMATHON_UPDATE_TASK:
-            global POINT_QUEUE
-            POINT_QUEUE.append({"user": user_name, "event": "sub", "amount": 1})
+            queue_points(user_name, SUB, 1)
 
         tier = event.tier
         duration_months = getattr(event, "duration_months", 1)
@@ -1160,18 +1268,18 @@ class Bot(commands.Bot):
             tier = 2
         elif tier == "3000":
             tier = 3
-        if duration_months <= 2:
+        if duration_months <= SETTINGS.resub.intern_months:
             random_number = await rng(1, 5)
-            resub = {"role": "system", "content": RESUB_INTERN["content"].replace("<RNG>", str(random_number))}
-        elif duration_months <= 6:
+            resub = prompt_registry.render("Resub Intern", RNG = random_number)
+        elif duration_months <= SETTINGS.resub.employee_months:
             random_number = await rng(6, 20)
-            resub = {"role": "system", "content": RESUB_EMPLOYEE["content"].replace("<RNG>", str(random_number))}
-        elif duration_months <= 12:
+            resub = prompt_registry.render("Resub Employee", RNG = random_number)
+        elif duration_months <= SETTINGS.resub.supervisor_months:
             random_number = await rng(21, 50)
-            resub = {"role": "system", "content": RESUB_SUPERVISOR["content"].replace("<RNG>", str(random_number))}
+            resub = prompt_registry.render("Resub Supervisor", RNG = random_number)
         else:
             random_number = await rng(51, 100)
-            resub = {"role": "system", "content": RESUB_TENURED["content"].replace("<RNG>", str(random_number))}
+            resub = prompt_registry.render("Resub Tenured Employee", RNG = random_number)
         message = getattr(event.message, "text", "") if hasattr(event, "message") else ""
         cumulative = getattr(event, "cumulative_months", 0)
         if message:
@@ -1186,14 +1294,12 @@ class Bot(commands.Bot):
                 prompt_2 = {"role": "system", "content": f"{user_name} resubscribed for {duration_months} months! Tier {tier}!"}
 
         full_prompt = [resub, prompt_2]
-        chatGPT = asyncio.to_thread(openai_manager.chat, full_prompt, False) #Change to a different fine-tuned model
+        chatGPT = openai_manager.chat_async(full_prompt, False) #Change to a different fine-tuned model
 
         response = await chatGPT
         full_response = f"{user_name} says: {message}. {response}"
 
-        output = await tts(full_response)
-
-        queued_event = {"type": "event", "audio": output, "from_user": user_name, "event_type": f"Resub for {duration_months} months"}
+        queued_event = {"type": "event", "text": full_response, "audio": None, "from_user": user_name, "event_type": f"Resub for {duration_months} months"}
         self.event_queue.add_event(queued_event)
 
     async def handle_bits(self, event):
@@ -1204,58 +1310,52 @@ class Bot(commands.Bot):
             username = event.user_name
 
         if STREAMATHON_UPDATE_TASK:
-            global POINT_QUEUE
-            POINT_QUEUE.append({"user": f"{"Anonymous" if event.is_anonymous else username}", "event": "bits", "amount": bits})
-        if bits < NORMAL_REACTION: #May change to add logic for showing on screen
+            queue_points("Anonymous" if event.is_anonymous else username, BITS, bits)
+        if bits < SETTINGS.bits.normal: #May change to add logic for showing on screen
             if DEBUG:
                 print(f"[DEBUG]{username} donated {bits} bits, but it's not enough to trigger a response.")
             return
-        prompts = await load_prompts()
         broadcaster_name = event.broadcaster_user_name
         message = None
         if DEBUG:
             print(f"[DEBUG]{username} donated {bits} bits!")
-        channel = self.get_channel(TWITCH_CHANNEL)
+        channel = self.get_channel(SETTINGS.broadcaster_channel)
         if not event.is_anonymous:
             await channel.send(f"{username} donated {bits} bits!")
         else:
             await channel.send(f"An anonymous user donated {bits} bits!")
-        if bits >= NORMAL_REACTION:
-            if bits >= NORMAL_REACTION and bits < IMPRESSED_REACTION:
+        if bits >= SETTINGS.bits.normal:
+            if bits >= SETTINGS.bits.normal and bits < SETTINGS.bits.impressed:
                 reaction = "Normal"
-            elif bits >= IMPRESSED_REACTION and bits < EXAGGERATED_REACTION:
+            elif bits >= SETTINGS.bits.impressed and bits < SETTINGS.bits.exaggerated:
                 reaction = "Impressed"
-            elif bits >= EXAGGERATED_REACTION and bits < SCREAMING_REACTION:
+            elif bits >= SETTINGS.bits.exaggerated and bits < SETTINGS.bits.screaming:
                 reaction = "Exaggerated"
-            elif bits >= SCREAMING_REACTION:
+            elif bits >= SETTINGS.bits.screaming:
                 reaction = "Dear god, just yell!"
             if event.message == "" or event.message == None:
                 if reaction != "Dear god, just yell!":
-                    prompt_1 = {"role": "system", "content": f"{prompts["Bit Donation w/o Message"]}"}
-                    prompt_2 = {"role": "system", "content": f"{username} donated {bits} to {broadcaster_name}. In response to the amount of bits, you should respond with a {reaction} reaction."}
+                    prompt_1 = BIT_DONO
+                    prompt_2 = prompt_registry.render("Bit Donation Details", USER = username, BITS = bits, BROADCASTER = broadcaster_name, REACTION = reaction)
                 else:
-                    prompt_1 = {"role": "system", "content": f"You are now Maddieply, the lovable anime catgirl secretary to the dystopian business ModdCorp. You are sarcastic, snarky, and sassy. You know all the rules and policies of ModdCorp, but are still lazy about your job. Your boss is ModdiPly, a twitch streamer and CEO of ModdCorp. Your job is to thank people who donate their twitch bits to ModdiPly. They've donated such an extreme amount of bits, you should be shocked and scream in excitement. You are not allowed to say anything else, just yell! Scream, freak out, and be as loud as possible!"}
-                    prompt_2 = {"role": "system", "content": f"{username} donated {bits} to {broadcaster_name}. In response to the amount of bits, just yell! Scream, freak out, and be as loud as possible!"}
+                    prompt_1 = prompt_registry.message("Bit Donation Scream")
+                    prompt_2 = prompt_registry.render("Bit Donation Scream Details", USER = username, BITS = bits, BROADCASTER = broadcaster_name)
             else:
                 message = event.message
                 if reaction != "Dear god, just yell!":
-                    prompt_1 = {"role": "system", "content": f"{prompts["Bit Donation w/ Message"]}"}
-                    prompt_2 = {"role": "system", "content": f"{username} donated {bits} to {broadcaster_name}.\n{username}'s message: {message} In response to the amount of bits, you should respond with a {reaction} reaction."}
+                    prompt_1 = BIT_DONO_W_MSG
+                    prompt_2 = prompt_registry.render("Bit Donation Details w/ Message", USER = username, BITS = bits, BROADCASTER = broadcaster_name, MESSAGE = message, REACTION = reaction)
                 else:
-                    prompt_1 = {"role": "system", "content": f"You are now Maddieply, the lovable anime catgirl secretary to the dystopian business ModdCorp. You are sarcastic, snarky, and sassy. You know all the rules and policies of ModdCorp, but are still lazy about your job. Your boss is ModdiPly, a twitch streamer and CEO of ModdCorp. Your job is to thank people who donate their twitch bits to ModdiPly. They've donated such an extreme amount of bits, you should be shocked and scream in excitement. You are not allowed to say anything else, just yell! Scream, freak out, and be as loud as possible!"}
-                    prompt_2 = {"role": "system", "content": f"{username} donated {bits} to {broadcaster_name}.\n{username}'s message: {message}."}
+                    prompt_1 = prompt_registry.message("Bit Donation Scream")
+                    prompt_2 = prompt_registry.render("Bit Donation Scream Details w/ Message", USER = username, BITS = bits, BROADCASTER = broadcaster_name, MESSAGE = message)
             
             full_prompt = [prompt_1, prompt_2]
-            chatGPT = asyncio.to_thread(openai_manager.chat, full_prompt, False) #Change to a different fine-tuned model
+            chatGPT = openai_manager.chat_async(full_prompt, False) #Change to a different fine-tuned model
 
             response = await chatGPT
-            if message:
-                full_response = f"'{message}.' {response}"
-                output = await tts(full_response)
-            else:
-                output = await tts(response)
+            full_response = f"'{message}.' {response}" if message else response
 
-            queued_event = {"type": "audio", "audio": output, "from_user": username, "event_type": f"Bit Donation of {bits}"}
+            queued_event = {"type": "audio", "text": full_response, "audio": None, "from_user": username, "event_type": f"Bit Donation of {bits}"}
             self.event_queue.add_audio(queued_event)
         
     async def event_message(self, message):
@@ -1270,7 +1370,11 @@ class Bot(commands.Bot):
         if message.first or message.author.name in SUSPICIOUS_USERS:
             if DEBUG:
                 print(f"{message.author.name} is a {f"first time" if message.author.name not in SUSPICIOUS_USERS else "suspicious"} chatter.")
-            is_bot = await asyncio.to_thread(openai_manager.bot_detector, text)
+            try:
+                is_bot = await bot_detector.classify(text)
+            except LLMRequestShed as e:
+                print(f"[yellow]Could not check {message.author.name} for spam yet, {e}. Checking their next message instead.")
+                is_bot = 3
             if is_bot == True:
                 try:
                     #await message.channel.send(f"/delete {message.id}")
@@ -1319,13 +1423,15 @@ class Bot(commands.Bot):
                 return
 
             author = message.author
-            SAVE_MESSAGE_QUEUE.append({"author": author.name, "message": text})
+            chat_context.add(author.name, text)
             RECEIVED_MESSAGES += 1
 
 def start_bot_in_thread(gui_queue):
     async def bot_main():
         await set_global_variables()
+        await chat_context.restore()
         bot = Bot(gui_queue)
+        recover_from_journal(bot)
         set_bot_instance(bot)
         asyncio.create_task(start_event_sub())
         asyncio.create_task(process_hotkey_queue(bot, hotkey_queue))  # <-- Start this BEFORE bot.start()
@@ -1351,7 +1457,7 @@ if __name__ == "__main__":
     while 'loop' not in bot_loop_holder:
         time.sleep(0.05)
     bot_loop = bot_loop_holder['loop']
-    settings = asyncio.run(load_settings())
+    asyncio.run(load_settings())
     def run_gui():
         loop = asyncio.new_event_loop()
         app = TwitchBotGUI(gui_queue, bot_loop)
@@ -1362,5 +1468,5 @@ if __name__ == "__main__":
     gui_thread = threading.Thread(target=run_gui, daemon=True)
     gui_thread.start()
 
-    global_hotkey_listener(hotkey_queue, settings)
+    global_hotkey_listener(hotkey_queue, get_settings_model().hotkeys)
     print("[red]Bot has stopped running.")
@@ -0,0 +1,192 @@
+import re
+import time
+import asyncio
+import unicodedata
+from collections import OrderedDict
+from bot_utils import get_debug
+
+VERDICT_TTL = 600 #Seconds a verdict is reused for the same message
+VERDICT_CACHE_SIZE = 2048 #Distinct messages remembered, least recently used are dropped first
+BATCH_WINDOW = 0.3 #Seconds to collect messages before asking about them together
+BATCH_SIZE = 10 #A batch is sent straight away once it has this many messages
+
+ZERO_WIDTH = re.compile("[\u200b-\u200f\u2060-\u2064\ufeff\u00ad\U000e0000-\U000e007f]")
+URL = re.compile(r"(?:https?://|www\.)\S+|\b[\w-]+(?:\.[\w-]+)*\.(?:com|net|org|ru|xyz|top|shop|site|online|store|live|tv|gg|io|ly|me|co)\b(?:/\S*)?", re.IGNORECASE)
+MENTION = re.compile(r"@\w+")
+WHITESPACE = re.compile(r"\s+")
+
+#Local pre-classifier. Obvious spam and obviously harmless messages never reach the model.
+#Scores general features of promotion spam rather than names of particular sellers, which change every wave.
+#Tune only on benchmarks/bot_detection_corpus.jsonl, benchmarks/bot_detection_holdout.jsonl is for measuring.
+SPAM_TLD = r"(?:c\s?o\s?m|net|org|ru|xyz|top|shop|site|online|store|live|click)"
+OBFUSCATED_DOMAIN = re.compile(r"\b[\w-]{3,}\s*(?:\s\.|\.\s|\(dot\)|\[dot\]|\bdot\b)\s*" + SPAM_TLD + r"\b") #"site .com", "site dot com", "site . c o m"
+SPACED_LETTERS = re.compile(r"\b(?:\w ){4,}\w\b") #"f r e e v i e w s"
+REMOVE_SPACES = re.compile(r"\bremove (?:the )?spaces?\b")
+SHORTENERS = {"bit.ly", "t.ly", "cutt.ly", "tinyurl.com", "goo.gl", "t.co", "is.gd", "rb.gy", "shorturl.at"}
+SPAM_TLDS = {"ru", "xyz", "top", "shop", "site", "online", "store", "live", "click"}
+LINK_PROMO_WORDS = ["view", "follow", "promo", "boost", "grow", "fame", "famous", "prime"]
+AUDIENCE = r"(?:viewers|followers|follows|primes|subs|subscribers|views|chatters)"
+QUANTITY = re.compile(r"\b\d[\d,.]*k?\+?\s+(?:\w+\s+)?" + AUDIENCE + r"\b") #"1000 real viewers"
+PROMO_OFFER = re.compile(r"\b(?:buy|cheap|best|free|real|instant|boost|grow|upgrade|promot\w*|sell\w*|sale)\b(?:\W+\w+){0,3}?\W+(?:" + AUDIENCE[3:-1] + r"|your (?:stream|channel))\b")
+FAME = re.compile(r"\b(?:become|be|get) (?:\w+ )?famous\b")
+SOLICIT = re.compile(r"\b(?:dm|message|contact|write to|add|text|msg) me\b|\bfollow (?:me|for follow)\b|\bcheck (?:out )?my (?:bio|profile|page|pics)\b|\blink in (?:my )?bio\b|\btelegram\b|\bdiscord\s*:")
+SERVICE_WORDS = {"emotes", "overlays", "panels", "graphics", "alerts", "logo", "promo", "promotion", "sponsorship", "collab", "marketing", "agency", "manager"} #A pitch, when paired with a request to get in touch
+PROMO_WORDS = {"viewers", "followers", "follows", "primes", "views", "promotion", "promote", "promo", "cheap", "price", "subscribers"}
+BOT_SCORE = 5 #At or above this the message is spam without asking the model
+HUMAN_MAX_WORDS = 8 #Short messages with no spam signals at all are let through without asking
+
+def normalize_message(text: str):
+    #Spam waves change case, spacing, invisible characters, links and mentions between copies. Those are folded away here.
+    text = unicodedata.normalize("NFKC", text or "")
+    text = ZERO_WIDTH.sub("", text).lower()
+    text = URL.sub("<url>", text)
+    text = MENTION.sub("<user>", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+def spam_score(text: str, normalized: str = None):
+    normalized = normalized if normalized is not None else normalize_message(text)
+    score = 0
+    links = URL.findall(unicodedata.normalize("NFKC", text or "").lower())
+    if links:
+        score += 2
+        for link in links:
+            host = re.sub(r"^(?:https?://)?(?:www\.)?", "", link).split("/")[0]
+            if host in SHORTENERS:
+                score += 3
+            if host.rsplit(".", 1)[-1] in SPAM_TLDS:
+                score += 2
+            if any(word in link for word in LINK_PROMO_WORDS):
+                score += 3
+    if OBFUSCATED_DOMAIN.search(normalized) or REMOVE_SPACES.search(normalized):
+        score += 5
+    if SPACED_LETTERS.search(normalized):
+        score += 3
+    if QUANTITY.search(normalized):
+        score += 4
+    if PROMO_OFFER.search(normalized):
+        score += 3
+    if FAME.search(normalized):
+        score += 3
+    words = {word.strip("!?.,:;()") for word in normalized.split()}
+    if SOLICIT.search(normalized):
+        score += 3
+        if words & SERVICE_WORDS:
+            score += 3
+    score += len(words & PROMO_WORDS)
+    return score
+
+def heuristic_verdict(text: str):
+    #True (bot) or False (not a bot) when the message is an easy call, None when the model has to decide
+    normalized = normalize_message(text)
+    score = spam_score(text, normalized)
+    if score >= BOT_SCORE:
+        return True
+    if score == 0 and len(normalized.split()) <= HUMAN_MAX_WORDS:
+        return False
+    return None
+
+class VerdictCache:
+    def __init__(self, ttl: float = VERDICT_TTL, max_size: int = VERDICT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict() #key -> (expires at, verdict)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, verdict):
+        self.entries[key] = (time.monotonic() + self.ttl, verdict)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last = False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit rate": self.hits / lookups if lookups else 0.0, "size": len(self.entries)}
+
+class BotDetector:
+    #Front of OpenAiManager.bot_detector_async. Same verdicts: True (bot), False (not a bot), 3 (maybe).
+    def __init__(self, openai_manager, cache: VerdictCache = None, batch_window: float = BATCH_WINDOW, batch_size: int = BATCH_SIZE):
+        self.openai_manager = openai_manager
+        self.cache = cache or VerdictCache()
+        self.inflight = {} #Normalized message -> task, so copies arriving together share one request
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.pending = [] #(message, future) waiting for the next batch
+        self.flush_timer = None
+        self.requests = 0
+        self.detected = 0
+        self.local = 0
+
+    async def classify(self, text: str):
+        verdict = heuristic_verdict(text)
+        if verdict is not None:
+            self.local += 1
+            if get_debug():
+                print(f"[DEBUG]Bot detection decided locally: {verdict}")
+            return verdict
+        key = normalize_message(text)
+        verdict = self.cache.get(key)
+        if verdict is not None:
+            if get_debug():
+                print(f"[DEBUG]Bot detection cache hit: {verdict}")
+            return verdict
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._detect(text))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        verdict = await asyncio.shield(task)
+        if verdict is not None:
+            self.cache.put(key, verdict)
+        return verdict
+
+    async def _detect(self, text):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((text, future))
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+        elif self.flush_timer is None:
+            self.flush_timer = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self.flush_timer:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.create_task(self._send(batch))
+
+    async def _send(self, batch):
+        texts = [text for text, _ in batch]
+        self.requests += 1
+        self.detected += len(texts)
+        try:
+            if len(texts) == 1: #The fine-tuned single message detector is still used when there is no flood
+                verdicts = [await self.openai_manager.bot_detector_async(texts[0])]
+            else:
+                verdicts = await self.openai_manager.bot_detector_batch_async(texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        if get_debug() and len(texts) > 1:
+            print(f"[DEBUG]Checked {len(texts)} first time chatters in one request.")
+        for (_, future), verdict in zip(batch, verdicts):
+            if not future.done():
+                future.set_result(verdict)
+
+    def stats(self):
+        return {**self.cache.stats(), "requests": self.requests, "messages checked": self.detected, "decided locally": self.local}
@@ -0,0 +1,76 @@
+import time
+import asyncio
+from collections import deque
+from json_manager import load_messages, save_messages
+from bot_utils import get_debug
+
+CHAT_CAPACITY = 500 #Messages kept in memory
+SNAPSHOT_INTERVAL = 30 #Seconds between crash recovery snapshots to messages.json
+
+class ChatContext:
+    def __init__(self, capacity: int = CHAT_CAPACITY):
+        self.messages = deque(maxlen = capacity) #(seq, timestamp, author, text), oldest first
+        self.last_seq = 0
+        self.dirty = False
+
+    def add(self, author: str, text: str, timestamp: float = None):
+        self.last_seq += 1
+        self.messages.append((self.last_seq, timestamp or time.time(), author, text))
+        self.dirty = True
+        return self.last_seq
+
+    def window(self, count: int = None, seconds: float = None, after_seq: int = None):
+        #Walks back from the newest message, so the cost is the size of the answer, not the buffer
+        cutoff = time.time() - seconds if seconds else None
+        result = []
+        for entry in reversed(self.messages):
+            if count is not None and len(result) >= count:
+                break
+            if cutoff is not None and entry[1] < cutoff:
+                break
+            if after_seq is not None and entry[0] <= after_seq:
+                break
+            result.append(entry)
+        result.reverse()
+        return result
+
+    def lines(self, count: int = None, seconds: float = None, after_seq: int = None):
+        return [f"{author}: {text}" for _, _, author, text in self.window(count, seconds, after_seq)]
+
+    def clear(self):
+        self.messages.clear()
+        self.dirty = True
+
+    def __len__(self):
+        return len(self.messages)
+
+    async def restore(self):
+        try:
+            saved = await load_messages()
+        except Exception as e:
+            print(f"[WARNING]Could not restore chat from messages.json: {e}")
+            return
+        now = time.time()
+        for entry in saved:
+            if isinstance(entry, dict):
+                self.add(entry.get("author", ""), entry.get("message", ""), entry.get("time", now))
+            elif isinstance(entry, str): #Older "author: message" format
+                author, _, text = entry.partition(": ")
+                self.add(author, text, now)
+        self.dirty = False
+        if get_debug():
+            print(f"[DEBUG]Restored {len(self.messages)} chat messages.")
+
+    async def snapshot(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        await save_messages([{"time": timestamp, "author": author, "message": text} for _, timestamp, author, text in self.messages])
+
+    async def snapshot_loop(self, interval: float = SNAPSHOT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                print(f"[ERROR]Failed to snapshot chat messages: {e}")
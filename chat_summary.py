@@ -0,0 +1,86 @@
+import time
+import asyncio
+from llm_scheduler import LLMRequestShed, STREAMER, AMBIENT
+from bot_utils import get_debug
+
+SUMMARY_POLL = 2 #Seconds between checks for new chat
+SUMMARY_DEBOUNCE = 15 #Fold new messages in once chat has been quiet this long
+SUMMARY_MAX_WAIT = 60 #or once the oldest unsummarized message is this old, even if chat never goes quiet
+SUMMARY_MAX_DELTA = 60 #Newest messages folded in per request. When chat outruns this the older ones are skipped.
+SUMMARY_RETRY_DELAY = 30 #Seconds to back off after a failed or shed request
+
+class RollingSummary:
+    #Keeps a running summary of chat, so the summarize hotkey only has to voice it
+    def __init__(self, chat_context, openai_manager, prompt_registry):
+        self.chat_context = chat_context
+        self.openai_manager = openai_manager
+        self.prompt_registry = prompt_registry
+        self.summary = ""
+        self.through_seq = 0 #Last chat message folded into the summary
+        self.pending_since = None
+        self.retry_at = 0
+        self.lock = asyncio.Lock()
+        self.folds = 0
+        self.messages_folded = 0
+
+    def pending(self):
+        return self.chat_context.last_seq - self.through_seq
+
+    async def fold(self, priority: int = AMBIENT):
+        #Sends only the messages since the last fold along with the current summary
+        async with self.lock:
+            delta = self.chat_context.window(count = SUMMARY_MAX_DELTA, after_seq = self.through_seq)
+            if not delta:
+                self.through_seq = self.chat_context.last_seq
+                return self.summary
+            through_seq = delta[-1][0]
+            lines = "\n".join(f"{author}: {text}" for _, _, author, text in delta)
+            if self.summary:
+                update = self.prompt_registry.render("Chat Summary Update", SUMMARY = self.summary, MESSAGES = lines)
+            else:
+                update = {"role": "user", "content": lines}
+            full_prompt = [self.prompt_registry.message("Summarize Messages"), update]
+            summary = await self.openai_manager.chat_async(full_prompt, conversational = False, priority = priority, echo = False)
+            if summary:
+                self.summary = summary
+                self.through_seq = through_seq
+                self.folds += 1
+                self.messages_folded += len(delta)
+                if get_debug():
+                    print(f"[DEBUG]Folded {len(delta)} chat messages into the rolling summary.")
+            return self.summary
+
+    async def current(self):
+        #Catches up on anything not folded in yet at streamer priority, usually nothing or a few lines
+        if self.pending() > 0 or not self.summary:
+            try:
+                return await self.fold(STREAMER)
+            except Exception as e:
+                print(f"[WARNING]Could not bring the chat summary up to date, using the last one: {e}")
+        return self.summary
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(SUMMARY_POLL)
+            if self.pending() <= 0 or self.lock.locked():
+                self.pending_since = None
+                continue
+            now = time.time()
+            if self.pending_since is None:
+                self.pending_since = now
+            last_message = self.chat_context.messages[-1][1] if self.chat_context.messages else 0
+            if now < self.retry_at:
+                continue
+            if now - last_message < SUMMARY_DEBOUNCE and now - self.pending_since < SUMMARY_MAX_WAIT and self.pending() < SUMMARY_MAX_DELTA:
+                continue
+            try:
+                await self.fold()
+                self.pending_since = None
+            except LLMRequestShed:
+                self.retry_at = time.time() + SUMMARY_RETRY_DELAY
+            except Exception as e:
+                self.retry_at = time.time() + SUMMARY_RETRY_DELAY
+                print(f"[ERROR]Failed to update the chat summary: {e}")
+
+    def stats(self):
+        return {"folds": self.folds, "messages folded": self.messages_folded, "pending": self.pending()}
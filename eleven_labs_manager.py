@@ -3,13 +3,20 @@ from elevenlabs.client import ElevenLabs
 from dotenv import load_dotenv
 from bot_utils import DEBUG
 from json_manager import load_settings
+from tts_cache import get_tts_cache, audio_file
+from audio_player import StreamedAudio, STREAM_RATE
+from tts_providers import QUOTA_OPEN_SECONDS
+import re
 import time
 import os
+import threading
 
 load_dotenv()
 
+REQUEST_TIMEOUT = 30 #Seconds, a hung request counts as a failure instead of stalling the event
+
 try:
-  client = ElevenLabs(api_key = (os.getenv('ELEVENLABS_API_KEY')))
+  client = ElevenLabs(api_key = (os.getenv('ELEVENLABS_API_KEY')), timeout = REQUEST_TIMEOUT) # One client and connection pool for the whole process
 except TypeError:
   exit("Ooops! You forgot to set ELEVENLABS_API_KEY in your environment!")
 
@@ -17,9 +24,27 @@ DEFAULT_VOICE = "9BWtsMINqrJLrRacOk9x" #Aria
 DEFAULT_STABILITY = 0.5 #Ranges 0 to 1
 DEFAULT_SPEED = 1 #Ranges 0.7 to 1.2
 DEFAULT_SIMILARITY = 0.75 #Ranges 0 to 1
+VOICE_SETTINGS = {"stability": DEFAULT_STABILITY, "similarity_boost": DEFAULT_SIMILARITY, "speed": DEFAULT_SPEED}
+STREAM_FORMAT = f"pcm_{STREAM_RATE}" #Raw 16 bit mono PCM, playable chunk by chunk
+FIRST_CHUNK_TIMEOUT = 15 #Seconds to wait for streamed audio to start before giving up
 
 MODELS = ["eleven_v3", "eleven_multilingual_v2", "eleven_flash_v2_5", "eleven_flash_v2", "eleven_turbo_v2_5", "eleven_turbo_v2"]
 
+def classify_error(exception):
+  # Returns a readable message, and how long to stop using ElevenLabs for when retrying won't help
+  body = getattr(exception, "body", None)
+  detail = body.get("detail") if isinstance(body, dict) else None
+  message = detail.get("message", str(detail)) if isinstance(detail, dict) else str(exception)
+  if (isinstance(detail, dict) and detail.get("status") == "quota_exceeded") or "quota_exceeded" in str(exception):
+    remaining = re.search(r"have (\d+) credits", message)
+    required = re.search(r"(\d+) credits are required", message)
+    if remaining and required:
+      return f"ElevenLabs quota exceeded: {remaining.group(1)} credits remaining, {required.group(1)} required.", QUOTA_OPEN_SECONDS
+    return f"ElevenLabs quota exceeded: {message}", QUOTA_OPEN_SECONDS
+  if getattr(exception, "status_code", None) == 401:
+    return f"ElevenLabs rejected the API key: {message}", QUOTA_OPEN_SECONDS
+  return message, None
+
 class ElevenLabsManager:
 
     def __init__(self):
@@ -28,25 +53,52 @@ class ElevenLabsManager:
         #print(f"\nAll ElevenLabs voices: \n{all_voices}\n")
 
     # Convert text to speech, then save it to file. Returns the file path
-    def text_to_audio(self, input_text, voice=DEFAULT_VOICE, save_as_wave=True, subdirectory="audio", model="eleven_multilingual_v2"):
+    # use_cache=False always synthesizes and leaves the cache alone
+    def text_to_audio(self, input_text, voice=DEFAULT_VOICE, save_as_wave=True, subdirectory="audio", model="eleven_multilingual_v2", use_cache=True):
+        extension = ".wav" if save_as_wave else ".mp3"
+        folder = os.path.join(os.path.abspath(os.curdir), subdirectory)
+        cache = get_tts_cache()
+        key = cache.key("elevenlabs", input_text, voice, model, VOICE_SETTINGS)
+        if use_cache:
+          cached = cache.get(key, extension, folder)
+          if cached:
+            return cached
         audio_saved = client.text_to_speech.convert(
           text=input_text,
           voice_id=voice,
           model_id=model,
-          voice_settings=VoiceSettings(
-              stability=DEFAULT_STABILITY,
-              similarity_boost=DEFAULT_SIMILARITY,
-              speed=DEFAULT_SPEED
-           )
+          voice_settings=VoiceSettings(**VOICE_SETTINGS)
         )
-        if save_as_wave:
-          file_name = f"___Msg{str(hash(input_text))}.wav"
-        else:
-          file_name = f"___Msg{str(hash(input_text))}.mp3"
-        tts_file = os.path.join(os.path.abspath(os.curdir), subdirectory, file_name)
+        tts_file = audio_file(extension, folder)
         save(audio_saved, tts_file)
+        if use_cache:
+          cache.put(key, tts_file)
         return tts_file
 
+    # Starts streaming synthesis and returns as soon as the first chunk arrives. The rest keeps arriving in a background thread
+    # and is saved to a wav once done. Returns a StreamedAudio, or the path of a finished file when the line was cached.
+    def text_to_audio_stream(self, input_text, voice=DEFAULT_VOICE, subdirectory="audio", model="eleven_multilingual_v2", use_cache=True):
+        folder = os.path.join(os.path.abspath(os.curdir), subdirectory)
+        cache = get_tts_cache()
+        key = cache.key("elevenlabs", input_text, voice, model, {**VOICE_SETTINGS, "output_format": STREAM_FORMAT})
+        if use_cache:
+          cached = cache.get(key, ".wav", folder)
+          if cached:
+            return cached
+        # Renamed from convert_as_stream to stream in newer SDKs
+        convert_stream = getattr(client.text_to_speech, "stream", None) or client.text_to_speech.convert_as_stream
+        chunks = convert_stream(
+          text=input_text,
+          voice_id=voice,
+          model_id=model,
+          output_format=STREAM_FORMAT,
+          voice_settings=VoiceSettings(**VOICE_SETTINGS)
+        )
+        streamed = StreamedAudio(audio_file(".wav", folder), STREAM_RATE, on_saved=(lambda path: cache.put(key, path)) if use_cache else None)
+        threading.Thread(target=streamed.run, args=(chunks,), daemon=True).start()
+        streamed.wait_started(FIRST_CHUNK_TIMEOUT)
+        return streamed
+
     # Convert text to speech, then play it out loud
     def text_to_audio_played(self, input_text, voice=DEFAULT_VOICE, model="eleven_multilingual_v2"):
         audio = client.generate(
@@ -0,0 +1,190 @@
+import os
+import copy
+import glob
+import time
+import atexit
+import threading
+import json_codec
+from json_manager import DATA_DIR, write_atomic
+from bot_utils import get_debug
+
+JOURNAL_DIR = os.path.join(DATA_DIR, "journal")
+SEGMENT_MAX_BYTES = 1024 * 1024 #Start a new segment file after this many bytes
+FSYNC_BATCH = 32 #Records written before forcing them to disk
+FSYNC_INTERVAL = 0.5 #Seconds an unsynced record may wait before it is forced to disk
+CHECKPOINT_RECORDS = 500 #Records since the last snapshot before the bot compacts the log
+
+#Record kinds
+EVENTSUB = "eventsub"
+QUEUED = "queued"
+RENDERED = "rendered" #A queued event's text was synthesized, carries the audio path
+PLAYED = "played"
+REMOVED = "removed"
+CLEARED = "cleared"
+POINT = "point"
+POINT_APPLIED = "point_applied"
+
+def empty_state():
+    return {"queue": [], "played": [], "points": []}
+
+def apply_record(state: dict, record: dict):
+    #Replays one journal record onto a state built by empty_state() or loaded from a snapshot
+    kind = record.get("kind")
+    if kind == QUEUED:
+        if record.get("front"):
+            state["queue"].insert(0, record["event"])
+        else:
+            state["queue"].append(record["event"])
+    elif kind == RENDERED:
+        index = record.get("index", 0)
+        if 0 <= index < len(state["queue"]):
+            state["queue"][index]["audio"] = record["audio"]
+    elif kind == PLAYED:
+        index = record.get("index", 0)
+        if 0 <= index < len(state["queue"]):
+            state["played"].append(state["queue"].pop(index))
+    elif kind == REMOVED:
+        events = state["played"] if record.get("from_played") else state["queue"]
+        index = record.get("index", 0)
+        if 0 <= index < len(events):
+            events.pop(index)
+    elif kind == CLEARED:
+        state["queue"].clear()
+    elif kind == POINT:
+        state["points"].append({"id": record["seq"], "user": record["user"], "event": record["event"], "amount": record["amount"]})
+    elif kind == POINT_APPLIED:
+        state["points"] = [point for point in state["points"] if point["id"] != record["id"]]
+    return state
+
+class EventJournal:
+    def __init__(self, directory = JOURNAL_DIR, segment_max_bytes = SEGMENT_MAX_BYTES):
+        self.directory = directory
+        self.snapshot_file = os.path.join(directory, "snapshot.json")
+        self.segment_max_bytes = segment_max_bytes
+        self.lock = threading.RLock() #Callers hold it around append and the state change it records, so snapshots see both or neither
+        self.seq = 0
+        self.file = None
+        self.segment = 0
+        self.segment_last_seq = {} #segment index -> seq of its last record
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.records_since_checkpoint = 0
+        os.makedirs(directory, exist_ok = True)
+        self.recovered = self._load()
+        self._open_segment(self._segments()[-1][0] + 1 if self._segments() else 1) #Never append after a possibly torn line
+        threading.Thread(target = self._sync_loop, daemon = True).start()
+
+    def _segments(self):
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, "segment_*.jsonl")):
+            try:
+                segments.append((int(os.path.basename(path)[8:-6]), path))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _open_segment(self, index):
+        if self.file:
+            self._fsync()
+            self.file.close()
+        self.segment = index
+        self.file = open(os.path.join(self.directory, f"segment_{index:08d}.jsonl"), "a", encoding="utf-8")
+
+    def _load(self):
+        #Snapshot plus every record after it. Only the tail since the last checkpoint is read.
+        state = empty_state()
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_file):
+            try:
+                with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                    snapshot = json_codec.loads(f.read())
+                state = snapshot["state"]
+                snapshot_seq = snapshot["seq"]
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[WARNING]Could not read journal snapshot: {e}")
+        self.seq = snapshot_seq
+        replayed = 0
+        for index, path in self._segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json_codec.loads(line)
+                    except ValueError:
+                        continue #Torn write from a crash
+                    self.segment_last_seq[index] = max(self.segment_last_seq.get(index, 0), record.get("seq", 0))
+                    if record.get("seq", 0) <= snapshot_seq:
+                        continue
+                    apply_record(state, record)
+                    self.seq = max(self.seq, record["seq"])
+                    replayed += 1
+        self.records_since_checkpoint = replayed
+        if get_debug():
+            print(f"[DEBUG]Journal recovered from snapshot {snapshot_seq} plus {replayed} records.")
+        return state
+
+    def append(self, kind: str, **data):
+        with self.lock:
+            self.seq += 1
+            record = {"seq": self.seq, "time": time.time(), "kind": kind, **data}
+            self.file.write(json_codec.dumps(record, default = str) + "\n")
+            self.file.flush()
+            self.segment_last_seq[self.segment] = self.seq
+            self.unsynced += 1
+            self.records_since_checkpoint += 1
+            if self.unsynced >= FSYNC_BATCH or time.monotonic() - self.last_sync >= FSYNC_INTERVAL:
+                self._fsync()
+            if self.file.tell() >= self.segment_max_bytes:
+                self._open_segment(self.segment + 1)
+            return self.seq
+
+    def _fsync(self):
+        if self.file and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(FSYNC_INTERVAL)
+            with self.lock:
+                if self.unsynced and not self.file.closed:
+                    self._fsync()
+
+    def needs_checkpoint(self):
+        return self.records_since_checkpoint >= CHECKPOINT_RECORDS
+
+    def snapshot(self, state: dict):
+        #Call on the loop that owns state. Returns the seq state is current to and a copy that later changes can't touch.
+        with self.lock:
+            return self.seq, copy.deepcopy(state)
+
+    def checkpoint(self, seq: int, state: dict):
+        #Writes a snapshot() result, safe to run in a worker thread. Only segments whose records are all covered by it are deleted.
+        write_atomic(self.snapshot_file, json_codec.dumps({"seq": seq, "time": time.time(), "state": state}, default = str))
+        with self.lock:
+            self._open_segment(self.segment + 1)
+            for index, path in self._segments():
+                if index < self.segment and self.segment_last_seq.get(index, 0) <= seq:
+                    try:
+                        os.remove(path)
+                        self.segment_last_seq.pop(index, None)
+                    except OSError as e:
+                        print(f"[WARNING]Could not remove journal segment {path}: {e}")
+            self.records_since_checkpoint = self.seq - seq
+        if get_debug():
+            print(f"[DEBUG]Journal checkpoint written at record {seq}.")
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self._fsync()
+                self.file.close()
+
+_journal = None
+
+def get_journal():
+    global _journal
+    if _journal is None:
+        _journal = EventJournal()
+        atexit.register(_journal.close)
+    return _journal
@@ -6,12 +6,15 @@ from twitchAPI.object.eventsub import ChannelRaidEvent, ChannelCheerEvent, Chann
 from twitchAPI.type import AuthScope
 from dotenv import load_dotenv
 import os
-from token_manager import refresh_token, get_refresh_token
-from json_manager import load_settings
+from token_manager import get_token_service
+from json_manager import load_settings, get_settings_model
+from settings_model import changed_fields
 from bot_utils import get_bot_instance, DEBUG
 from openai_chat import OpenAiManager
 from eleven_labs_manager import ElevenLabsManager
 from audio_player import AudioManager
+from event_journal import get_journal, EVENTSUB
+from tracing import get_tracer
 
 load_dotenv()
 
@@ -20,9 +23,7 @@ CLIENT_ID = os.getenv("TWITCH_CLIENT_ID")
 CLIENT_SECRET = os.getenv("TWITCH_APP_SECRET")
 TWITCH_BROADCASTER_TOKEN = None
 TWITCH_BROADCASTER_REFRESH_TOKEN = None
-AD_INTERVAL = None
-AD_LENGTH = None
-AUTO_AD_ENABLED = None
+SETTINGS = None #settings_model.Settings, replaced whole on reload
 AD_TIMER = None
 
 #Move non secrets out of .env and change the code
@@ -33,46 +34,73 @@ event_queue = asyncio.Queue()
 openai_manager = OpenAiManager()
 elevenlabs_manager = ElevenLabsManager()
 audio_manager = AudioManager()
+tracer = get_tracer()
+
+def record_event(event_type: str, payload):
+    try:
+        data = payload.to_dict() if hasattr(payload, "to_dict") else vars(payload)
+        get_journal().append(EVENTSUB, type = event_type, payload = data)
+    except Exception as e:
+        print(f"[WARNING]Could not journal {event_type} event: {e}")
+
+def sent_at(event):
+    #When Twitch sent the notification, for the delivery latency
+    timestamp = getattr(getattr(event, "metadata", None), "message_timestamp", None)
+    return timestamp.timestamp() if hasattr(timestamp, "timestamp") else None
 
 async def on_subscribe(event: ChannelSubscribeEvent) -> None:
     sub = event.event
     print(f"[DEBUG]Sub payload: {sub}")
-    await get_bot_instance().handle_subscription(sub)
+    record_event("subscribe", sub)
+    with tracer.event("subscribe", sent_at(event)):
+        await get_bot_instance().handle_subscription(sub)
 
 async def on_raid(event: ChannelRaidEvent) -> None:
     raid = event.event
     print(f"[DEBUG]Raid payload: {raid}")
-    channel_id = raid.from_broadcaster_user_id
-    game_name = None
-    for channel_info in await twitch.get_channel_information(channel_id):
-        game_name = getattr(channel_info, "game_name", None)
-        break
-    await get_bot_instance().handle_raid(raid, game_name)
+    record_event("raid", raid)
+    with tracer.event("raid", sent_at(event)):
+        channel_id = raid.from_broadcaster_user_id
+        game_name = None
+        for channel_info in await twitch.get_channel_information(channel_id):
+            game_name = getattr(channel_info, "game_name", None)
+            break
+        await get_bot_instance().handle_raid(raid, game_name)
 
 async def on_points(event: ChannelPointsAutomaticRewardRedemptionAddEvent) -> None:
     redemption = event.event
     print(f"[DEBUG]Point redemption payload: {redemption}")
-    await get_bot_instance().handle_channel_points(redemption)
+    record_event("channel_points", redemption)
+    with tracer.event("channel_points", sent_at(event)):
+        await get_bot_instance().handle_channel_points(redemption)
 
 async def on_points_custom(event: ChannelPointsCustomRewardRedemptionAddEvent) -> None:
     redemption = event.event
     print(f"[DEBUG]Custom point redemption payload: {redemption}")
-    await get_bot_instance().handle_custom_channel_points(redemption)
+    record_event("custom_channel_points", redemption)
+    with tracer.event("custom_channel_points", sent_at(event)):
+        await get_bot_instance().handle_custom_channel_points(redemption)
 
 async def on_bits(event: ChannelCheerEvent) -> None:
     cheer = event.event
     print(f"[DEBUG]Bits payload: {cheer}")
-    await get_bot_instance().handle_bits(cheer)
+    record_event("bits", cheer)
+    with tracer.event("bits", sent_at(event)):
+        await get_bot_instance().handle_bits(cheer)
 
 async def on_gift_sub(event: ChannelSubscriptionGiftEvent) -> None:
     gift = event.event
     print(f"[DEBUG]Gift payload: {gift}")
-    await get_bot_instance().handle_gift_subscription(gift)
+    record_event("gift_subscription", gift)
+    with tracer.event("gift_subscription", sent_at(event)):
+        await get_bot_instance().handle_gift_subscription(gift)
 
 async def on_sub_message(event: ChannelSubscriptionMessageEvent) -> None:
     sub_message = event.event
     print(f"[DEBUG]Sub Message payload: {sub_message}")
-    await get_bot_instance().handle_subscription_message(sub_message)
+    record_event("subscription_message", sub_message)
+    with tracer.event("subscription_message", sent_at(event)):
+        await get_bot_instance().handle_subscription_message(sub_message)
 
 def dict_to_namespace(d):
     if isinstance(d, dict):
@@ -82,26 +110,22 @@ def dict_to_namespace(d):
     return d
 
 async def load_global_variables():
-    global AD_INTERVAL, AD_LENGTH, AUTO_AD_ENABLED, AD_TIMER
-    settings = await load_settings()
-    AUTO_AD_ENABLED = settings["Auto Ad Enabled"]
-    AD_INTERVAL = settings["Ad Interval (minutes)"]
-    AD_LENGTH = settings["Ad Length (seconds)"]
+    global SETTINGS
+    await load_settings()
+    SETTINGS = get_settings_model()
 
 async def reload_global_variables():
-    global AD_INTERVAL, AD_LENGTH, AUTO_AD_ENABLED, AD_TIMER
-    settings = await load_settings()
-    if not AUTO_AD_ENABLED:
-        if settings["Auto Ad Enabled"]:
-            AUTO_AD_ENABLED = settings["Auto Ad Enabled"]
-            AD_TIMER = asyncio.create_task(start_ad_timer())
-    elif AUTO_AD_ENABLED:
-        if not settings["Auto Ad Enabled"]:
-            AUTO_AD_ENABLED = settings["Auto Ad Enabled"]
-            if AD_TIMER:
-                AD_TIMER.cancel()
-    AD_INTERVAL = settings["Ad Interval (minutes)"]
-    AD_LENGTH = settings["Ad Length (seconds)"]
+    global SETTINGS, AD_TIMER
+    previous = SETTINGS
+    SETTINGS = get_settings_model()
+    changed = changed_fields(previous, SETTINGS)
+    if not changed & {"auto_ad_enabled", "ad_interval"}:
+        return #Ad length is read when the ad runs, so the countdown keeps going
+    if AD_TIMER and not AD_TIMER.done():
+        AD_TIMER.cancel()
+        AD_TIMER = None
+    if SETTINGS.auto_ad_enabled:
+        AD_TIMER = asyncio.create_task(start_ad_timer())
 
 ad_reset_event = asyncio.Event()
 
@@ -110,13 +134,13 @@ async def start_ad_timer():
     global ad_reset_event
     try:
         while True:
-            if AUTO_AD_ENABLED:
-                timer_goal = int(AD_INTERVAL)
+            if SETTINGS.auto_ad_enabled:
+                timer_goal = SETTINGS.ad_interval
                 if not timer_goal or timer_goal == 0:
                     if DEBUG:
                         print("[DEBUG]Timer not set or set to 0.")
                     return
-                length = int(AD_LENGTH)
+                length = SETTINGS.ad_length
                 ad_reset_event.clear()
                 try:
                     await asyncio.wait_for(ad_reset_event.wait(), timeout = timer_goal * 60)
@@ -130,9 +154,9 @@ async def start_ad_timer():
         print("[DEBUG]Ad timer task cancelled.")
 
 async def trigger_ad(length: int = 60):
-    settings = await load_settings()
-    length = int(settings.get("Ad Length (seconds)", 60))
-    broadcaster_id = settings["Broadcaster ID"]
+    settings = get_settings_model()
+    length = settings.ad_length
+    broadcaster_id = settings.broadcaster_id
 
     try: 
         result = await twitch.start_commercial(broadcaster_id = broadcaster_id, length = length)
@@ -395,8 +419,10 @@ async def main():
     global TWITCH_BROADCASTER_TOKEN
     global TWITCH_BROADCASTER_REFRESH_TOKEN
     global AD_TIMER
-    TWITCH_BROADCASTER_REFRESH_TOKEN = get_refresh_token("broadcaster")
-    TWITCH_BROADCASTER_TOKEN = refresh_token("broadcaster", CLIENT_ID, CLIENT_SECRET)
+    tokens = get_token_service()
+    TWITCH_BROADCASTER_TOKEN = await tokens.get_token("broadcaster")
+    TWITCH_BROADCASTER_REFRESH_TOKEN = await tokens.get_refresh_token("broadcaster")
+    twitch.user_auth_refresh_callback = lambda token, refresh: tokens.store("broadcaster", token, refresh)
     await twitch.authenticate_app([])
     await twitch.set_user_authentication(TWITCH_BROADCASTER_TOKEN, [
         AuthScope.CHANNEL_READ_SUBSCRIPTIONS,
@@ -436,8 +462,8 @@ async def main():
     eventsub.start()
     # Subscribe to all the events
 
-    settings = await load_settings()
-    channel_id = settings["Broadcaster ID"] #For eventsub, not twitch chat
+    await load_global_variables()
+    channel_id = SETTINGS.broadcaster_id #For eventsub, not twitch chat
     
 
     await eventsub.listen_channel_subscribe(channel_id, on_subscribe)
@@ -448,8 +474,7 @@ async def main():
     await eventsub.listen_channel_subscription_gift(channel_id, on_gift_sub)
     await eventsub.listen_channel_subscription_message(channel_id, on_sub_message)
 
-    await load_global_variables()
-    if AUTO_AD_ENABLED:
+    if SETTINGS.auto_ad_enabled:
         AD_TIMER = asyncio.create_task(start_ad_timer())
 
     print("[green]Listening for Twitch EventSub WebSocket events...")
@@ -9,7 +9,7 @@ import io
 import queue
 import os
 import json
-from json_manager import load_settings, save_settings, load_scheduled_messages, save_scheduled_messages, save_prompts, load_prompts, load_commands, save_commands
+from json_manager import load_settings, save_settings, subscribe_settings, flush_pending_writes, load_scheduled_messages, save_scheduled_messages, save_prompts, load_prompts, load_commands, save_commands
 from audio_player import AUDIO_DEVICES, AudioManager
 import bot_utils
 from eleven_labs_manager import MODELS
@@ -855,7 +855,7 @@ class TwitchBotGUI(tk.Tk):
             for i, event in enumerate(queue):
                 frame = ttk.Frame(self.queue_events_container)
                 frame.pack(fill='x', pady=2)
-                label = ttk.Label(frame, text=f"[{i}] {event.get('event_type', '?')} from {event.get('from_user', '?')} - {event.get('audio', '')}", width=100)
+                label = ttk.Label(frame, text=f"[{i}] {event.get('event_type', '?')} from {event.get('from_user', '?')} - {event.get('audio') or 'waiting for audio'}", width=100)
                 label.pack(side=tk.LEFT, padx=5)
                 ttk.Button(frame, text="Play", command=lambda idx=i: self.play_event(idx)).pack(side=tk.LEFT, padx=2)
                 ttk.Button(frame, text="Delete", command=lambda idx=i: self.delete_event(idx, played=False)).pack(side=tk.LEFT, padx=2)
@@ -996,6 +996,7 @@ class TwitchBotGUI(tk.Tk):
 
     async def load_all_data(self):
         self.settings = await load_settings()
+        subscribe_settings(self.on_settings_changed)
         # Update the GUI widgets on the main thread
         self.after(0, self.populate_settings_widgets)
 
@@ -1004,6 +1005,10 @@ class TwitchBotGUI(tk.Tk):
             print(f"[DEBUG]Loaded scheduled tasks: {self.scheduled_tasks}")
         self.after(0, self.refresh_tasks)
 
+    def on_settings_changed(self, settings): #Called from the settings watcher thread
+        self.settings = settings
+        self.after(0, self.populate_settings_widgets)
+
     def populate_settings_widgets(self):
         for key, entry in self.settings_widgets.items():
             if isinstance(entry, dict):
@@ -1043,6 +1048,7 @@ class TwitchBotGUI(tk.Tk):
             # Schedule bot.close() on the bot's event loop
             asyncio.run_coroutine_threadsafe(self.bot.close(), self.loop)
         self.destroy()
+        flush_pending_writes() # os._exit skips atexit, so write out anything still waiting
         # Forcefully exit the process (kills all threads)
         os._exit(0)
 
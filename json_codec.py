@@ -0,0 +1,60 @@
+import json
+
+#Optional fast encoders. Whichever is installed is used, stdlib json is the fallback.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+def _stdlib_dumps(data, pretty = False, default = None):
+    if pretty:
+        return json.dumps(data, indent = 4, default = default)
+    return json.dumps(data, separators = (",", ":"), default = default)
+
+def _stdlib_loads(content):
+    return json.loads(content)
+
+def _orjson_dumps(data, pretty = False, default = None):
+    return orjson.dumps(data, default = default, option = orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+def _orjson_loads(content):
+    return orjson.loads(content)
+
+def _msgspec_dumps(data, pretty = False, default = None):
+    return msgspec.json.encode(data, enc_hook = default).decode("utf-8")
+
+def _msgspec_loads(content):
+    try:
+        return msgspec.json.decode(content)
+    except msgspec.DecodeError as e:
+        raise ValueError(str(e)) from e #Callers only catch ValueError, like json.JSONDecodeError
+
+BACKENDS = {"json": (_stdlib_dumps, _stdlib_loads)}
+if msgspec:
+    BACKENDS["msgspec"] = (_msgspec_dumps, _msgspec_loads)
+if orjson:
+    BACKENDS["orjson"] = (_orjson_dumps, _orjson_loads)
+
+BACKEND = "orjson" if orjson else "msgspec" if msgspec else "json"
+_dumps, _loads = BACKENDS[BACKEND]
+
+def set_backend(name: str):
+    global BACKEND, _dumps, _loads
+    if name not in BACKENDS:
+        raise ValueError(f"JSON backend '{name}' is not installed. Available: {", ".join(BACKENDS)}")
+    BACKEND = name
+    _dumps, _loads = BACKENDS[name]
+
+def dumps(data, pretty: bool = False, default = None) -> str:
+    #Pretty output is for the hand edited files, so it always comes from stdlib json and looks the same whatever is installed
+    if pretty:
+        return _stdlib_dumps(data, True, default)
+    return _dumps(data, pretty, default)
+
+def loads(content):
+    #Raises ValueError on bad JSON whatever the backend
+    return _loads(content)
@@ -1,8 +1,13 @@
-import json
 import os
+import copy
+import time
+import atexit
+import tempfile
 import threading
 import aiofiles
 import aiofiles.os
+import json_codec
+from settings_model import Settings, SettingsError
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
@@ -13,41 +18,252 @@ SCHEDULED_MESSAGES_FILE = os.path.join(DATA_DIR, "scheduled_messages.json")
 COMMANDS_FILE = os.path.join(DATA_DIR, "commands.json")
 TOKENS_FILE = os.path.join(DATA_DIR, "tokens.json")
 STREAMATHON_TRACKER = os.path.join(DATA_DIR, "streamathon_tracker.json")
+STREAMATHON_DB = os.path.join(DATA_DIR, "streamathon_tracker.db")
 FILEPATHS = [SETTINGS_FILE, MESSAGES_FILE, PROMPTS_FILE, SCHEDULED_MESSAGES_FILE, COMMANDS_FILE, TOKENS_FILE]
 LISTS = [MESSAGES_FILE]
+PRETTY_FILES = [SETTINGS_FILE, PROMPTS_FILE, SCHEDULED_MESSAGES_FILE, COMMANDS_FILE, TOKENS_FILE] #Meant to be read or edited by hand, the rest are saved compact
+WRITE_WINDOW = 0.5 #Seconds, saves of the same file within this window are merged into one disk write
 lock = threading.Lock()
 
+#In-memory settings, only touched through the helpers below
+_settings_cache = None
+_settings_mtime = None
+_settings_subscribers = []
+_settings_watcher = None
+_settings_model = None
+_settings_model_source = None #The cached dict _settings_model was parsed from
+
 def populate_data_folder():
     for file in FILEPATHS:
         ensure_file_exists(file)
         print(f"{file} created.")
 
+def write_atomic(path, content: str):
+    #Write to a temp file in the same folder then swap it in, so a crash never leaves a half written file
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok = True)
+    fd, tmp_path = tempfile.mkstemp(dir = directory, prefix = os.path.basename(path), suffix = ".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(5):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError: #Windows refuses while another process has the file open
+                if attempt == 4:
+                    raise
+                time.sleep(0.05)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class JsonWriter:
+    #Write-behind saver. Keeps only the newest content per file and writes it once the window passes.
+    def __init__(self, window: float = WRITE_WINDOW):
+        self.window = window
+        self.pending = {} #path: [content, due time]
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock() #Keeps writes of the same file in order between the thread and flush()
+        self.thread = None
+        self.requested = 0
+        self.written = 0
+        self.failed = 0
+
+    def save(self, path, content: str, immediate: bool = False):
+        if immediate: #Written on the calling thread before returning
+            with self.write_lock:
+                with self.condition:
+                    self.requested += 1
+                    self.pending.pop(path, None)
+                self._write_all({path: content})
+            return
+        with self.condition:
+            self.requested += 1
+            if path in self.pending:
+                self.pending[path][0] = content
+            else:
+                self.pending[path] = [content, time.monotonic() + self.window]
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(target = self._run, daemon = True)
+                self.thread.start()
+            self.condition.notify()
+
+    def get_pending(self, path):
+        with self.condition:
+            entry = self.pending.get(path)
+            return entry[0] if entry else None
+
+    def _pop(self, due_before = None):
+        with self.condition:
+            ready = {path: entry[0] for path, entry in self.pending.items() if due_before is None or entry[1] <= due_before}
+            for path in ready:
+                del self.pending[path]
+            return ready
+
+    def _write_all(self, ready: dict):
+        for path, content in ready.items():
+            try:
+                write_atomic(path, content)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[ERROR]Failed to save {path}: {e}")
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                next_due = min(entry[1] for entry in self.pending.values())
+                delay = next_due - time.monotonic()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+            with self.write_lock:
+                self._write_all(self._pop(time.monotonic()))
+
+    def flush(self):
+        with self.write_lock:
+            self._write_all(self._pop())
+
+    def stats(self):
+        with self.condition:
+            waiting = len(self.pending)
+        return {
+            "requested": self.requested,
+            "written": self.written,
+            "coalesced": self.requested - self.written - self.failed - waiting,
+            "pending": waiting,
+            "failed": self.failed,
+        }
+
+writer = JsonWriter()
+
+def set_write_window(seconds: float):
+    writer.window = seconds
+
+def flush_pending_writes():
+    writer.flush()
+    stats = writer.stats()
+    if stats["coalesced"]:
+        print(f"[green]Saved {stats['written']} file writes, {stats['coalesced']} coalesced.")
+
+atexit.register(flush_pending_writes)
+
 async def ensure_file_exists(filepath):
+    if writer.get_pending(filepath) is not None:
+        return
     try: 
         await aiofiles.os.stat(filepath)
     except FileNotFoundError:
-        async with aiofiles.open(filepath, "w", encoding="utf-8") as f:
-            if filepath not in LISTS:
-                await f.write("{}")
-            else:
-                await f.write("[]")
-            await new_json(filepath)
+        writer.save(filepath, "[]" if filepath in LISTS else "{}", immediate = True)
+        await new_json(filepath)
 
 async def async_load_json(path):
     await ensure_file_exists(path)
-    async with aiofiles.open(path, "r", encoding="utf-8") as f:
-        content = await f.read()
-        return json.loads(content)
+    content = writer.get_pending(path) #Not on disk yet, the newest copy is in the writer
+    if content is None:
+        async with aiofiles.open(path, "r", encoding="utf-8") as f:
+            content = await f.read()
+    return json_codec.loads(content)
+
+async def async_save_json(path, data, immediate: bool = False, pretty: bool = None):
+    if pretty is None:
+        pretty = path in PRETTY_FILES
+    writer.save(path, json_codec.dumps(data, pretty), immediate)
+
+def _settings_file_mtime():
+    try:
+        return os.stat(SETTINGS_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
 
-async def async_save_json(path, data):
-    async with aiofiles.open(path, "w", encoding="utf-8") as f:
-        await f.write(json.dumps(data, indent=4))
+def _store_settings(data):
+    global _settings_cache, _settings_mtime
+    with lock:
+        _settings_cache = data
+        _settings_mtime = _settings_file_mtime()
 
-async def load_settings():
-    return await async_load_json(SETTINGS_FILE)
+async def load_settings(): #Returns a private copy, safe to edit and pass to save_settings
+    if _settings_cache is None:
+        _store_settings(await async_load_json(SETTINGS_FILE))
+    with lock:
+        return copy.deepcopy(_settings_cache)
+
+def get_settings(): #Shared in-memory settings for hot paths, treat as read-only
+    if _settings_cache is None:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            _store_settings(json_codec.loads(f.read()))
+    return _settings_cache
+
+def get_settings_model(): #Typed settings, parsed and validated once per version of the file
+    global _settings_model, _settings_model_source
+    settings = get_settings()
+    if _settings_model_source is not settings:
+        _settings_model = Settings.from_dict(settings)
+        _settings_model_source = settings
+    return _settings_model
 
 async def save_settings(data):
+    global _settings_cache
+    Settings.from_dict(data) #Raises SettingsError before anything bad reaches disk
+    with lock:
+        _settings_cache = copy.deepcopy(data)
     await async_save_json(SETTINGS_FILE, data)
+    _store_settings(_settings_cache)
+
+def subscribe_settings(callback): #callback(settings) runs on the watcher thread when settings.json is edited outside the bot
+    if callback not in _settings_subscribers:
+        _settings_subscribers.append(callback)
+
+def unsubscribe_settings(callback):
+    if callback in _settings_subscribers:
+        _settings_subscribers.remove(callback)
+
+def _check_settings_file():
+    global _settings_mtime
+    mtime = _settings_file_mtime()
+    if mtime is None or mtime == _settings_mtime:
+        return
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            data = json_codec.loads(f.read())
+    except (OSError, ValueError):
+        return #Caught mid-write, try again on the next poll
+    try:
+        Settings.from_dict(data)
+    except SettingsError as e:
+        _settings_mtime = mtime #Don't report the same broken file every poll
+        print(f"[ERROR]Ignoring edited settings.json, keeping the previous settings. {e}")
+        return
+    with lock:
+        changed = data != _settings_cache
+    _store_settings(data)
+    if not changed:
+        return #Our own write landing on disk
+    print("[yellow]settings.json changed on disk, reloading.")
+    for callback in list(_settings_subscribers):
+        try:
+            callback(copy.deepcopy(data))
+        except Exception as e:
+            print(f"[ERROR]Settings subscriber failed: {e}")
+
+def start_settings_watcher(interval: float = 1.0):
+    global _settings_watcher
+    if _settings_watcher and _settings_watcher.is_alive():
+        return
+    def watch():
+        while True:
+            time.sleep(interval)
+            _check_settings_file()
+    _settings_watcher = threading.Thread(target = watch, daemon = True)
+    _settings_watcher.start()
 
 async def load_messages():
     return await async_load_json(MESSAGES_FILE)
@@ -88,6 +304,10 @@ async def new_json(file):
                     "Elevenlabs Voice ID": None,
                     "Elevenlabs Synthesizer Model": None,
                     "Azure TTS Backup Voice": None,
+                    "TTS Cache Enabled": True,
+                    "TTS Cache Size (MB)": 500,
+                    "TTS Workers": 2,
+                    "TTS Look Ahead": 3,
                     "Event Queue Enabled": False,
                     "Seconds Between Events": 5,
                     "Audio Output Device": None,
@@ -139,7 +359,7 @@ async def new_json(file):
                         "last_refreshed": 0
                     }
                 }
-        await async_save_json(TOKENS_FILE, tokens)
+        await async_save_json(TOKENS_FILE, tokens, immediate = True) #token_manager reads this file directly
     elif file == PROMPTS_FILE:
         prompts = {
                     "Respond to Messages": None,
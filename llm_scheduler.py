@@ -0,0 +1,145 @@
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from bot_utils import get_debug
+
+#Priority classes, lower runs first
+PAID = 0 #Raids, bits, subs, gift subs, streamathon milestones
+STREAMER = 1 #Push-to-talk questions and voiced summaries
+MODERATION = 2 #Bot detection
+AMBIENT = 3 #Random replies to chat
+PRIORITY_NAMES = {PAID: "paid", STREAMER: "streamer", MODERATION: "moderation", AMBIENT: "ambient"}
+
+MAX_CONCURRENT_REQUESTS = 4 #LLM requests allowed in flight at once
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 30000
+MAX_QUEUED = 20 #Waiting requests beyond this shed the lowest class first. Paid requests are never shed.
+WAIT_SAMPLES = 200 #Recent queue waits kept per class for the metrics
+
+class LLMRequestShed(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float):
+        #Seconds until amount is available. A request bigger than the whole bucket only waits for a full bucket.
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+class LLMScheduler:
+    #Hands out request slots by priority class, inside a concurrency limit and request/token rate limits
+    def __init__(self, max_concurrent: int = MAX_CONCURRENT_REQUESTS, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE, max_queued: int = MAX_QUEUED):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.active = 0
+        self.waiting = [] #heap of (priority, order, future, tokens)
+        self.order = itertools.count()
+        self.timer = None
+        self.waits = {priority: deque(maxlen = WAIT_SAMPLES) for priority in PRIORITY_NAMES}
+        self.counts = {priority: {"started": 0, "shed": 0} for priority in PRIORITY_NAMES}
+
+    async def acquire(self, priority: int, tokens: int):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (priority, next(self.order), future, tokens)
+        heapq.heappush(self.waiting, entry)
+        self._shed()
+        queued_at = time.monotonic()
+        self._pump()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release() #Cancelled right after being given a slot
+            elif entry in self.waiting:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+            raise
+        self.waits[priority].append(time.monotonic() - queued_at)
+        self.counts[priority]["started"] += 1
+
+    def release(self):
+        self.active -= 1
+        self._pump()
+
+    def slot(self, priority: int, tokens: int):
+        return _Slot(self, priority, tokens)
+
+    def _shed(self):
+        while len(self.waiting) > self.max_queued:
+            sheddable = [entry for entry in self.waiting if entry[0] != PAID] #Paid alerts wait their turn however long the queue gets
+            if not sheddable:
+                return
+            worst = max(sheddable, key = lambda entry: (entry[0], entry[1])) #Lowest class, newest request
+            self.waiting.remove(worst)
+            heapq.heapify(self.waiting)
+            self.counts[worst[0]]["shed"] += 1
+            if not worst[2].done():
+                worst[2].set_exception(LLMRequestShed(f"LLM queue is full, dropped a {PRIORITY_NAMES.get(worst[0], worst[0])} request"))
+            if get_debug():
+                print(f"[DEBUG]Shed a {PRIORITY_NAMES.get(worst[0], worst[0])} LLM request, {len(self.waiting)} still waiting.")
+
+    def _pump(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        while self.waiting and self.active < self.max_concurrent:
+            priority, _, future, tokens = self.waiting[0]
+            if future.done(): #Cancelled while waiting
+                heapq.heappop(self.waiting)
+                continue
+            delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if delay > 0:
+                self.timer = asyncio.get_running_loop().call_later(delay, self._pump)
+                return
+            heapq.heappop(self.waiting)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.active += 1
+            future.set_result(None)
+
+    def stats(self):
+        stats = {}
+        for priority, name in PRIORITY_NAMES.items():
+            waits = sorted(self.waits[priority])
+            stats[name] = {
+                **self.counts[priority],
+                "queued": sum(1 for entry in self.waiting if entry[0] == priority),
+                "wait p50": waits[len(waits) // 2] if waits else 0.0,
+                "wait p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                "wait max": waits[-1] if waits else 0.0,
+            }
+        stats["active"] = self.active
+        return stats
+
+class _Slot:
+    def __init__(self, scheduler, priority, tokens):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.tokens = tokens
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.priority, self.tokens)
+
+    async def __aexit__(self, *exc):
+        self.scheduler.release()
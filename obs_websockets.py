@@ -6,7 +6,8 @@ import obsws_python as obs
 from contextlib import contextmanager
 from audio_player import AudioManager
 from bot_utils import DEBUG
-from json_manager import load_settings, load_tracker, save_tracker
+from json_manager import load_settings, get_settings_model
+from streamathon_tracker import get_tracker
 
 ##########################################################
 ##########################################################
@@ -44,10 +45,12 @@ class OBSWebsocketsManager:
                 time.sleep(10)
         print("[green]Connected to OBS Websockets!\n")
 
-    async def set_local_variables(self):
-        settings = await load_settings()
-        self.onscreen_location = settings.get("Onscreen Location")
-        self.offscreen_location = settings.get("Offscreen Location")
+    async def set_local_variables(self, settings = None):
+        if settings is None:
+            await load_settings()
+            settings = get_settings_model()
+        self.onscreen_location = settings.onscreen_location
+        self.offscreen_location = settings.offscreen_location
 
     async def capture_location(self, is_onscreen, assistant_name):
         current_scene = self.ws.get_current_program_scene().current_program_scene_name
@@ -132,9 +135,9 @@ class OBSWebsocketsManager:
 
 
     async def update_bar(self, points_added: int):
-        settings = await load_settings()
-        original_transform = settings["Progress Bar Transform Full-Sized"]
-        streamathon_tracker = await load_tracker()
+        settings = get_settings_model()
+        original_transform = settings.progress_bar_transform
+        streamathon_tracker = get_tracker().get_totals()
 
         current_points = streamathon_tracker["Current Point Total"]
         goal_points = streamathon_tracker["Current Goal Tier"]
@@ -146,8 +149,8 @@ class OBSWebsocketsManager:
         progress_ratio = current_points / goal_points if goal_points > 0 else 0.0
 
         # Calculate true width/height based on scale * base size from settings
-        base_width = settings["Progress Bar Transform Full-Sized"].get("baseWidth", 1)
-        base_height = settings["Progress Bar Transform Full-Sized"].get("baseHeight", 1)
+        base_width = original_transform.get("baseWidth", 1)
+        base_height = original_transform.get("baseHeight", 1)
         bar_width = original_transform["scaleX"] * base_width
         bar_height = original_transform["scaleY"] * base_height
 
@@ -159,7 +162,7 @@ class OBSWebsocketsManager:
         target_crop = int(full_crop * (1 - progress_ratio))
 
         # Get current scene item
-        bar_name = settings["Progress Bar Name"]
+        bar_name = settings.progress_bar_name
         scene_name = self.ws.get_current_program_scene().current_program_scene_name
         scene_items = self.ws.get_scene_item_list(scene_name)
 
@@ -393,7 +396,7 @@ class OBSWebsocketsManager:
         self.ws.set_scene_item_enabled(current_scene, scene_item_id, False)
 
 
-    async def bounce_while_talking(self, volumes, min_vol, max_vol, total_duration_ms, assistant_name, stationary_assistant_name, scene_name=None, original_transform=None):
+    async def bounce_while_talking(self, volumes, min_vol, max_vol, total_duration_ms, assistant_name, stationary_assistant_name, scene_name=None, original_transform=None, stream=None):
         try:
             if not scene_name:
                 scene_name = self.ws.get_current_program_scene().current_program_scene_name
@@ -430,10 +433,21 @@ class OBSWebsocketsManager:
 
             while True:
                 elapsed = time.perf_counter() - start_time
-                if elapsed >= total_duration_s:
-                    break
-
-                frame_index = int(elapsed * 1000 // frame_ms) % num_frames
+                if stream: # Still being synthesized, the envelope and length grow while it plays
+                    volumes = stream.volumes
+                    num_frames = len(volumes)
+                    min_vol, max_vol = stream.min_volume, stream.max_volume
+                    total_duration_s = stream.duration_ms / 1000
+                    if stream.done and elapsed >= total_duration_s:
+                        break
+                    if not num_frames:
+                        await asyncio.sleep(frame_ms / 2000)
+                        continue
+                    frame_index = min(int(elapsed * 1000 // frame_ms), num_frames - 1)
+                else:
+                    if elapsed >= total_duration_s:
+                        break
+                    frame_index = int(elapsed * 1000 // frame_ms) % num_frames
                 vol = volumes[frame_index]
                 y = await audio_manager.map_volume_to_y(vol, min_vol, max_vol, actual_base_y)
 
@@ -1,60 +1,146 @@
 import os
-from openai import OpenAI
+import re
+import time
+import json
+import httpx
+from openai import OpenAI, AsyncOpenAI
 import tiktoken
 import asyncio
+from collections import deque
 from dotenv import load_dotenv
 from bot_utils import DEBUG
+from llm_scheduler import LLMScheduler, PAID, STREAMER, MODERATION, MAX_CONCURRENT_REQUESTS
+from tracing import get_tracer, LLM_QUEUE, LLM, LLM_FIRST_TOKEN
 
 load_dotenv()
 
 DEFAULT_MODEL = 'gpt-4o'
 CONVERATIONAL_MODEL = "ft:gpt-4o-2024-08-06:mizugaming:maddie:BllhDqyb"
 API_KEY = os.getenv("OPENAI_API_KEY")
+BASE_URL = os.getenv("OPENAI_BASE_URL") #Point at benchmarks/mock_openai_server.py to run without OpenAI
+BOT_DETECTOR_MODEL = "ft:gpt-4o-mini-2024-07-18:mizugaming:bot-detector:Bv9zPaZq"
+BOT_DETECTOR_BATCH_MODEL = "gpt-4o-mini" #The fine-tuned detector only answers one message at a time
+COMPLETION_TOKENS_ESTIMATE = 300 #Counted against the tokens per minute limit on top of the prompt
+MAX_CONNECTIONS = 8 #Pooled HTTP connections shared by every async request
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+MIN_SENTENCE_CHARS = 20 #Short bits like "Oh." are held back and spoken with the next sentence
+BOT_DETECTION_BATCH_PROMPT = {"role": "system", "content": "You are a twitch moderator reviewing the first chat messages of several different chatters at once. For each numbered message decide whether its chatter is a bot, scammer, or spammer. Answer Yes if they are, No if they are not, and Maybe if you need more of their messages to decide. Judge every message on its own. Reply with JSON only, in the form {\"verdicts\": [\"Yes\", \"No\", \"Maybe\"]}, with exactly one verdict per message in the same order."}
 BOT_DETECTION_PROMPT = {"role": "system", "content": "You are a twitch moderator who's sole job is to review a chatter's message if it is their first time chatting. You are checking if they are a bot, scammer, or spammer. You will provide a single word response, Yes, No, or Maybe. Saying Yes means you think they are a bot, scammer, or spammer. No means they are not. And Maybe means you will need more context to determine, in which case I will append more of their messages as they come in until you change your answer. Always respond with a single word, Yes, No, Maybe, so that my program can automatically take action depending on your answer."}
 
 
-def num_of_tokens(messages, model = DEFAULT_MODEL):
-  """Returns the number of tokens used by a list of messages.
+_encoding = None
+
+def get_encoding():
+  # Loaded on first use and kept for the life of the process
+  global _encoding
+  if _encoding is None:
+      _encoding = tiktoken.get_encoding("o200k_base")
+  return _encoding
+
+def message_tokens(message, model = DEFAULT_MODEL):
+  """Returns the number of tokens a single message adds to a prompt.
   Copied with minor changes from: https://platform.openai.com/docs/guides/chat/managing-tokens """
+  counted = getattr(message, "num_of_tokens", None) # Prompts from the registry keep their own count
+  if counted is not None:
+      return counted()
   try:
-      encoding = tiktoken.get_encoding("o200k_base")
-      num_tokens = 0
-      for message in messages:
-          num_tokens += 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
-          for key, value in message.items():
-              num_tokens += len(encoding.encode(value))
-              if key == "name":  # if there's a name, the role is omitted
-                  num_tokens += -1  # role is always required and always 1 token
-      num_tokens += 2  # every reply is primed with <im_start>assistant
+      encoding = get_encoding()
+      num_tokens = 4  # every message follows <im_start>{role/name}\n{content}<im_end>\n
+      for key, value in message.items():
+          num_tokens += len(encoding.encode(value))
+          if key == "name":  # if there's a name, the role is omitted
+              num_tokens += -1  # role is always required and always 1 token
       return num_tokens
   except Exception:
       raise NotImplementedError(f"""[ERROR]num_tokens_from_messages() is not presently implemented for model {model}.
       #See https://github.com/openai/openai-python/blob/main/chatml.md for information on how messages are converted to tokens.""")
+
+def num_of_tokens(messages, model = DEFAULT_MODEL):
+  """Returns the number of tokens used by a list of messages."""
+  return sum(message_tokens(message, model) for message in messages) + 2  # every reply is primed with <im_start>assistant
+
+class ChatHistory:
+    # Conversation for chat_with_history. Token counts are worked out once per message and kept as a running total.
+    def __init__(self, pinned: int = 1):
+        self.pinned = [] # The first messages (the system prompt) are never trimmed
+        self.pinned_count = pinned
+        self.messages = deque() # (message, tokens), oldest first
+        self.total = 2 # every reply is primed with <im_start>assistant
+
+    def append(self, message):
+        entry = (message, message_tokens(message))
+        if len(self.pinned) < self.pinned_count:
+            self.pinned.append(entry)
+        else:
+            self.messages.append(entry)
+        self.total += entry[1]
+
+    def pop_oldest(self):
+        message, tokens = self.messages.popleft()
+        self.total -= tokens
+        return message
+
+    def num_of_tokens(self):
+        return self.total
+
+    def to_list(self):
+        return [message for message, _ in self.pinned] + [message for message, _ in self.messages]
+
+    def __len__(self):
+        return len(self.pinned) + len(self.messages)
   
 
 class OpenAiManager:
     
-    def __init__(self):
-        self.chat_history = [] # Stores the entire conversation
+    def __init__(self, max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS, base_url: str = BASE_URL):
+        self.chat_history = ChatHistory() # Stores the entire conversation
+        self.max_concurrent_requests = max_concurrent_requests
+        self.base_url = base_url
+        self.api_key = API_KEY or ("mock" if base_url else None) # A local stand-in doesn't check the key
+        self.async_clients = {} # One pooled client and scheduler per event loop, httpx connections can't cross loops
         try:
-            self.client = OpenAI(api_key = API_KEY)
+            self.client = OpenAI(api_key = self.api_key, base_url = base_url)
         except TypeError:
             exit("[ERROR]Ooops! You forgot to set OPENAI_API_KEY in your environment!")
 
-    # Asks a question with no chat history
-    def chat(self, messages, conversational: bool):
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.async_clients:
+            http_client = httpx.AsyncClient(limits = httpx.Limits(max_connections = MAX_CONNECTIONS, max_keepalive_connections = MAX_CONNECTIONS))
+            self.async_clients[loop] = (AsyncOpenAI(api_key = self.api_key, base_url = self.base_url, http_client = http_client), LLMScheduler(self.max_concurrent_requests))
+        return self.async_clients[loop]
+
+    def scheduler_stats(self):
+        _, scheduler = self._async_client()
+        return scheduler.stats()
+
+    async def _create_async(self, model, messages, priority, prompt_tokens = None, **options):
+        client, scheduler = self._async_client()
+        tokens = (prompt_tokens if prompt_tokens is not None else num_of_tokens(messages)) + COMPLETION_TOKENS_ESTIMATE
+        tracer = get_tracer()
+        queued_at = time.perf_counter()
+        async with scheduler.slot(priority, tokens):
+            tracer.record(LLM_QUEUE, time.perf_counter() - queued_at)
+            with tracer.span(LLM):
+                return await client.chat.completions.create(model = model, messages = messages, **options)
+
+    def _check_prompt(self, messages):
         if not messages or not isinstance(messages, list):
             print("[ERROR]Didn't receive input!")
-            return
+            return False
 
         # Check that the prompt is under the token context limit
         if num_of_tokens(messages) > 4000:
             print("[WARNING]The length of this chat question is too large for the GPT model")
-            return
+            return False
 
         print("[orange]Asking ChatGPT a question...")
+        return True
 
-
+    # Asks a question with no chat history
+    def chat(self, messages, conversational: bool):
+        if not self._check_prompt(messages):
+            return
 
         # Process the answer
         completion = self.client.chat.completions.create(
@@ -65,38 +151,90 @@ class OpenAiManager:
         openai_answer = completion.choices[0].message.content
         print(f"[green]{openai_answer}")
         return openai_answer
-    
 
-    # Asks a question that includes the full conversation history
-    def chat_with_history(self, prompt="", conversational: bool = False):
+    async def chat_async(self, messages, conversational: bool, priority: int = PAID, echo: bool = True):
+        if not self._check_prompt(messages):
+            return
+
+        completion = await self._create_async(CONVERATIONAL_MODEL if conversational else DEFAULT_MODEL, messages, priority)
+
+        openai_answer = completion.choices[0].message.content
+        if echo:
+            print(f"[green]{openai_answer}")
+        return openai_answer
+
+    def _add_to_history(self, prompt):
         if not prompt:
             print("[ERROR]Didn't receive input!")
-            return
+            return False
 
         # Add our prompt into the chat history
         self.chat_history.append({"role": "user", "content": prompt})
 
         # Check total token limit. Remove old messages as needed
         if DEBUG:
-            print(f"[DEBUG]Chat History has a current token length of {num_of_tokens(self.chat_history)}")
-        while num_of_tokens(self.chat_history) > 2000:
-            self.chat_history.pop(1) # We skip the 1st message since it's the system message
-            print(f"[orange]Popped a message! New token length is: {num_of_tokens(self.chat_history)}")
+            print(f"[DEBUG]Chat History has a current token length of {self.chat_history.num_of_tokens()}")
+        while self.chat_history.num_of_tokens() > 2000 and self.chat_history.messages:
+            self.chat_history.pop_oldest() # The system message is pinned and never popped
+            print(f"[orange]Popped a message! New token length is: {self.chat_history.num_of_tokens()}")
 
         print("[orange]Asking ChatGPT a question...")
+        return True
 
+    def _answer_from_history(self, completion):
         # Add this answer to our chat history
-        completion = self.client.chat.completions.create(
-                        model=CONVERATIONAL_MODEL if conversational else DEFAULT_MODEL,
-                        messages=self.chat_history
-                        )
-        
         self.chat_history.append({"role": completion.choices[0].message.role, "content": completion.choices[0].message.content})
 
         # Process the answer
         openai_answer = completion.choices[0].message.content
         print(f"[green]{openai_answer}")
         return openai_answer
+
+    # Asks a question that includes the full conversation history
+    def chat_with_history(self, prompt="", conversational: bool = False):
+        if not self._add_to_history(prompt):
+            return
+
+        completion = self.client.chat.completions.create(
+                        model=CONVERATIONAL_MODEL if conversational else DEFAULT_MODEL,
+                        messages=self.chat_history.to_list()
+                        )
+        return self._answer_from_history(completion)
+
+    async def chat_with_history_async(self, prompt="", conversational: bool = False, priority: int = STREAMER):
+        if not self._add_to_history(prompt):
+            return
+
+        completion = await self._create_async(CONVERATIONAL_MODEL if conversational else DEFAULT_MODEL, self.chat_history.to_list(), priority, self.chat_history.num_of_tokens())
+        return self._answer_from_history(completion)
+
+    async def stream_chat_with_history(self, prompt="", conversational: bool = False, priority: int = STREAMER):
+        # Yields the answer in pieces as they arrive, the full answer is added to the chat history at the end
+        if not self._add_to_history(prompt):
+            return
+
+        client, scheduler = self._async_client()
+        parts = []
+        tracer = get_tracer()
+        queued_at = time.perf_counter()
+        async with scheduler.slot(priority, self.chat_history.num_of_tokens() + COMPLETION_TOKENS_ESTIMATE):
+            started_at = time.perf_counter()
+            tracer.record(LLM_QUEUE, started_at - queued_at)
+            stream = await client.chat.completions.create(
+                model = CONVERATIONAL_MODEL if conversational else DEFAULT_MODEL,
+                messages = self.chat_history.to_list(),
+                stream = True
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not parts:
+                        tracer.record(LLM_FIRST_TOKEN, time.perf_counter() - started_at)
+                    parts.append(chunk.choices[0].delta.content)
+                    yield parts[-1]
+
+        openai_answer = "".join(parts)
+        self.chat_history.append({"role": "assistant", "content": openai_answer})
+        print(f"[green]{openai_answer}")
     
     def bot_detector(self, message):
         if not message:
@@ -106,25 +244,66 @@ class OpenAiManager:
         messages = [BOT_DETECTION_PROMPT, {"role": "user", "content": message}]
 
         completion = self.client.chat.completions.create(
-            model = "ft:gpt-4o-mini-2024-07-18:mizugaming:bot-detector:Bv9zPaZq",
+            model = BOT_DETECTOR_MODEL,
             messages=messages
         )
-        openai_answer = completion.choices[0].message.content
-        print(openai_answer)
-
-        if openai_answer.lower().startswith("yes"):
-            if DEBUG:
-                print(f"[DEBUG]First time message is spam.")
-            return True
-        elif openai_answer.lower().startswith("no"):
-            if DEBUG:
-                print(f"[DEBUG]First time message is not spam.")
-            return False
-        elif openai_answer.lower().startswith("maybe"):
-            if DEBUG:
-                print(f"[DEBUG]Not sure if first message is spam.")
-            return 3
-        else:
-            if DEBUG:
-                print(f"[DEBUG]Invalid response from bot-detection AI: {openai_answer}")
-            return 3
\ No newline at end of file
+        return parse_bot_verdict(completion.choices[0].message.content)
+
+    async def bot_detector_async(self, message):
+        if not message:
+            print("[ERROR]Called without input")
+            return
+
+        messages = [BOT_DETECTION_PROMPT, {"role": "user", "content": message}]
+
+        completion = await self._create_async(BOT_DETECTOR_MODEL, messages, MODERATION)
+        return parse_bot_verdict(completion.choices[0].message.content)
+
+    async def bot_detector_batch_async(self, messages: list):
+        # One request for several chatters, returns a verdict per message in the same order
+        numbered = "\n".join(f"{i + 1}. {' '.join(message.split())}" for i, message in enumerate(messages))
+        prompt = [BOT_DETECTION_BATCH_PROMPT, {"role": "user", "content": numbered}]
+
+        completion = await self._create_async(BOT_DETECTOR_BATCH_MODEL, prompt, MODERATION, response_format = {"type": "json_object"})
+        try:
+            verdicts = json.loads(completion.choices[0].message.content)["verdicts"]
+            if len(verdicts) != len(messages):
+                raise ValueError(f"got {len(verdicts)} verdicts for {len(messages)} messages")
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[WARNING]Unusable batch bot detection answer ({e}), checking the messages one at a time.")
+            return await asyncio.gather(*[self.bot_detector_async(message) for message in messages])
+        return [parse_bot_verdict(str(verdict)) for verdict in verdicts]
+
+async def split_sentences(pieces):
+    # Regroups streamed text into whole sentences so each can be sent to TTS on its own
+    buffer = ""
+    async for piece in pieces:
+        buffer += piece
+        while True:
+            match = next((m for m in SENTENCE_END.finditer(buffer) if m.end() >= MIN_SENTENCE_CHARS), None)
+            if not match:
+                break
+            sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+            yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+def parse_bot_verdict(openai_answer):
+    print(openai_answer)
+
+    if openai_answer.lower().startswith("yes"):
+        if DEBUG:
+            print(f"[DEBUG]First time message is spam.")
+        return True
+    elif openai_answer.lower().startswith("no"):
+        if DEBUG:
+            print(f"[DEBUG]First time message is not spam.")
+        return False
+    elif openai_answer.lower().startswith("maybe"):
+        if DEBUG:
+            print(f"[DEBUG]Not sure if first message is spam.")
+        return 3
+    else:
+        if DEBUG:
+            print(f"[DEBUG]Invalid response from bot-detection AI: {openai_answer}")
+        return 3
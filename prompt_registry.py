@@ -0,0 +1,94 @@
+import re
+from openai_chat import get_encoding
+
+PLACEHOLDER = re.compile(r"<([A-Z_]+)>") #Same <RNG> style placeholders prompts.json already uses
+
+#Prompts that live in the code rather than prompts.json
+BUILTIN_PROMPTS = {
+    "Bit Donation Scream": "You are now Maddieply, the lovable anime catgirl secretary to the dystopian business ModdCorp. You are sarcastic, snarky, and sassy. You know all the rules and policies of ModdCorp, but are still lazy about your job. Your boss is ModdiPly, a twitch streamer and CEO of ModdCorp. Your job is to thank people who donate their twitch bits to ModdiPly. They've donated such an extreme amount of bits, you should be shocked and scream in excitement. You are not allowed to say anything else, just yell! Scream, freak out, and be as loud as possible!",
+    "Bit Donation Details": "<USER> donated <BITS> to <BROADCASTER>. In response to the amount of bits, you should respond with a <REACTION> reaction.",
+    "Bit Donation Details w/ Message": "<USER> donated <BITS> to <BROADCASTER>.\n<USER>'s message: <MESSAGE> In response to the amount of bits, you should respond with a <REACTION> reaction.",
+    "Bit Donation Scream Details": "<USER> donated <BITS> to <BROADCASTER>. In response to the amount of bits, just yell! Scream, freak out, and be as loud as possible!",
+    "Bit Donation Scream Details w/ Message": "<USER> donated <BITS> to <BROADCASTER>.\n<USER>'s message: <MESSAGE>.",
+    "Chat Summary Update": "Your summary of chat so far:\n<SUMMARY>\n\nNew chat messages since then:\n<MESSAGES>\n\nRewrite your summary so it covers the new messages too, keeping it about the same length. Drop older topics chat has moved on from.",
+}
+
+class PromptMessage(dict):
+    #A chat message rendered from a template. Sent to OpenAI as a plain dict, but knows its own token count.
+    def __init__(self, template, content, values = ()):
+        super().__init__(role = template.role, content = content)
+        self.template = template
+        self.values = values
+        self.tokens = None
+
+    def num_of_tokens(self):
+        #Only the filled in values are encoded, the template's static text was counted once when it was first needed.
+        #Tokens can merge across a boundary, so this can differ from encoding the whole text by a token or two.
+        if self.tokens is None:
+            encoding = get_encoding()
+            self.tokens = self.template.static_tokens() + sum(len(encoding.encode(value)) for value in self.values)
+        return self.tokens
+
+class PromptTemplate:
+    __slots__ = ("name", "role", "text", "parts", "fields", "message", "_static_tokens")
+
+    def __init__(self, name: str, text: str, role: str = "system"):
+        self.name = name
+        self.role = role
+        self.text = text
+        pieces = PLACEHOLDER.split(text or "")
+        self.parts = pieces[0::2] #Static text, one more entry than fields
+        self.fields = pieces[1::2]
+        self.message = None if self.fields else PromptMessage(self, text)
+        self._static_tokens = None
+
+    def static_tokens(self):
+        if self._static_tokens is None:
+            encoding = get_encoding()
+            self._static_tokens = 4 + len(encoding.encode(self.role)) + sum(len(encoding.encode(part)) for part in self.parts if part) # every message follows <im_start>{role/name}\n{content}<im_end>\n
+        return self._static_tokens
+
+    def render(self, **values):
+        #Missing values leave their placeholder in place, the same as str.replace did
+        if self.message is not None:
+            return self.message
+        filled = [str(values[field]) if field in values else f"<{field}>" for field in self.fields]
+        content = [self.parts[0]]
+        for value, part in zip(filled, self.parts[1:]):
+            content.append(value)
+            content.append(part)
+        return PromptMessage(self, "".join(content), filled)
+
+class PromptRegistry:
+    def __init__(self):
+        self.templates = {}
+        self.load({})
+
+    def load(self, prompts: dict):
+        #Compiles every prompt once, whenever prompts.json is loaded or saved from the GUI
+        templates = {name: PromptTemplate(name, text) for name, text in BUILTIN_PROMPTS.items()}
+        for name, text in prompts.items():
+            #Prompts left empty in prompts.json (None on a fresh install) are sent as empty content, like before
+            templates[name] = PromptTemplate(name, text if isinstance(text, str) else None)
+        self.templates = templates
+
+    def render(self, name: str, **values):
+        template = self.templates.get(name)
+        if template is None:
+            print(f"[WARNING]Prompt \"{name}\" is missing from prompts.json, sending it empty.")
+            template = self.templates[name] = PromptTemplate(name, None)
+        return template.render(**values)
+
+    def message(self, name: str):
+        return self.render(name)
+
+    def __contains__(self, name):
+        return name in self.templates
+
+_registry = None
+
+def get_prompt_registry():
+    global _registry
+    if _registry is None:
+        _registry = PromptRegistry()
+    return _registry
@@ -0,0 +1,204 @@
+from dataclasses import dataclass, fields
+
+class SettingsError(ValueError):
+    pass
+
+_MISSING = object()
+
+#Fields each subsystem re-reads on reload. Anything not listed is read straight off the model when it is used.
+AD_FIELDS = frozenset({"auto_ad_enabled", "ad_interval", "ad_length"})
+OBS_FIELDS = frozenset({"onscreen_location", "offscreen_location"})
+TTS_CACHE_FIELDS = frozenset({"tts_cache_enabled", "tts_cache_mb"})
+TTS_WORKER_FIELDS = frozenset({"tts_workers", "tts_look_ahead"})
+
+@dataclass(slots = True, frozen = True)
+class HotkeySettings:
+    listen_and_respond: str | None
+    end_listen: str | None
+    voice_summarize: str | None
+    play_next: str | None
+    skip_current: str | None
+    replay_last: str | None
+    play_ad: str | None
+    pause_queue: str | None
+
+@dataclass(slots = True, frozen = True)
+class ResubSettings:
+    intern_months: int
+    employee_months: int
+    supervisor_months: int
+
+@dataclass(slots = True, frozen = True)
+class BitsSettings:
+    normal: int
+    impressed: int
+    exaggerated: int
+    screaming: int
+
+@dataclass(slots = True, frozen = True)
+class Settings:
+    bot_nickname: str | None
+    broadcaster_channel: str | None
+    broadcaster_id: str | None
+    elevenlabs_voice: str | None
+    elevenlabs_model: str | None
+    azure_backup_voice: str | None
+    tts_cache_enabled: bool
+    tts_cache_mb: float
+    tts_workers: int
+    tts_look_ahead: int
+    event_queue_enabled: bool
+    seconds_between_events: float
+    audio_output_device: str | int | None
+    auto_ad_enabled: bool
+    ad_length: int
+    ad_interval: int
+    hotkeys: HotkeySettings
+    raid_threshold: int
+    resub: ResubSettings
+    bits: BitsSettings
+    obs_assistant_name: str | None
+    obs_stationary_assistant_name: str | None
+    onscreen_location: dict | None
+    offscreen_location: dict | None
+    streamathon_mode: bool
+    progress_bar_name: str | None
+    progress_bar_transform: dict
+    debug: bool
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        #Checks every key up front and reports all problems at once, so a bad settings.json fails at load instead of mid-event
+        reader = _Reader(data)
+        hotkeys = reader.section("Hotkeys")
+        resub = reader.section("Resub")
+        bits = reader.section("Bits")
+        settings = cls(
+            bot_nickname = reader.text("Bot Nickname"),
+            broadcaster_channel = reader.text("Broadcaster Channel"),
+            broadcaster_id = reader.text("Broadcaster ID"),
+            elevenlabs_voice = reader.text("Elevenlabs Voice ID"),
+            elevenlabs_model = reader.text("Elevenlabs Synthesizer Model"),
+            azure_backup_voice = reader.text("Azure TTS Backup Voice"),
+            tts_cache_enabled = reader.flag("TTS Cache Enabled", True),
+            tts_cache_mb = reader.number("TTS Cache Size (MB)", float, 500),
+            tts_workers = reader.number("TTS Workers", int, 2),
+            tts_look_ahead = reader.number("TTS Look Ahead", int, 3),
+            event_queue_enabled = reader.flag("Event Queue Enabled"),
+            seconds_between_events = reader.number("Seconds Between Events", float),
+            audio_output_device = reader.device("Audio Output Device"),
+            auto_ad_enabled = reader.flag("Auto Ad Enabled"),
+            ad_length = reader.number("Ad Length (seconds)", int, 60),
+            ad_interval = reader.number("Ad Interval (minutes)", int),
+            hotkeys = HotkeySettings(
+                listen_and_respond = hotkeys.text("LISTEN_AND_RESPOND_KEY"),
+                end_listen = hotkeys.text("END_LISTEN_KEY"),
+                voice_summarize = hotkeys.text("VOICE_SUMMARIZE_KEY"),
+                play_next = hotkeys.text("PLAY_NEXT_KEY"),
+                skip_current = hotkeys.text("SKIP_CURRENT_KEY"),
+                replay_last = hotkeys.text("REPLAY_LAST_KEY"),
+                play_ad = hotkeys.text("PLAY_AD"),
+                pause_queue = hotkeys.text("PAUSE_QUEUE"),
+            ),
+            raid_threshold = reader.number("Raid Threshold", int),
+            resub = ResubSettings(
+                intern_months = resub.number("Intern Max Month Count", int),
+                employee_months = resub.number("Employee Max Month Count", int),
+                supervisor_months = resub.number("Supervisor Max Month Count", int),
+            ),
+            bits = BitsSettings(
+                normal = bits.number("Normal Reaction Threshold", int),
+                impressed = bits.number("Impressed Reaction Threshold", int),
+                exaggerated = bits.number("Exaggerated Reaction Threshold", int),
+                screaming = bits.number("Screaming Reaction Threshold", int),
+            ),
+            obs_assistant_name = reader.text("OBS Assistant Object Name"),
+            obs_stationary_assistant_name = reader.text("OBS Assistant Stationary Object Name"),
+            onscreen_location = reader.mapping("Onscreen Location", None),
+            offscreen_location = reader.mapping("Offscreen Location", None),
+            streamathon_mode = reader.flag("Streamathon Mode"),
+            progress_bar_name = reader.text("Progress Bar Name"),
+            progress_bar_transform = reader.mapping("Progress Bar Transform Full-Sized", {}),
+            debug = reader.flag("Debug"),
+        )
+        if reader.errors:
+            raise SettingsError("Invalid settings.json: " + "; ".join(reader.errors))
+        return settings
+
+def changed_fields(old: Settings | None, new: Settings):
+    #Top level field names that differ. Sections like hotkeys compare as a whole.
+    if old is None:
+        return {field.name for field in fields(new)}
+    return {field.name for field in fields(new) if getattr(old, field.name) != getattr(new, field.name)}
+
+class _Reader:
+    def __init__(self, data, prefix = "", errors = None):
+        self.data = data if isinstance(data, dict) else {}
+        self.prefix = prefix
+        self.errors = errors if errors is not None else []
+
+    def _get(self, key, default):
+        if key in self.data:
+            return self.data[key]
+        if default is _MISSING:
+            self.errors.append(f"missing '{self.prefix}{key}'")
+        return default
+
+    def _bad(self, key, value, expected):
+        self.errors.append(f"'{self.prefix}{key}' should be {expected}, got {value!r}")
+
+    def section(self, key):
+        value = self._get(key, _MISSING)
+        if value is not None and value is not _MISSING and not isinstance(value, dict):
+            self._bad(key, value, "a section")
+        return _Reader(value, f"{self.prefix}{key} > ", self.errors)
+
+    def text(self, key, default = _MISSING):
+        value = self._get(key, default)
+        if value is _MISSING or value == "":
+            return None
+        if value is not None and not isinstance(value, str):
+            return str(value)
+        return value
+
+    def flag(self, key, default = _MISSING):
+        value = self._get(key, default)
+        if value is _MISSING:
+            return False
+        if not isinstance(value, bool):
+            self._bad(key, value, "true or false")
+            return False
+        return value
+
+    def number(self, key, kind, default = _MISSING):
+        value = self._get(key, default)
+        if value is _MISSING:
+            return kind(0)
+        if isinstance(value, bool):
+            self._bad(key, value, "a number")
+            return kind(0)
+        try:
+            return kind(float(value)) if kind is int else kind(value) #The GUI can save numbers as text
+        except (TypeError, ValueError):
+            self._bad(key, value, "a number")
+            return kind(0)
+
+    def mapping(self, key, default = _MISSING):
+        value = self._get(key, default)
+        if value is _MISSING:
+            return None
+        if value is not None and not isinstance(value, dict):
+            self._bad(key, value, "an object")
+            return default if default is not _MISSING else None
+        return value
+
+    def device(self, key):
+        value = self._get(key, _MISSING)
+        if value is _MISSING or value == "":
+            return None
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        if value is not None and not isinstance(value, (str, int)):
+            self._bad(key, value, "a device name or index")
+            return None
+        return value
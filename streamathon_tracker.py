@@ -0,0 +1,176 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+from json_manager import STREAMATHON_TRACKER, STREAMATHON_DB, save_tracker
+from bot_utils import get_debug
+
+#Scalar fields of the old streamathon_tracker.json, kept as rows of the totals table
+TOTAL_KEYS = ["Amount of Bits Donated", "Amount of Money Donated", "Number of Subs", "Number of Subs Gifted", "Current Point Total", "Next Goal", "Last Goal Reached", "Current Goal Tier"]
+#Hand edited parts of streamathon_tracker.json, re-read from the JSON file on every startup
+CONFIG_KEYS = ["Point Values", "Goals"]
+DEFAULT_POINT_VALUES = {"One Point Per Bits": 100, "Donation Per Dollar": 1, "Sub": 1}
+
+#Point event reasons, shared with the callers of add_points
+BITS = "bits"
+DONATION = "donation"
+SUB = "sub"
+GIFTED_SUBS = "gifted_subs"
+
+#Point event -> (totals row, contributors column)
+EVENT_COLUMNS = {
+    BITS: ("Amount of Bits Donated", "bits"),
+    DONATION: ("Amount of Money Donated", "money"),
+    SUB: ("Number of Subs", "subbed"),
+    GIFTED_SUBS: ("Number of Subs Gifted", "gifted_subs"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS totals (
+    name TEXT PRIMARY KEY,
+    value NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS contributors (
+    name TEXT PRIMARY KEY,
+    subbed INTEGER NOT NULL DEFAULT 0,
+    gifted_subs INTEGER NOT NULL DEFAULT 0,
+    bits INTEGER NOT NULL DEFAULT 0,
+    money REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS config (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class StreamathonTracker:
+    def __init__(self, db_path = STREAMATHON_DB, json_path = STREAMATHON_TRACKER):
+        self.json_path = json_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread = False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.executemany("INSERT OR IGNORE INTO totals (name, value) VALUES (?, 0)", [(key,) for key in TOTAL_KEYS])
+        self.conn.commit()
+        self.import_json()
+        self.point_values = self._get_config("Point Values", DEFAULT_POINT_VALUES)
+        self.goals = self._get_config("Goals", {})
+
+    def _get_config(self, name, default):
+        row = self.conn.execute("SELECT value FROM config WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def import_json(self):
+        if not os.path.exists(self.json_path):
+            return
+        try:
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[WARNING]Could not read {self.json_path}: {e}")
+            return
+        with self.lock, self.conn:
+            for key in CONFIG_KEYS:
+                if key in data:
+                    self.conn.execute("INSERT OR REPLACE INTO config (name, value) VALUES (?, ?)", (key, json.dumps(data[key])))
+            if "Current Goal Tier" in data:
+                self.conn.execute("UPDATE totals SET value = ? WHERE name = 'Current Goal Tier'", (data["Current Goal Tier"],))
+            if self.conn.execute("SELECT COUNT(*) FROM config WHERE name = 'Imported'").fetchone()[0]:
+                return #Counts only come from the JSON file the first time, after that the database is the source of truth
+            for key in TOTAL_KEYS:
+                if key in data:
+                    self.conn.execute("UPDATE totals SET value = ? WHERE name = ?", (data[key], key))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO contributors (name, subbed, gifted_subs, bits, money) VALUES (?, ?, ?, ?, ?)",
+                [(name, int(c.get("Subbed", False)), c.get("Gifted Subs Donated", 0), c.get("Bits Donated", 0), c.get("Money Donated", 0))
+                 for name, c in data.get("Contributors", {}).items()]
+            )
+            self.conn.execute("INSERT INTO config (name, value) VALUES ('Imported', 'true')")
+        if get_debug():
+            print(f"[DEBUG]Imported streamathon tracker from {self.json_path}")
+
+    def get_totals(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT name, value FROM totals").fetchall())
+
+    def get_contributor(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT subbed, gifted_subs, bits, money FROM contributors WHERE name = ?", (name,)).fetchone()
+        if not row:
+            return None
+        return {"Subbed": bool(row[0]), "Gifted Subs Donated": row[1], "Bits Donated": row[2], "Money Donated": row[3]}
+
+    def last_point_id(self): #Journal id of the newest point event already counted
+        with self.lock:
+            return int(self._get_config("Last Point Id", 0))
+
+    def add_points(self, contributor: str, reason: str, amount, event_id: int = None):
+        #One transaction per point event. Returns (goal advanced, key of the goal that was reached).
+        if reason not in EVENT_COLUMNS:
+            print(f"[WARNING]Ignored {amount} streamathon points for {contributor}, unknown reason \"{reason}\".")
+            return False, None
+        total_key, column = EVENT_COLUMNS[reason]
+        with self.lock, self.conn:
+            if event_id is not None: #Committed with the counts, so a replayed event is never counted twice
+                self.conn.execute("INSERT OR REPLACE INTO config (name, value) VALUES ('Last Point Id', ?)", (str(event_id),))
+            self.conn.execute("INSERT OR IGNORE INTO contributors (name) VALUES (?)", (contributor,))
+            if column == "subbed":
+                self.conn.execute("UPDATE contributors SET subbed = 1 WHERE name = ?", (contributor,))
+            else:
+                self.conn.execute(f"UPDATE contributors SET {column} = {column} + ? WHERE name = ?", (amount, contributor))
+            self.conn.execute("UPDATE totals SET value = value + ? WHERE name = ?", (amount, total_key))
+            if reason == GIFTED_SUBS:
+                return False, None #Gifted subs are counted through the recipients' sub events
+            return self._update_points()
+
+    def _update_points(self):
+        totals = dict(self.conn.execute("SELECT name, value FROM totals").fetchall())
+        bit_points = totals["Amount of Bits Donated"] // self.point_values["One Point Per Bits"]
+        donation_points = math.floor(totals["Amount of Money Donated"] * self.point_values["Donation Per Dollar"])
+        sub_points = math.floor(totals["Number of Subs"] * self.point_values["Sub"])
+        total_points = int(bit_points + donation_points + sub_points)
+        updates = {"Current Point Total": total_points}
+        advanced = False
+        key_reached = None
+        next_goal = totals["Next Goal"]
+        if total_points > next_goal:
+            updates["Last Goal Reached"] = next_goal
+            for key, goal in self.goals.items():
+                if goal > next_goal:
+                    updates["Next Goal"] = goal
+                    advanced = True
+                    break
+                elif goal == next_goal:
+                    key_reached = key
+        self.conn.executemany("UPDATE totals SET value = ? WHERE name = ?", [(value, key) for key, value in updates.items()])
+        return advanced, key_reached
+
+    def to_dict(self):
+        with self.lock:
+            totals = dict(self.conn.execute("SELECT name, value FROM totals").fetchall())
+            rows = self.conn.execute("SELECT name, subbed, gifted_subs, bits, money FROM contributors").fetchall()
+        data = {key: totals[key] for key in TOTAL_KEYS}
+        data["Point Values"] = self.point_values
+        data["Goals"] = self.goals
+        data["Contributors"] = {
+            name: {"Subbed": bool(subbed), "Gifted Subs Donated": gifted_subs, "Bits Donated": bits, "Money Donated": money}
+            for name, subbed, gifted_subs, bits, money in rows
+        }
+        return data
+
+    async def export_json(self): #Writes the old streamathon_tracker.json layout for anything still reading it
+        await save_tracker(self.to_dict())
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_tracker = None
+
+def get_tracker():
+    global _tracker
+    if _tracker is None:
+        _tracker = StreamathonTracker()
+    return _tracker
@@ -0,0 +1,43 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from event_journal import EventJournal, QUEUED, RENDERED, PLAYED
+
+class RenderedRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors = True)
+
+    def test_rendered_then_crashed_event_keeps_its_audio(self):
+        journal = EventJournal(self.directory)
+        journal.append(QUEUED, event = {"type": "event", "text": "thanks for the bits", "audio": None}, front = False)
+        journal.append(QUEUED, event = {"type": "event", "text": "welcome raiders", "audio": None}, front = False)
+        journal.append(RENDERED, index = 0, audio = "audio/bits.wav")
+        journal.append(PLAYED, index = 0)
+        journal.append(RENDERED, index = 0, audio = "audio/raid.wav")
+        #No close or checkpoint, the bot crashed here
+
+        state = EventJournal(self.directory).recovered
+        self.assertEqual([event["audio"] for event in state["played"]], ["audio/bits.wav"])
+        self.assertEqual([event["audio"] for event in state["queue"]], ["audio/raid.wav"])
+
+    def test_rendered_after_checkpoint_is_replayed(self):
+        journal = EventJournal(self.directory)
+        state = {"queue": [], "played": [], "points": []}
+        with journal.lock:
+            journal.append(QUEUED, event = {"type": "event", "text": "new sub", "audio": None}, front = False)
+            state["queue"].append({"type": "event", "text": "new sub", "audio": None})
+        journal.checkpoint(*journal.snapshot(state))
+        journal.append(RENDERED, index = 0, audio = "audio/sub.wav")
+
+        state = EventJournal(self.directory).recovered
+        self.assertEqual(state["queue"][0]["audio"], "audio/sub.wav")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import asyncio
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tts_workers import TTSWorkerPool
+
+class FakeQueue:
+    #Same contract as bot.EventQueue: events are matched by identity
+    def __init__(self):
+        self.queue = []
+        self.on_change = None
+
+    def set_audio(self, event, audio):
+        if not any(queued is event for queued in self.queue):
+            return False
+        event["audio"] = audio
+        return True
+
+    def discard(self, event):
+        self.queue = [queued for queued in self.queue if queued is not event]
+
+class RemoveDuringRenderTest(unittest.TestCase):
+    def test_audio_of_removed_event_is_discarded(self):
+        async def run():
+            queue = FakeQueue()
+            started = asyncio.Event()
+            release = asyncio.Event()
+            discarded = []
+
+            async def synthesize(text):
+                started.set()
+                await release.wait()
+                return f"audio/{text}.wav"
+
+            pool = TTSWorkerPool(queue, synthesize, workers = 1, look_ahead = 3, discard = discarded.append)
+            event = {"type": "event", "text": "raid", "audio": None}
+            queue.queue.append(event)
+            pool.start()
+            await asyncio.wait_for(started.wait(), 1)
+            queue.discard(event) #Removed from the GUI while synthesis is in flight
+            release.set()
+            for _ in range(20):
+                if discarded:
+                    break
+                await asyncio.sleep(0.01)
+            for task in pool.tasks:
+                task.cancel()
+            return event, discarded, pool
+
+        event, discarded, pool = asyncio.run(run())
+        self.assertIsNone(event["audio"])
+        self.assertEqual(discarded, ["audio/raid.wav"])
+        self.assertEqual(pool.rendered, 0)
+
+    def test_render_now_returns_none_for_removed_event(self):
+        async def run():
+            queue = FakeQueue()
+            pool = TTSWorkerPool(queue, lambda text: asyncio.sleep(0, "unused"), workers = 1)
+            return await pool.render_now({"type": "event", "text": "gone", "audio": None})
+
+        self.assertIsNone(asyncio.run(run()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,53 +1,129 @@
-import requests
-import json
-import time
 import os
-from bot_utils import DEBUG
+import time
+import copy
+import asyncio
+import aiohttp
+import json_codec
+from json_manager import TOKENS_FILE, writer
+from bot_utils import get_debug
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
-TOKENS_FILE = os.path.join(DATA_DIR, "tokens.json")
+TOKEN_URL = "https://id.twitch.tv/oauth2/token"
+TOKEN_MAX_AGE = 3600 #Seconds a token is trusted when Twitch didn't say when it expires
+REFRESH_MARGIN = 300 #Refresh this many seconds before a token is due
+RETRY_DELAY = 60 #Seconds before retrying a failed background refresh
 
 def load_tokens():
-    with open(TOKENS_FILE, "r") as f:
-        return json.load(f)
+    content = writer.get_pending(TOKENS_FILE)
+    if content is None:
+        with open(TOKENS_FILE, "r", encoding="utf-8") as f:
+            content = f.read()
+    return json_codec.loads(content)
 
 def save_tokens(tokens):
-    with open(TOKENS_FILE, "w") as f:
-        json.dump(tokens, f, indent=4)
-
-def get_refresh_token(account: str):
-    tokens = load_tokens()
-    return tokens[account]["refresh_token"]
-
-def refresh_token(account: str, client_id, client_secret, force_refresh = False):
-    tokens = load_tokens()
-    if account not in tokens:
-        raise ValueError(f"[ERROR]No token found for account '{account}'")
-    
-    last_refreshed = tokens[account].get("last_refreshed", 0)
-    if not force_refresh and (time.time() - last_refreshed) < 3600:
-        token = "oauth:" + tokens[account]["access_token"]
-        return token
-    
-    refresh_token = tokens[account]["refresh_token"]
-
-    response = requests.post("https://id.twitch.tv/oauth2/token", data={
-        "grant_type": "refresh_token",
-        "refresh_token": refresh_token,
-        "client_id": client_id,
-        "client_secret": client_secret
-    })
-
-    if response.status_code == 200:
-        new_tokens = response.json()
-        tokens[account]["access_token"] = new_tokens["access_token"]
-        if "refresh_token" in new_tokens:
-            tokens[account]["refresh_token"] = new_tokens["refresh_token"]
-        tokens[account]["last_refreshed"] = int(time.time())
-        save_tokens(tokens)
-        token = "oauth:" + tokens[account]["access_token"]
+    writer.save(TOKENS_FILE, json_codec.dumps(tokens, pretty = True), immediate = True)
+
+class TokenService:
+    #Tokens live in memory. tokens.json is read once and written after every refresh, both off the event loop.
+    def __init__(self, client_id, client_secret):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.tokens = None
+        self.accounts = set() #Accounts kept fresh by the background task
+        self.retry_at = {}
+        self._load_lock = asyncio.Lock()
+        self._inflight = {} #account -> refresh task shared by every caller
+        self._refresher = None
+
+    async def _load(self):
+        async with self._load_lock:
+            if self.tokens is None:
+                self.tokens = await asyncio.to_thread(load_tokens)
+
+    def _account(self, account):
+        if account not in self.tokens:
+            raise ValueError(f"[ERROR]No token found for account '{account}'")
+        return self.tokens[account]
+
+    def _due(self, account):
+        token = self._account(account)
+        expires_at = token.get("expires_at")
+        due = expires_at - REFRESH_MARGIN if expires_at else token.get("last_refreshed", 0) + TOKEN_MAX_AGE - REFRESH_MARGIN
+        return max(due, self.retry_at.get(account, 0))
+
+    async def get_token(self, account: str, force_refresh: bool = False):
+        await self._load()
+        self._account(account)
+        self.accounts.add(account)
+        if force_refresh or time.time() >= self._due(account):
+            await self.refresh(account)
+        self.start()
+        return "oauth:" + self.tokens[account]["access_token"]
+
+    async def get_refresh_token(self, account: str):
+        await self._load()
+        return self._account(account)["refresh_token"]
+
+    async def refresh(self, account: str):
+        #Single flight: callers arriving during a refresh wait for the same request
+        task = self._inflight.get(account)
+        if task is None:
+            task = asyncio.create_task(self._refresh(account))
+            self._inflight[account] = task
+            task.add_done_callback(lambda _: self._inflight.pop(account, None))
+        await asyncio.shield(task)
+
+    async def _refresh(self, account):
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": self._account(account)["refresh_token"],
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        }
+        async with aiohttp.ClientSession(timeout = aiohttp.ClientTimeout(total = 15)) as session:
+            async with session.post(TOKEN_URL, data = data) as response:
+                if response.status != 200:
+                    raise Exception(f"[ERROR]Failed to refresh token: {response.status} - {await response.text()}")
+                new_tokens = await response.json()
+        await self.store(account, new_tokens["access_token"], new_tokens.get("refresh_token"), new_tokens.get("expires_in"))
         print("Refreshed access token")
-        return token
-    else:
-        raise Exception(f"[ERROR]Failed to refresh token: {response.status_code} - {response.text}")
+
+    async def store(self, account: str, access_token: str, refresh_token: str = None, expires_in: int = None):
+        #Also handed to twitchAPI as its refresh callback, so tokens it refreshes itself are kept too
+        await self._load()
+        token = self.tokens.setdefault(account, {})
+        token["access_token"] = access_token
+        if refresh_token:
+            token["refresh_token"] = refresh_token
+        token["last_refreshed"] = int(time.time())
+        token["expires_at"] = int(time.time() + expires_in) if expires_in else None
+        self.retry_at.pop(account, None)
+        await asyncio.to_thread(save_tokens, copy.deepcopy(self.tokens))
+
+    def start(self):
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            now = time.time()
+            wait = min((self._due(account) for account in self.accounts), default = now + RETRY_DELAY) - now
+            await asyncio.sleep(max(wait, 1))
+            for account in list(self.accounts):
+                if time.time() < self._due(account):
+                    continue
+                try:
+                    await self.refresh(account)
+                except Exception as e:
+                    self.retry_at[account] = time.time() + RETRY_DELAY
+                    print(f"[WARNING]Background refresh of the {account} token failed, retrying in {RETRY_DELAY} seconds: {e}")
+                else:
+                    if get_debug():
+                        print(f"[DEBUG]Refreshed the {account} token ahead of expiry.")
+
+_service = None
+
+def get_token_service():
+    global _service
+    if _service is None:
+        _service = TokenService(os.getenv("TWITCH_CLIENT_ID"), os.getenv("TWITCH_APP_SECRET"))
+    return _service
@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+import aiohttp
+import asyncio
+import json_codec
+from json_manager import DATA_DIR, write_atomic
+from bot_utils import get_debug
+
+TRACE_FILE = os.path.join(DATA_DIR, "latency_stats.json")
+TRACE_EXPORT_URL = os.getenv("TRACE_EXPORT_URL") #Optional endpoint the stats are POSTed to on every export
+TRACE_SAMPLES = 1000 #Recent durations kept per stage and event type
+EXPORT_INTERVAL = 60 #Seconds between exports
+
+#Stages in the order an alert passes through them
+EVENTSUB = "eventsub delivery"
+HANDLER = "handler"
+LLM_QUEUE = "llm queue"
+LLM = "llm"
+LLM_FIRST_TOKEN = "llm first token" #Streamed answers, time from getting a slot to the first piece
+TTS = "tts"
+QUEUE_WAIT = "queue wait"
+PROCESS_AUDIO = "process audio"
+OBS = "obs activate"
+PLAYBACK = "playback"
+
+_event_type = contextvars.ContextVar("trace_event_type", default = "other") #Inherited by tasks an event handler starts
+
+def current_event_type():
+    return _event_type.get()
+
+class Histogram:
+    def __init__(self, samples: int = TRACE_SAMPLES):
+        self.samples = deque(maxlen = samples)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        values = sorted(self.samples)
+        pick = lambda share: values[min(int(len(values) * share), len(values) - 1)] if values else 0.0
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": self.max}
+
+class _Span:
+    __slots__ = ("tracer", "stage", "event_type", "start")
+
+    def __init__(self, tracer, stage, event_type):
+        self.tracer = tracer
+        self.stage = stage
+        self.event_type = event_type
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.stage, time.perf_counter() - self.start, self.event_type)
+
+class Tracer:
+    #Times each stage of the event pipeline, tagged with the event type, into in-memory histograms
+    def __init__(self):
+        self.histograms = {} #(stage, event type) -> Histogram
+        self.lock = threading.Lock() #Handlers run on the EventSub loop, playback on the bot loop
+        self.enabled = True
+
+    def span(self, stage: str, event_type: str = None):
+        return _Span(self, stage, event_type)
+
+    @contextmanager
+    def tagged(self, event_type: str):
+        #Spans inside, and tasks started inside, are counted under event_type
+        token = _event_type.set(event_type or "other")
+        try:
+            yield
+        finally:
+            _event_type.reset(token)
+
+    @contextmanager
+    def event(self, event_type: str, sent_at: float = None):
+        #Tags everything the handler does with event_type and times the handler itself
+        with self.tagged(event_type):
+            if sent_at:
+                self.record(EVENTSUB, max(0.0, time.time() - sent_at), event_type)
+            with self.span(HANDLER, event_type):
+                yield
+
+    def record(self, stage: str, seconds: float, event_type: str = None):
+        if not self.enabled:
+            return
+        key = (stage, event_type or _event_type.get())
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.add(seconds)
+
+    def stats(self):
+        with self.lock:
+            stats = {}
+            for (stage, event_type), histogram in self.histograms.items():
+                stats.setdefault(stage, {})[event_type] = histogram.summary()
+            return stats
+
+    def report(self):
+        lines = [f"{"stage":<18}{"event":<18}{"count":>7}{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}"]
+        for stage, by_type in self.stats().items():
+            for event_type, summary in sorted(by_type.items()):
+                lines.append(f"{stage:<18}{event_type:<18}{summary["count"]:>7}{summary["p50"]:>8.2f}s{summary["p95"]:>8.2f}s{summary["p99"]:>8.2f}s{summary["max"]:>8.2f}s")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    async def export(self, path: str = TRACE_FILE, url: str = TRACE_EXPORT_URL):
+        stats = {"exported_at": time.time(), "stages": self.stats()}
+        await asyncio.to_thread(write_atomic, path, json_codec.dumps(stats, pretty = True))
+        if url:
+            async with aiohttp.ClientSession(timeout = aiohttp.ClientTimeout(total = 10)) as session:
+                async with session.post(url, data = json_codec.dumps(stats), headers = {"Content-Type": "application/json"}) as response:
+                    if response.status >= 300:
+                        print(f"[WARNING]Latency stats export to {url} returned {response.status}")
+
+    async def export_loop(self, interval: float = EXPORT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.export()
+            except Exception as e:
+                print(f"[ERROR]Failed to export latency stats: {e}")
+            else:
+                if get_debug():
+                    print(f"[DEBUG]Latency by stage:\n{self.report()}")
+
+_tracer = None
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer()
+    return _tracer
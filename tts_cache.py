@@ -0,0 +1,141 @@
+import os
+import uuid
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from bot_utils import get_debug
+
+AUDIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio")
+TTS_CACHE_DIR = os.path.join(AUDIO_DIR, "cache") #Not touched by the startup purge of audio/
+TTS_CACHE_MB = 500 #Default size limit, least recently used files are evicted past it
+
+def audio_file(extension: str, subdirectory: str = AUDIO_DIR):
+    #Every synthesized line gets its own file, so removing one event never deletes another's audio
+    os.makedirs(subdirectory, exist_ok = True)
+    return os.path.join(subdirectory, f"___Msg{uuid.uuid4().hex}{extension}")
+
+class TTSCache:
+    #Synthesized audio keyed by a digest of everything that changes the sound: provider, text, voice, model and voice settings
+    def __init__(self, folder: str = TTS_CACHE_DIR, max_mb: float = TTS_CACHE_MB, enabled: bool = True):
+        self.folder = folder
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.lock = threading.Lock() #Synthesis runs in worker threads
+        self.entries = None #path -> size, least recently used first. Scanned from disk on first use.
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, enabled: bool = None, max_mb: float = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if max_mb:
+            self.max_bytes = int(max_mb * 1024 * 1024)
+            with self.lock:
+                self._load()
+                self._evict()
+
+    @staticmethod
+    def key(provider: str, text: str, voice: str, model: str = None, voice_settings: dict = None):
+        parts = [provider, voice or "", model or "", repr(sorted((voice_settings or {}).items())), text]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _load(self):
+        if self.entries is not None:
+            return
+        os.makedirs(self.folder, exist_ok = True)
+        files = []
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+        files.sort() #File times carry the recency order across restarts
+        self.entries = OrderedDict((path, size) for _, path, size in files)
+        self.size = sum(self.entries.values())
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            path, size = self.entries.popitem(last = False)
+            self.size -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"[WARNING]Could not evict cached audio {path}: {e}")
+
+    def get(self, key: str, extension: str, subdirectory: str = AUDIO_DIR):
+        #Returns a fresh copy of the cached audio for one event, or None on a miss
+        if not self.enabled:
+            return None
+        path = os.path.join(self.folder, key + extension)
+        with self.lock:
+            self._load()
+            if path not in self.entries or not os.path.exists(path):
+                self.entries.pop(path, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(path)
+            self.hits += 1
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        output = audio_file(extension, subdirectory)
+        _link_or_copy(path, output)
+        if get_debug():
+            print(f"[DEBUG]TTS cache hit, skipped synthesis ({self.hits} hits, {self.misses} misses).")
+        return output
+
+    def put(self, key: str, audio_path: str):
+        #Keeps a copy of freshly synthesized audio. The caller keeps using its own file.
+        if not self.enabled or not audio_path or not os.path.exists(audio_path):
+            return
+        path = os.path.join(self.folder, key + os.path.splitext(audio_path)[1])
+        with self.lock:
+            self._load()
+            if path in self.entries:
+                return
+            tmp_path = path + ".tmp"
+            try:
+                _link_or_copy(audio_path, tmp_path)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"[WARNING]Could not cache synthesized audio: {e}")
+                return
+            size = os.path.getsize(path)
+            self.entries[path] = size
+            self.size += size
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self._load()
+            for path in list(self.entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit rate": self.hits / lookups if lookups else 0.0,
+                "files": len(self.entries or ()), "size mb": self.size / (1024 * 1024), "evictions": self.evictions, "enabled": self.enabled}
+
+def _link_or_copy(source, destination):
+    #A hard link costs nothing and deleting either file leaves the other intact
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+_cache = None
+
+def get_tts_cache():
+    global _cache
+    if _cache is None:
+        _cache = TTSCache()
+    return _cache
@@ -0,0 +1,120 @@
+import time
+import asyncio
+from collections import deque
+from bot_utils import get_debug
+
+FAILURE_THRESHOLD = 3 #Failures in a row before a provider is skipped
+OPEN_SECONDS = 60 #Seconds a failing provider is skipped before one request probes it again
+QUOTA_OPEN_SECONDS = 900 #Out of credits won't fix itself quickly
+LATENCY_SAMPLES = 200
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, open_seconds: float = OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.open_until = 0
+        self.probing = False
+
+    def allow(self):
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() >= self.open_until:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True #Only one request finds out whether the provider is back
+            return True
+        return False
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probing = False
+
+    def abandon(self):
+        #The probe was cancelled before it finished, so the next request probes instead
+        self.probing = False
+
+    def failure(self, open_seconds: float = None):
+        #open_seconds opens the circuit straight away, for errors that retrying won't fix
+        self.failures += 1
+        self.probing = False
+        if open_seconds or self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.open_until = time.monotonic() + (open_seconds or self.open_seconds)
+            return True
+        return False
+
+    def seconds_until_probe(self):
+        return max(0.0, self.open_until - time.monotonic()) if self.state == OPEN else 0.0
+
+class TTSProvider:
+    def __init__(self, name: str, synthesize, classify_error = None, breaker: CircuitBreaker = None):
+        self.name = name
+        self.synthesize = synthesize #Blocking (text, stream) -> audio path, run in a worker thread
+        self.classify_error = classify_error #Optional (exception) -> (message, seconds to open the circuit for or None)
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = deque(maxlen = LATENCY_SAMPLES)
+        self.calls = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        pick = lambda share: latencies[min(int(len(latencies) * share), len(latencies) - 1)] if latencies else 0.0
+        return {"state": self.breaker.state, "calls": self.calls, "errors": self.errors, "skipped": self.skipped,
+                "latency p50": pick(0.5), "latency p95": pick(0.95), "retry in": self.breaker.seconds_until_probe()}
+
+class TTSRouter:
+    #Tries providers in order, skipping any whose circuit is open. The last provider is always tried when nothing else is left.
+    def __init__(self, providers: list, discard = None):
+        self.providers = providers
+        self.discard = discard #Optional (audio path) -> None, for audio that finishes after its caller was cancelled
+
+    async def synthesize(self, text: str, stream: bool = False):
+        last_error = None
+        for index, provider in enumerate(self.providers):
+            is_last = index == len(self.providers) - 1
+            if not provider.breaker.allow() and not is_last:
+                provider.skipped += 1
+                continue
+            provider.calls += 1
+            start = time.perf_counter()
+            work = asyncio.ensure_future(asyncio.to_thread(provider.synthesize, text, stream))
+            try:
+                output = await asyncio.shield(work) #The thread can't be stopped, shielded so its file can still be cleaned up below
+                if not output:
+                    raise RuntimeError(f"{provider.name} produced no audio")
+            except Exception as e:
+                last_error = e
+                self._failed(provider, e)
+                continue
+            except BaseException:
+                provider.breaker.abandon()
+                if self.discard:
+                    work.add_done_callback(lambda done: self.discard(done.result()) if not done.cancelled() and done.exception() is None else None)
+                raise
+            provider.latencies.append(time.perf_counter() - start)
+            if provider.breaker.state != CLOSED:
+                print(f"[green]{provider.name} is working again.")
+            provider.breaker.success()
+            return output
+        raise RuntimeError(f"Every TTS provider failed: {last_error}")
+
+    def _failed(self, provider, error):
+        provider.errors += 1
+        message, open_seconds = provider.classify_error(error) if provider.classify_error else (str(error), None)
+        print(f"[ERROR]{provider.name} TTS failed: {message}")
+        was_open = provider.breaker.state == OPEN
+        if provider.breaker.failure(open_seconds) and not was_open:
+            print(f"[WARNING]Skipping {provider.name} for {provider.breaker.seconds_until_probe():.0f} seconds, using the backup voice.")
+        elif get_debug():
+            print(f"[DEBUG]{provider.name} has failed {provider.breaker.failures} times in a row.")
+
+    def stats(self):
+        return {provider.name: provider.stats() for provider in self.providers}
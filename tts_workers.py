@@ -0,0 +1,119 @@
+import asyncio
+from bot_utils import get_debug
+
+TTS_WORKERS = 2 #Lines synthesized at once
+TTS_LOOK_AHEAD = 3 #Queued events kept rendered ahead of the playhead
+TTS_ATTEMPTS = 2 #An event that fails this many times is dropped so it can't block the queue
+
+class TTSWorkerPool:
+    #Renders queued events' text to audio in playback order. Only the next look_ahead events are rendered,
+    #so a burst of events waits here as text instead of firing every synthesis request at once.
+    def __init__(self, event_queue, synthesize, workers: int = TTS_WORKERS, look_ahead: int = TTS_LOOK_AHEAD, tag = None, discard = None):
+        self.event_queue = event_queue #Needs queue, set_audio(event, audio) and discard(event)
+        self.synthesize = synthesize #async (text) -> audio path
+        self.discard = discard #Optional (audio path) -> None, for audio of an event removed while it was rendering
+        self.workers = workers
+        self.look_ahead = look_ahead
+        self.tag = tag #Optional (event) -> context manager wrapped around each synthesis
+        self.rendering = {} #id(event) -> event
+        self.failures = {}
+        self.tasks = []
+        self.loop = None
+        self.wakeup = None
+        self.rendered = 0
+        self.dropped = 0
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.event_queue.on_change = self.notify
+        self._resize()
+
+    def configure(self, workers: int = None, look_ahead: int = None):
+        if look_ahead:
+            self.look_ahead = look_ahead
+        if workers:
+            self.workers = workers
+            if self.loop:
+                self.loop.call_soon_threadsafe(self._resize)
+        self.notify()
+
+    def _resize(self):
+        #Retiring workers finish their current line and exit, they don't count towards the pool size
+        self.tasks = [task for task in self.tasks if not task.done() and not getattr(task, "retire", False)]
+        while len(self.tasks) < self.workers:
+            self.tasks.append(asyncio.create_task(self._worker()))
+        for task in self.tasks[self.workers:]: #Extra workers finish their current line first
+            task.retire = True
+        self.notify()
+
+    def notify(self):
+        #Handlers add events from the EventSub loop, so the wakeup is always scheduled on the pool's own loop
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def _next_job(self):
+        for event in list(self.event_queue.queue[:self.look_ahead]):
+            if not event.get("audio") and event.get("text") and id(event) not in self.rendering:
+                return event
+        return None
+
+    def pending(self):
+        return sum(1 for event in self.event_queue.queue if not event.get("audio") and event.get("text"))
+
+    async def render_now(self, event):
+        #For an event picked out of order from the GUI, waits for it to have audio. None if it failed or left the queue.
+        while not event.get("audio") and event.get("text"):
+            if not any(queued is event for queued in self.event_queue.queue):
+                return None
+            if id(event) not in self.rendering:
+                await self._render(event)
+                if not event.get("audio"):
+                    return None
+            else:
+                await asyncio.sleep(0.1)
+        return event.get("audio")
+
+    async def _render(self, event):
+        self.rendering[id(event)] = event
+        try:
+            if self.tag:
+                with self.tag(event):
+                    audio = await self.synthesize(event["text"])
+            else:
+                audio = await self.synthesize(event["text"])
+            if not audio:
+                raise RuntimeError("No audio was produced")
+            if not self.event_queue.set_audio(event, audio): #Journaled with the audio path, unless the event was removed meanwhile
+                self.failures.pop(id(event), None)
+                if self.discard:
+                    self.discard(audio)
+                return
+            self.rendered += 1
+            self.failures.pop(id(event), None)
+            if get_debug():
+                print(f"[DEBUG]Rendered {event.get("event_type", "event")}, {self.pending()} still waiting for audio.")
+        except Exception as e:
+            self.failures[id(event)] = self.failures.get(id(event), 0) + 1
+            print(f"[ERROR]Could not synthesize {event.get("event_type", "event")}: {e}")
+            if self.failures[id(event)] >= TTS_ATTEMPTS:
+                self.failures.pop(id(event), None)
+                self.dropped += 1
+                self.event_queue.discard(event)
+        finally:
+            self.rendering.pop(id(event), None)
+
+    async def _worker(self):
+        task = asyncio.current_task()
+        while not getattr(task, "retire", False):
+            event = self._next_job()
+            if event is None:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            await self._render(event)
+            self.notify() #Another worker may have been waiting behind this one
+
+    def stats(self):
+        return {"workers": self.workers, "look ahead": self.look_ahead, "rendering": len(self.rendering), "waiting": self.pending(),
+                "rendered": self.rendered, "dropped": self.dropped}